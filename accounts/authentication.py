@@ -0,0 +1,141 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from accounts.models import User
+from companies.models import Company
+
+# Claims added at login by CompanyTokenObtainPairSerializer.
+STATE_CLAIMS = ('email', 'company_id', 'company_name', 'role', 'is_staff', 'is_superuser')
+# Claims that must still match the user: a token carrying other values is
+# outdated (at authentication and at refresh).
+PRIVILEGE_CLAIMS = ('company_id', 'role', 'is_staff', 'is_superuser')
+
+_account_cache = {}
+_account_cache_lock = threading.Lock()
+_ACCOUNT_CACHE_MAX_SIZE = 10000
+
+
+def _account_state_query(user_id):
+    return User.objects.filter(pk=user_id).values_list(
+        'is_active', *PRIVILEGE_CLAIMS, 'password', 'email', 'company__name'
+    )
+
+
+def privileges_changed(token, state):
+    """True when the PRIVILEGE_CLAIMS of ``token`` differ from the user's account state."""
+    return tuple(token[claim] for claim in PRIVILEGE_CLAIMS) != tuple(state[1:len(PRIVILEGE_CLAIMS) + 1])
+
+
+def _cached_account_state(user_id):
+    # (expires_at, state) while fresh, else None
+    cached = _account_cache.get(user_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached
+    return None
+
+
+def _cache_account_state(user_id, state):
+    with _account_cache_lock:
+        if len(_account_cache) >= _ACCOUNT_CACHE_MAX_SIZE:
+            _account_cache.clear()
+        _account_cache[user_id] = (time.monotonic() + settings.STATELESS_AUTH_CACHE_TTL, state)
+    return state
+
+
+def _account_state(user_id):
+    """
+    (is_active, company_id, role, is_staff, is_superuser, password, email,
+    company name) of a user, cached in-process for STATELESS_AUTH_CACHE_TTL
+    seconds, or None if the user no longer exists.
+    """
+    cached = _cached_account_state(user_id)
+    if cached is not None:
+        return cached[1]
+    return _cache_account_state(user_id, _account_state_query(user_id).first())
+
+
+async def _aaccount_state(user_id):
+    """_account_state() with the async ORM."""
+    cached = _cached_account_state(user_id)
+    if cached is not None:
+        return cached[1]
+    return _cache_account_state(user_id, await _account_state_query(user_id).afirst())
+
+
+def _in_memory_instance(model, **fields):
+    # Behaves like a row loaded from the database, without the query.
+    instance = model(**fields)
+    instance._state.adding = False
+    return instance
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the access token's
+    claims instead of loading the user (and then the company) on every
+    request.
+
+    The user's is_active flag, tenant, role, staff/superuser flags and (with
+    CHECK_REVOKE_TOKEN) password are re-checked against an in-process cache
+    with a short TTL, so deactivating a user, moving them or changing their
+    privileges revokes their tokens within STATELESS_AUTH_CACHE_TTL seconds;
+    email and company name are taken from the same state. Refreshing such a
+    token fails too (CompanyTokenRefreshSerializer). Tokens issued without
+    the tenant claims fall back to the regular database lookup.
+    aauthenticate() does the same for async views, with the async ORM.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in STATE_CLAIMS):
+            return super().get_user(validated_token)
+        state = _account_state(validated_token[api_settings.USER_ID_CLAIM])
+        return self.user_from_state(validated_token, state)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if any(claim not in validated_token for claim in STATE_CLAIMS):
+            user = await sync_to_async(super().get_user)(validated_token)
+        else:
+            state = await _aaccount_state(validated_token[api_settings.USER_ID_CLAIM])
+            user = self.user_from_state(validated_token, state)
+        return user, validated_token
+
+    def user_from_state(self, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        is_active, company_id, role, is_staff, is_superuser, password, email, company_name = state
+        if not is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if privileges_changed(validated_token, state):
+            raise AuthenticationFailed('Token is outdated, please log in again', code='token_outdated')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(password):
+                raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+
+        company = _in_memory_instance(Company, id=company_id, name=company_name)
+        user = _in_memory_instance(
+            User,
+            id=validated_token[api_settings.USER_ID_CLAIM],
+            email=email,
+            company=company,
+            role=role,
+            is_active=is_active,
+            is_staff=is_staff,
+            is_superuser=is_superuser,
+        )
+        return user
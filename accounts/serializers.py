@@ -0,0 +1,42 @@
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.authentication import STATE_CLAIMS, _account_state_query, privileges_changed
+
+
+class CompanyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Login serializer that also puts the user's tenant and role into the
+    tokens, so StatelessJWTAuthentication can build request.user from the
+    access token alone. Access tokens minted by the refresh endpoint copy
+    these claims from the refresh token.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['email'] = user.email
+        token['company_id'] = user.company_id
+        token['company_name'] = user.company.name
+        token['role'] = user.role
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class CompanyTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that re-checks the tenant, role and staff/superuser claims of
+    the refresh token against the user: new tokens would copy them, so a
+    user moved or demoted since login has to log in again. (Inactive users
+    are refused by TokenRefreshSerializer.)
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if all(claim in refresh for claim in STATE_CLAIMS):
+            state = _account_state_query(refresh[api_settings.USER_ID_CLAIM]).first()
+            if state is not None and privileges_changed(refresh, state):
+                raise AuthenticationFailed('Token is outdated, please log in again', code='token_outdated')
+        return super().validate(attrs)
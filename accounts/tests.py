@@ -1,3 +1,63 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
-# Create your tests here.
+from accounts.authentication import StatelessJWTAuthentication, _account_cache
+from companies.models import Company
+from ecommerce.fixtures import create_user
+
+
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        _account_cache.clear()
+        self.addCleanup(_account_cache.clear)
+        self.client = APIClient()
+        self.company = Company.objects.create(name='Acme')
+        self.user = create_user(self.company, is_staff=True)
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'email': self.user.email, 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, tokens):
+        return self.client.post('/api/auth/refresh/', {'refresh': tokens['refresh']})
+
+    def authenticate(self, access):
+        _account_cache.clear()
+        authentication = StatelessJWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(access))
+
+    def test_refreshed_token_authenticates_unchanged_user(self):
+        response = self.refresh(self.login())
+
+        self.assertEqual(response.status_code, 200)
+        user = self.authenticate(response.json()['access'])
+        self.assertEqual((user.id, user.company.name, user.is_staff), (self.user.id, 'Acme', True))
+
+    def test_demoted_user_is_rejected_after_refresh(self):
+        tokens = self.login()
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+
+        response = self.refresh(tokens)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_outdated')
+        with self.assertRaisesMessage(AuthenticationFailed, 'Token is outdated'):
+            self.authenticate(tokens['access'])
+
+    def test_deactivated_user_is_rejected_after_refresh(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+
+        self.assertEqual(self.refresh(tokens).status_code, 401)
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate(tokens['access'])
+
+    def test_company_name_comes_from_account_state(self):
+        tokens = self.login()
+        Company.objects.filter(pk=self.company.pk).update(name='Acme Ltd')
+
+        self.assertEqual(self.authenticate(tokens['access']).company.name, 'Acme Ltd')
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from analytics.rollups import rebuild_rollups
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the daily order rollups from the orders table, a few days at a time. '
+        'Use it to backfill history or to repair drift (e.g. after orders were deleted).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day (YYYY-MM-DD), default the oldest order.')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD), default today.')
+        parser.add_argument('--company', type=int, action='append', dest='companies',
+                            help='Only this company id (repeatable).')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days rebuilt per transaction.')
+
+    def parse_day(self, value, name):
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'--{name} must be a date (YYYY-MM-DD).')
+        return day
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['companies']:
+            orders = orders.filter(company_id__in=options['companies'])
+        bounds = orders.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None and not options['start']:
+            self.stdout.write('No orders to roll up.')
+            return
+
+        start = (
+            self.parse_day(options['start'], 'start') if options['start']
+            else timezone.localdate(bounds['first'])
+        )
+        end = self.parse_day(options['end'], 'end') if options['end'] else timezone.localdate()
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be positive.')
+
+        total = 0
+        day = start
+        while day <= end:
+            chunk_end = min(day + timedelta(days=options['chunk_days'] - 1), end)
+            rows = rebuild_rollups(day, chunk_end, company_ids=options['companies'])
+            total += rows
+            self.stdout.write(f'{day}..{chunk_end}: {rows} rows')
+            day = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} rollup rows.'))
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("companies", "0001_initial"),
+        ("products", "0002_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyOrderRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("status", models.CharField(max_length=20)),
+                ("orders", models.IntegerField(default=0)),
+                ("units", models.BigIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_rollups",
+                        to="companies.company",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="order_rollups",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Daily order rollup",
+                "verbose_name_plural": "Daily order rollups",
+                "ordering": ["day"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("company", "day", "product", "status"),
+                        name="uniq_rollup_company_day_product_status",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import models
+
+
+class DailyOrderRollup(models.Model):
+    """
+    Orders of one product in one status, created on one day (TIME_ZONE).
+
+    Maintained incrementally by analytics.rollups as orders are created and
+    change status; rebuild_order_rollups recomputes it from the orders table.
+    """
+    company = models.ForeignKey(
+        'companies.Company',
+        on_delete=models.CASCADE,
+        related_name='order_rollups'
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='order_rollups'
+    )
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Daily order rollup'
+        verbose_name_plural = 'Daily order rollups'
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'day', 'product', 'status'],
+                name='uniq_rollup_company_day_product_status'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} product #{self.product_id} {self.status}: {self.orders} orders"
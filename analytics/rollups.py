@@ -0,0 +1,208 @@
+"""
+Incremental maintenance of DailyOrderRollup.
+
+Order writes call record_orders_created / record_status_changes inside
+their own transaction, so the rollup commits (or rolls back) with the
+orders. Each call turns the events into per-row deltas and applies them
+set-wise with one upsert per ROLLUP_BATCH rows (INSERT ... ON DUPLICATE
+KEY UPDATE on MySQL, ON CONFLICT ... DO UPDATE elsewhere) that adds the
+deltas to existing rows.
+
+Revenue is quantity x the order's ``unit_price``, the product price when
+the order was placed, so a status change moves exactly what creation added
+whatever the product costs now. An order keeps the day it was created on.
+Orders saved or deleted one by one (Order.save/delete, which the API and
+the admin use) are tracked; bulk writes, cascades from product or company
+deletes and raw SQL are not, and need rebuild_order_rollups.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from products.models import Product
+from .models import DailyOrderRollup
+
+# Rollup rows inserted/updated per statement.
+ROLLUP_BATCH = 500
+
+# What an order counts in the rollup, besides its company and day.
+ORDER_STATE_FIELDS = ('product_id', 'quantity', 'unit_price', 'status')
+
+
+def rollup_day(created_at):
+    return timezone.localdate(created_at)
+
+
+def _new_deltas():
+    return defaultdict(lambda: [0, 0, Decimal('0')])
+
+
+def _add(deltas, key, sign, quantity, price):
+    delta = deltas[key]
+    delta[0] += sign
+    delta[1] += sign * quantity
+    delta[2] += sign * quantity * price
+
+
+def order_state(order):
+    return tuple(getattr(order, name) for name in ORDER_STATE_FIELDS)
+
+
+def record_orders_created(orders, using=None):
+    """Count new orders."""
+    record_order_changes([(order.company_id, order.created_at, None, order_state(order)) for order in orders], using)
+
+
+def record_status_changes(changes, using=None):
+    """
+    Move orders between status buckets. ``changes`` holds
+    (company_id, product_id, created_at, quantity, unit_price, old_status, new_status).
+    """
+    record_order_changes([
+        (company_id, created_at, (product_id, quantity, unit_price, old_status),
+         (product_id, quantity, unit_price, new_status))
+        for company_id, product_id, created_at, quantity, unit_price, old_status, new_status in changes
+    ], using)
+
+
+def record_order_changes(changes, using=None):
+    """
+    Move orders between rollup rows. ``changes`` holds (company_id,
+    created_at, before, after), ``before``/``after`` being the
+    ORDER_STATE_FIELDS values of the order, or None for a created/deleted
+    order.
+    """
+    changes = [change for change in changes if change[2] != change[3]]
+    if not changes:
+        return
+    # Orders bulk-inserted without a unit_price count at the current price.
+    unpriced = {state[0] for change in changes for state in change[2:] if state is not None and state[2] is None}
+    prices = dict(
+        Product.objects.using(using).filter(id__in=unpriced).values_list('id', 'price')
+    ) if unpriced else {}
+
+    deltas = _new_deltas()
+    for company_id, created_at, before, after in changes:
+        day = rollup_day(created_at)
+        for sign, state in ((-1, before), (1, after)):
+            if state is None:
+                continue
+            product_id, quantity, unit_price, status = state
+            if unit_price is None:
+                unit_price = prices.get(product_id, Decimal('0'))
+            _add(deltas, (company_id, product_id, day, status), sign, quantity, unit_price)
+    apply_rollup_deltas(deltas, using)
+
+
+def _upsert_sql(connection, rows):
+    quote = connection.ops.quote_name
+    table = quote(DailyOrderRollup._meta.db_table)
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * rows)
+    sql = (
+        f'INSERT INTO {table} (company_id, product_id, day, status, orders, units, revenue) '
+        f'VALUES {placeholders} '
+    )
+    if connection.vendor == 'mysql':
+        return sql + (
+            'ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), '
+            'units = units + VALUES(units), revenue = revenue + VALUES(revenue)'
+        )
+    # SQLite and PostgreSQL
+    return sql + (
+        'ON CONFLICT (company_id, day, product_id, status) DO UPDATE SET '
+        f'orders = {table}.orders + excluded.orders, units = {table}.units + excluded.units, '
+        f'revenue = {table}.revenue + excluded.revenue'
+    )
+
+
+def apply_rollup_deltas(deltas, using=None):
+    """Add ``{(company_id, product_id, day, status): [orders, units, revenue]}`` to the rollup."""
+    using = using or router.db_for_write(DailyOrderRollup)
+    connection = connections[using]
+    # Sorted so concurrent writers touch rows in the same order.
+    keys = sorted(key for key, delta in deltas.items() if any(delta))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(keys), ROLLUP_BATCH):
+            batch = keys[start:start + ROLLUP_BATCH]
+            params = []
+            for company_id, product_id, day, status in batch:
+                orders, units, revenue = deltas[(company_id, product_id, day, status)]
+                params.extend([
+                    company_id, product_id, connection.ops.adapt_datefield_value(day), status,
+                    orders, units, connection.ops.adapt_decimalfield_value(revenue, 16, 2),
+                ])
+            cursor.execute(_upsert_sql(connection, len(batch)), params)
+
+
+def rebuild_rollups(start, end, company_ids=None, using=None):
+    """
+    Recompute the rollup rows of days ``start``..``end`` (inclusive) from
+    the orders table and the order archive. Returns the number of rows
+    written.
+
+    Orders are read and the rollup rewritten in one transaction that first
+    locks the companies and the range's rollup rows, so incremental writers
+    of those companies wait for it rather than being overwritten: placing
+    an order needs a share lock on its company row (foreign key check), and
+    status changes, edits and deletes update a rollup row of the range.
+    """
+    from companies.models import Company
+    from orders.models import ArchivedOrder, Order  # orders.models imports this module
+
+    tz = timezone.get_current_timezone()
+    since = timezone.make_aware(datetime.combine(start, time.min), tz)
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+
+    companies = Company.objects.using(using)
+    rollups = DailyOrderRollup.objects.using(using).filter(day__gte=start, day__lte=end)
+    if company_ids:
+        companies = companies.filter(pk__in=company_ids)
+        rollups = rollups.filter(company_id__in=company_ids)
+
+    with transaction.atomic(using=using):
+        # Locking reads come first: on MySQL the snapshot of the reads
+        # below starts after them, so it includes every writer waited for.
+        list(companies.select_for_update().order_by('pk').values_list('pk', flat=True))
+        list(rollups.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+        totals = _new_deltas()
+        for model in (Order, ArchivedOrder):
+            orders = model.objects.using(using).filter(created_at__gte=since, created_at__lt=until)
+            if company_ids:
+                orders = orders.filter(company_id__in=company_ids)
+            rows = orders.annotate(day=TruncDate('created_at', tzinfo=tz)).values(
+                'company_id', 'product_id', 'day', 'status'
+            ).annotate(
+                order_count=Count('id'),
+                unit_count=Sum('quantity'),
+                total=Sum(
+                    F('quantity') * Coalesce('unit_price', 'product__price'),
+                    output_field=DecimalField(max_digits=16, decimal_places=2)
+                )
+            ).order_by()
+            for row in rows:
+                key = (row['company_id'], row['product_id'], row['day'], row['status'])
+                totals[key][0] += row['order_count']
+                totals[key][1] += row['unit_count']
+                totals[key][2] += row['total']
+
+        rollups.delete()
+        created = DailyOrderRollup.objects.using(using).bulk_create([
+            DailyOrderRollup(
+                company_id=company_id,
+                product_id=product_id,
+                day=day,
+                status=status,
+                orders=order_count,
+                units=unit_count,
+                revenue=total
+            )
+            for (company_id, product_id, day, status), (order_count, unit_count, total) in totals.items()
+        ], batch_size=ROLLUP_BATCH)
+    return len(created)
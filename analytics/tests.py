@@ -0,0 +1,119 @@
+from decimal import Decimal
+
+from django.contrib import admin
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from analytics.models import DailyOrderRollup
+from analytics.rollups import rebuild_rollups
+from ecommerce.fixtures import TenantTestMixin
+from orders.models import Order
+from products.models import Product
+
+
+class OrderRollupTests(TenantTestMixin, APITestCase):
+    product_price = Decimal('2.50')
+    product_stock = 100
+
+    def setUp(self):
+        super().setUp()
+        self.widget = self.product
+        self.gadget = self.create_product('Gadget', price=Decimal('10.00'))
+
+    def rollup_rows(self):
+        return sorted(
+            DailyOrderRollup.objects.filter(orders__gt=0).values_list(
+                'product_id', 'day', 'status', 'orders', 'units', 'revenue'
+            )
+        )
+
+    def place_and_update_orders(self):
+        response = self.client.post('/api/orders/', {'orders': [
+            {'product_id': self.widget.id, 'quantity': 2},
+            {'product_id': self.widget.id, 'quantity': 3},
+            {'product_id': self.gadget.id, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        ids = [order['id'] for order in response.data]
+
+        self.client.patch('/api/orders/bulk_status/', {'orders': [
+            {'id': ids[0], 'status': 'SUCCESS'},
+            {'id': ids[2], 'status': 'FAILED'},
+        ]}, format='json')
+        self.client.patch(f'/api/orders/{ids[1]}/', {'status': 'SUCCESS'}, format='json')
+
+    def test_incremental_rollup_tracks_creation_and_status_changes(self):
+        self.place_and_update_orders()
+        today = timezone.localdate()
+
+        self.assertEqual(self.rollup_rows(), sorted([
+            (self.widget.id, today, 'SUCCESS', 2, 5, Decimal('12.50')),
+            (self.gadget.id, today, 'FAILED', 1, 1, Decimal('10.00')),
+        ]))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.place_and_update_orders()
+        self.create_order(4, product=self.gadget)
+        incremental = self.rollup_rows()
+
+        today = timezone.localdate()
+        rebuild_rollups(today, today)
+
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def all_rollup_rows(self):
+        # zero-order rows too: they must hold no units or revenue either
+        return sorted(
+            row for row in DailyOrderRollup.objects.values_list('product_id', 'status', 'orders', 'units', 'revenue')
+            if any(row[2:])
+        )
+
+    def assert_rebuild_agrees(self):
+        incremental = self.all_rollup_rows()
+        today = timezone.localdate()
+        rebuild_rollups(today, today)
+        self.assertEqual(self.all_rollup_rows(), incremental)
+
+    def test_status_change_after_a_price_change_moves_the_creation_price(self):
+        response = self.client.post(
+            '/api/orders/', {'orders': [{'product_id': self.widget.id, 'quantity': 2}]}, format='json'
+        )
+        order_id = response.data[0]['id']
+        Product.objects.filter(pk=self.widget.id).update(price=Decimal('20.00'))
+
+        self.client.patch('/api/orders/bulk_status/', {'orders': [{'id': order_id, 'status': 'SUCCESS'}]}, format='json')
+        self.client.patch(f'/api/orders/{order_id}/', {'status': 'FAILED'}, format='json')
+
+        self.assertEqual(self.all_rollup_rows(), [(self.widget.id, 'FAILED', 1, 2, Decimal('5.00'))])
+        self.assert_rebuild_agrees()
+
+    def test_deletes_and_edits_adjust_the_rollup(self):
+        order = self.create_order(2)
+        order.quantity = 4
+        order.save()
+        order.product = self.gadget
+        order.save()
+        self.assertEqual(self.all_rollup_rows(), [(self.gadget.id, 'PENDING', 1, 4, Decimal('40.00'))])
+
+        self.assertEqual(self.client.delete(f'/api/orders/{self.create_order(1).id}/').status_code, 204)
+        self.create_order(3)
+        admin.site._registry[Order].delete_queryset(None, Order.objects.filter(product=self.widget))
+
+        self.assertEqual(self.all_rollup_rows(), [(self.gadget.id, 'PENDING', 1, 4, Decimal('40.00'))])
+        self.assert_rebuild_agrees()
+
+    def test_summary_reads_only_the_rollup(self):
+        self.place_and_update_orders()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/orders/summary/')
+
+        self.assertEqual(response.status_code, 200)
+        totals = {row['status']: row for row in response.data['results'] if row['orders']}
+        self.assertEqual(totals['SUCCESS']['units'], 5)
+        self.assertEqual(totals['FAILED']['revenue'], Decimal('10.00'))
+
+    def test_rejects_bad_range(self):
+        response = self.client.get('/api/analytics/orders/daily/', {'start': '2024-02-01', 'end': '2024-01-01'})
+
+        self.assertEqual(response.status_code, 400)
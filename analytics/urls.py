@@ -0,0 +1,10 @@
+from django.urls import path, include
+from .views import OrderAnalyticsViewSet
+from rest_framework.routers import DefaultRouter
+
+router = DefaultRouter()
+router.register(r'orders', OrderAnalyticsViewSet, basename='order-analytics')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
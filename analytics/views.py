@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from ecommerce.permissions import AdminPermission
+from orders.models import Order
+from .models import DailyOrderRollup
+
+# Range used when the request does not give one.
+DEFAULT_RANGE_DAYS = 30
+
+
+def _parse_day(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'`{name}` must be an ISO date (YYYY-MM-DD).')
+    return day
+
+
+def rollup_filters(params):
+    """
+    Filters from the query parameters (ValueError on bad input):
+
+    - start / end: inclusive ISO dates, default the last 30 days
+    - status: one of Order.STATUS_CHOICES
+    - product: product id
+    """
+    end = _parse_day(params['end'], 'end') if params.get('end') else timezone.localdate()
+    start = (
+        _parse_day(params['start'], 'start') if params.get('start')
+        else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    )
+    if start > end:
+        raise ValueError('`start` must not be after `end`.')
+    filters = {'day__gte': start, 'day__lte': end}
+
+    status_value = params.get('status')
+    if status_value:
+        valid_choices = [c[0] for c in Order.STATUS_CHOICES]
+        if status_value not in valid_choices:
+            raise ValueError(f'Invalid status. Valid choices: {valid_choices}')
+        filters['status'] = status_value
+
+    product = params.get('product')
+    if product:
+        try:
+            filters['product_id'] = int(product)
+        except ValueError:
+            raise ValueError('`product` must be an integer.')
+
+    return filters
+
+
+TOTALS = {'orders': Sum('orders'), 'units': Sum('units'), 'revenue': Sum('revenue')}
+
+
+class OrderAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Order reporting served from DailyOrderRollup: the cost depends on the
+    number of days, products and statuses in range, never on the number of
+    orders.
+    """
+    permission_classes = [AdminPermission]
+    # reports tolerate replica lag (ecommerce/db_routing.py)
+    read_database = 'replica'
+    max_top_products = 100
+
+    def get_rollups(self, request):
+        filters = rollup_filters(request.query_params)
+        return DailyOrderRollup.objects.filter(company_id=request.user.company_id, **filters), filters
+
+    def respond(self, request, build):
+        try:
+            rollups, filters = self.get_rollups(request)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'start': filters['day__gte'],
+            'end': filters['day__lte'],
+            'results': build(rollups),
+        })
+
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        """Orders, units and revenue per day and status (GET).
+
+        Query: ?start=&end=&status=&product=
+        """
+        return self.respond(request, lambda rollups: list(
+            rollups.values('day', 'status').annotate(**TOTALS).order_by('day', 'status')
+        ))
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Totals per status over the range (GET).
+
+        Query: ?start=&end=&product=
+        """
+        return self.respond(request, lambda rollups: list(
+            rollups.values('status').annotate(**TOTALS).order_by('status')
+        ))
+
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        """Best-selling products by revenue over the range (GET).
+
+        Query: ?start=&end=&status=&limit=<n> (default 10, max 100)
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_top_products)
+        except ValueError:
+            return Response({'detail': '`limit` must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.respond(request, lambda rollups: list(
+            rollups.values('product_id', 'product__name').annotate(**TOTALS).order_by('-revenue', 'product_id')[:limit]
+        ))
@@ -0,0 +1,238 @@
+"""
+Many concurrent clients on the hot read paths: one WSGI worker against one
+ASGI worker with the async read views (ecommerce/async_views.py).
+
+    python -m benchmarks.concurrency [--clients 1000] [--duration 20] [--threads 4] [--db-latency 50]
+
+Both servers run in this process: --clients closed-loop clients (asyncio
+tasks) request the product list, a product, the order list, an order and
+the index page, back to back. The WSGI side hands each request to a pool of
+--threads threads, as one gunicorn gthread worker does (GUNICORN_THREADS);
+the ASGI side awaits Django's ASGIHandler with ASYNC_READ_VIEWS on and
+CONN_MAX_AGE=0, as gunicorn.conf.py sets up SERVER_MODE=asgi.
+
+--db-latency adds a sleep (in ms) to every SQL statement, standing in for
+the round trip to MySQL and for slow queries: SQLite answers in
+microseconds, which would hide what waiting costs. Reported per server:
+throughput, latency percentiles (queueing included) and errors of the
+requests completed within --duration, how many were still running or
+queued when it ended, and the peak number of threads.
+
+To load real servers instead, run gunicorn with SERVER_MODE=wsgi or asgi
+and point benchmarks.loadtest at it with --clients 1000.
+"""
+import argparse
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django
+
+HOST = 'testserver'
+
+
+def seed(products, orders):
+    from accounts.serializers import CompanyTokenObtainPairSerializer
+    from orders.models import Order
+    from products.models import Product
+
+    company, user = create_tenant()
+    Product.objects.bulk_create([
+        Product(company=company, name=f'Product {i}', price=Decimal('9.99'), stock=1000, created_by=user)
+        for i in range(products)
+    ])
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    Order.objects.bulk_create([
+        Order(company=company, product_id=product_ids[i % len(product_ids)], quantity=1, created_by=user)
+        for i in range(orders)
+    ], batch_size=1000)
+
+    paths = [
+        '/api/products/',
+        f'/api/products/{product_ids[0]}/',
+        '/api/orders/',
+        f'/api/orders/{Order.objects.values_list("id", flat=True).first()}/',
+        '/',
+    ]
+    token = CompanyTokenObtainPairSerializer.get_token(user).access_token
+    return paths, {'authorization': f'Bearer {token}'}
+
+
+def add_db_latency(seconds):
+    from django.db.backends.signals import connection_created
+
+    def wait(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def on_connection(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wait)
+
+    # every server thread opens its own connection
+    connection_created.connect(on_connection, weak=False)
+
+
+def wsgi_get(app, path, headers):
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+    status = []
+    body = app(environ, lambda line, response_headers, exc_info=None: status.append(int(line[:3])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return status[0]
+
+
+async def asgi_get(app, path, headers):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode())] + [(name.encode(), value.encode()) for name, value in headers.items()],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Future()  # the client never disconnects early
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def closed_loop(request, paths, clients, duration):
+    latencies = []
+    errors = 0
+    peak_threads = threading.active_count()
+    in_flight = 0
+
+    async def client(offset):
+        nonlocal errors, in_flight
+        index = offset
+        while True:
+            start = time.perf_counter()
+            in_flight += 1
+            try:
+                status = await request(paths[index % len(paths)])
+            except Exception:
+                status = 500
+            finally:
+                in_flight -= 1
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += status >= 400
+            index += 1
+
+    tasks = [asyncio.ensure_future(client(offset)) for offset in range(clients)]
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        peak_threads = max(peak_threads, threading.active_count())
+        await asyncio.sleep(0.05)
+    # requests still running (or queued) at the deadline are not counted
+    unfinished = in_flight
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return list(latencies), errors, unfinished, peak_threads
+
+
+def run_wsgi(paths, headers, clients, duration, threads):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    app = WSGIHandler()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        async def request(path):
+            return await asyncio.get_running_loop().run_in_executor(pool, wsgi_get, app, path, headers)
+        return asyncio.run(closed_loop(request, paths, clients, duration))
+
+
+def run_asgi(paths, headers, clients, duration):
+    from django.core.handlers.asgi import ASGIHandler
+    from django.db import connections
+    from django.test import override_settings
+
+    database = connections.settings['default']
+    conn_max_age = database['CONN_MAX_AGE']
+    database['CONN_MAX_AGE'] = 0
+    try:
+        with override_settings(ASYNC_READ_VIEWS=True, ROOT_URLCONF='ecommerce.asgi_urls'):
+            app = ASGIHandler()
+            return asyncio.run(closed_loop(lambda path: asgi_get(app, path, headers), paths, clients, duration))
+    finally:
+        database['CONN_MAX_AGE'] = conn_max_age
+
+
+def report(label, latencies, errors, unfinished, peak_threads, duration):
+    print(f'{label:>6} {len(latencies) / duration:>10.1f} {percentile(latencies, 50):>9.1f} '
+          f'{percentile(latencies, 95):>9.1f} {percentile(latencies, 99):>9.1f} {errors:>7} '
+          f'{unfinished:>11} {peak_threads:>8}')
+
+
+def run(clients, duration, threads, db_latency, products, orders):
+    from django.test import override_settings
+
+    print(f'seeding {products} products and {orders} orders...')
+    paths, headers = seed(products, orders)
+    if db_latency:
+        add_db_latency(db_latency / 1000)
+
+    print(f'{clients} clients, {duration:.0f} s each, {db_latency} ms per query')
+    print(f'{"server":>6} {"req/s":>10} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7} {"unfinished":>11} {"threads":>8}')
+    # every query is slow on purpose: keep the slow query log quiet
+    with override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0):
+        report('wsgi', *run_wsgi(paths, headers, clients, duration, threads), duration)
+        report('asgi', *run_asgi(paths, headers, clients, duration), duration)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--threads', type=int, default=4, help='threads of the WSGI worker')
+    parser.add_argument('--db-latency', type=float, default=50.0, help='ms added to every SQL statement')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.clients, args.duration, args.threads, args.db_latency, args.products, args.orders)
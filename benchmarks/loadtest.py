@@ -0,0 +1,106 @@
+"""
+Closed-loop HTTP load test against a running server: N concurrent clients
+each send requests back to back for a fixed duration over keep-alive
+connections. Use it to compare `runserver` with the gunicorn profile.
+
+    python -m benchmarks.loadtest http://localhost:8000/api/products/ \\
+        --email admin@example.com --password admin123 --clients 32 --duration 20
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.utils import percentile
+
+
+def _connection(url):
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=30)
+
+
+def _path(url):
+    parts = urlsplit(url)
+    return parts.path + (f'?{parts.query}' if parts.query else '')
+
+
+def login(base_url, email, password):
+    conn = _connection(base_url)
+    body = json.dumps({'email': email, 'password': password})
+    conn.request('POST', '/api/auth/login/', body=body, headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    payload = response.read()
+    if response.status != 200:
+        raise SystemExit(f'login failed ({response.status}): {payload.decode()}')
+    return json.loads(payload)['access']
+
+
+def client_loop(url, headers, deadline, latencies, errors, lock):
+    conn = _connection(url)
+    path = _path(url)
+    local_latencies = []
+    local_errors = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                local_errors += 1
+        except (OSError, http.client.HTTPException):
+            local_errors += 1
+            conn.close()
+            conn = _connection(url)
+            continue
+        local_latencies.append((time.perf_counter() - start) * 1000)
+
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+
+def run(url, token, clients, duration):
+    headers = {'Connection': 'keep-alive'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client_loop, args=(url, headers, deadline, latencies, errors, lock))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f'url:         {url}')
+    print(f'clients:     {clients}')
+    print(f'requests:    {len(latencies)}')
+    print(f'errors:      {sum(errors)}')
+    print(f'throughput:  {len(latencies) / duration:.1f} req/s')
+    for pct in (50, 95, 99):
+        print(f'p{pct}:         {percentile(latencies, pct):.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('--token', help='JWT access token')
+    parser.add_argument('--email', help='log in with these credentials instead of --token')
+    parser.add_argument('--password')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    token = args.token
+    if args.email:
+        token = login(args.url, args.email, args.password)
+    run(args.url, token, args.clients, args.duration)
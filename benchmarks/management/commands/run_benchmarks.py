@@ -0,0 +1,211 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from accounts.serializers import CompanyTokenObtainPairSerializer
+from benchmarks.management.commands.seed_benchmark import COMPANY_PREFIX, STAFF_EMAIL
+from benchmarks.utils import percentile
+from ecommerce.pagination import KeysetPagination, OrderPagination, ProductPagination
+from orders.models import Order
+from products.models import Product
+
+
+def _cursor_at(queryset, offset):
+    row = queryset.order_by('-created_at', '-id').values_list('created_at', 'id')[offset:offset + 1].first()
+    if row is None:
+        return ''
+    return quote(KeysetPagination.encode_position(row))
+
+
+def build_scenarios(user):
+    """
+    Each scenario is (name, method, path, payload, options). Scenarios with
+    ``rollback`` run inside a transaction that is rolled back, so the seeded
+    data is reused unchanged between runs. ``admin`` scenarios request the
+    Django admin as the seeded staff user.
+    """
+    company_id = user.company_id
+    orders = Order.objects.filter(company_id=company_id)
+    products = Product.objects.filter(company_id=company_id, is_active=True)
+    order_count = orders.count()
+    product_count = products.count()
+
+    last_order_page = max((order_count - 1) // OrderPagination.page_size + 1, 1)
+    last_product_page = max((product_count - 1) // ProductPagination.page_size + 1, 1)
+    deep_order_cursor = _cursor_at(orders, (last_order_page - 1) * OrderPagination.page_size - 1)
+
+    product_ids = list(products.order_by('id').values_list('id', flat=True)[:1000])
+    order_ids = list(orders.order_by('-created_at').values_list('id', flat=True)[:500])
+    year_ago = timezone.localdate() - timedelta(days=365)
+    this_year = timezone.localdate().year
+
+    return [
+        ('product_list', 'GET', '/api/products/', None, {}),
+        ('product_list_uncached', 'GET', '/api/products/', None, {'clear_cache': True}),
+        ('product_list_deep_page', 'GET', f'/api/products/?page={last_product_page}', None, {'clear_cache': True}),
+        ('order_list', 'GET', '/api/orders/', None, {}),
+        ('order_list_deep_page', 'GET', f'/api/orders/?page={last_order_page}', None, {}),
+        ('order_list_keyset_deep_page', 'GET', f'/api/orders/?cursor={deep_order_cursor}', None, {}),
+        ('order_create_50_items', 'POST', '/api/orders/',
+         {'orders': [{'product_id': pid, 'quantity': 1} for pid in product_ids[:50]]}, {'rollback': True}),
+        ('order_status_patch', 'PATCH', f'/api/orders/{order_ids[0]}/' if order_ids else '/api/orders/0/',
+         {'status': 'FAILED'}, {'rollback': True}),
+        ('order_bulk_status_500', 'PATCH', '/api/orders/bulk_status/',
+         {'orders': [{'id': oid, 'status': 'FAILED'} for oid in order_ids]}, {'rollback': True}),
+        ('product_bulk_update_1000', 'PATCH', '/api/products/bulk_update/',
+         {'products': [{'id': pid, 'price': '9.99', 'stock_delta': 1} for pid in product_ids]}, {'rollback': True}),
+        ('order_export', 'GET', '/api/orders/export/', None, {}),
+        ('index_page', 'GET', '/', None, {'clear_cache': True}),
+        ('analytics_daily_year', 'GET', f'/api/analytics/orders/daily/?start={year_ago}', None, {}),
+        ('analytics_summary_year', 'GET', f'/api/analytics/orders/summary/?start={year_ago}', None, {}),
+        ('admin_order_changelist', 'GET', '/admin/orders/order/', None, {'admin': True}),
+        ('admin_order_changelist_page_100', 'GET', '/admin/orders/order/?p=100', None, {'admin': True}),
+        ('admin_order_changelist_company', 'GET', f'/admin/orders/order/?company={company_id}', None,
+         {'admin': True}),
+        ('admin_order_changelist_search', 'GET', '/admin/orders/order/?q=Product+12', None, {'admin': True}),
+        ('admin_order_changelist_year', 'GET', f'/admin/orders/order/?created_at__year={this_year}', None,
+         {'admin': True}),
+        ('admin_product_changelist', 'GET', f'/admin/products/product/?company={company_id}', None,
+         {'admin': True}),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the API benchmark scenarios against the seeded data (see seed_benchmark) '
+        'and record latency percentiles, query counts and peak memory as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--email', default='user0@company0.bench', help='User to run the scenarios as.')
+        parser.add_argument('--only', nargs='*', help='Run only these scenarios.')
+        parser.add_argument('--output', default='benchmark_results.json')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.select_related('company').get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'{options["email"]} not found, run seed_benchmark first.')
+        if not user.company.name.startswith(COMPANY_PREFIX):
+            raise CommandError('Benchmarks only run against seeded benchmark companies.')
+
+        token = CompanyTokenObtainPairSerializer.get_token(user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        client.cookies['access_token'] = str(token)
+
+        admin_client = Client()
+        staff = User.objects.filter(email=STAFF_EMAIL, is_staff=True).first()
+        if staff is not None:
+            admin_client.force_login(staff)
+
+        scenarios = build_scenarios(user)
+        if options['only']:
+            scenarios = [s for s in scenarios if s[0] in options['only']]
+        if staff is None:
+            self.stdout.write(self.style.WARNING(f'{STAFF_EMAIL} not found: skipping the admin scenarios.'))
+            scenarios = [s for s in scenarios if not s[4].get('admin')]
+
+        results = {}
+        # DEBUG off so timings exclude Django's query logging, as in production
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, method, path, payload, scenario_options in scenarios:
+                results[name] = self.run_scenario(
+                    admin_client if scenario_options.get('admin') else client, method, path, payload, scenario_options, options['repeat'], options['warmup']
+                )
+                self.stdout.write(
+                    f'{name:<30} p50 {results[name]["p50_ms"]:>8.2f} ms  p99 {results[name]["p99_ms"]:>8.2f} ms  '
+                    f'queries {results[name]["queries"]:>4}  peak {results[name]["peak_memory_kib"]:>8.0f} KiB'
+                )
+
+        report = {'meta': self.metadata(user), 'results': results}
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def request(self, client, method, path, payload, scenario_options):
+        if scenario_options.get('clear_cache'):
+            cache.clear()
+
+        def send():
+            response = client.generic(
+                method, path, json.dumps(payload) if payload is not None else '', content_type='application/json'
+            )
+            # consume streamed bodies so their cost is counted
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response
+
+        if not scenario_options.get('rollback'):
+            return send()
+        with transaction.atomic():
+            response = send()
+            transaction.set_rollback(True)
+        return response
+
+    def run_scenario(self, client, method, path, payload, scenario_options, repeat, warmup):
+        for _ in range(warmup):
+            self.request(client, method, path, payload, scenario_options)
+
+        samples = []
+        status_codes = set()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = self.request(client, method, path, payload, scenario_options)
+            samples.append((time.perf_counter() - start) * 1000)
+            status_codes.add(response.status_code)
+
+        # Query count and memory come from separate passes so neither the
+        # query capture nor tracemalloc distorts the timings above.
+        with CaptureQueriesContext(connection) as ctx:
+            self.request(client, method, path, payload, scenario_options)
+        query_count = len(ctx.captured_queries)
+        tracemalloc.start()
+        self.request(client, method, path, payload, scenario_options)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'method': method,
+            'path': path,
+            'requests': repeat,
+            'status_codes': sorted(status_codes),
+            'mean_ms': round(sum(samples) / len(samples), 3),
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p95_ms': round(percentile(samples, 95), 3),
+            'p99_ms': round(percentile(samples, 99), 3),
+            'queries': query_count,
+            'peak_memory_kib': round(peak / 1024, 1),
+        }
+
+    def metadata(self, user):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'company_orders': Order.objects.filter(company_id=user.company_id).count(),
+            'company_products': Product.objects.filter(company_id=user.company_id).count(),
+        }
@@ -0,0 +1,131 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from analytics.rollups import rebuild_rollups
+from companies.models import Company
+from orders.models import Order
+from products.models import Product
+
+COMPANY_PREFIX = 'Bench Company'
+PASSWORD = 'bench-password'
+# Superuser for the admin changelist scenarios; kept across --flush.
+STAFF_EMAIL = 'staff@benchmark.bench'
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    # auto_now_add would overwrite the spread-out timestamps we generate
+    fields = [model._meta.get_field(name) for name in field_names]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed benchmark companies, users, products and orders with bulk_create. '
+        f'Every user can log in with the password "{PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=2)
+        parser.add_argument('--users', type=int, default=3, help='Users per company (first one is ADMIN).')
+        parser.add_argument('--products', type=int, default=1000, help='Products per company.')
+        parser.add_argument('--orders', type=int, default=20000, help='Orders per company.')
+        parser.add_argument('--days', type=int, default=365, help='Spread order dates over this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for reproducible data.')
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded benchmark data first.')
+
+    def handle(self, *args, **options):
+        existing = Company.objects.filter(name__startswith=COMPANY_PREFIX)
+        if existing.exists():
+            if not options['flush']:
+                raise CommandError('Benchmark data already exists, use --flush to replace it.')
+            existing.delete()
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        names = [f'{COMPANY_PREFIX} {i}' for i in range(options['companies'])]
+        Company.objects.bulk_create([Company(name=name) for name in names], batch_size=batch_size)
+        companies = list(Company.objects.filter(name__in=names).order_by('id'))
+
+        password = make_password(PASSWORD)
+        roles = ['ADMIN'] + ['OPERATOR', 'VIEWER'] * options['users']
+        User.objects.bulk_create([
+            User(
+                email=f'user{j}@company{i}.bench',
+                password=password,
+                company=company,
+                role=roles[j],
+            )
+            for i, company in enumerate(companies)
+            for j in range(options['users'])
+        ], batch_size=batch_size)
+
+        now = timezone.now()
+        for i, company in enumerate(companies):
+            user_ids = list(User.objects.filter(company=company).values_list('id', flat=True))
+            Product.objects.bulk_create([
+                Product(
+                    company=company,
+                    name=f'Product {k}',
+                    price=Decimal(rng.randint(100, 100000)) / 100,
+                    stock=rng.randint(1000, 100000),
+                    created_by_id=rng.choice(user_ids),
+                )
+                for k in range(options['products'])
+            ], batch_size=batch_size)
+            product_ids = list(Product.objects.filter(company=company).values_list('id', flat=True))
+
+            remaining = options['orders']
+            with explicit_timestamps(Order, 'created_at'):
+                while remaining > 0:
+                    count = min(batch_size, remaining)
+                    Order.objects.bulk_create([
+                        self.make_order(rng, company, product_ids, user_ids, now, options['days'])
+                        for _ in range(count)
+                    ], batch_size=batch_size)
+                    remaining -= count
+            # bulk_create bypasses the incremental rollup updates
+            rebuild_rollups(
+                timezone.localdate(now - timedelta(days=options['days'])),
+                timezone.localdate(now),
+                company_ids=[company.id]
+            )
+
+            self.stdout.write(
+                f'{company.name}: {len(user_ids)} users, {len(product_ids)} products, {options["orders"]} orders'
+            )
+
+        if not User.objects.filter(email=STAFF_EMAIL).exists():
+            User.objects.create_superuser(email=STAFF_EMAIL, password=PASSWORD)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Log in as user0@company0.bench / {PASSWORD} (API) or {STAFF_EMAIL} / {PASSWORD} (admin)'
+        ))
+
+    def make_order(self, rng, company, product_ids, user_ids, now, days):
+        created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        status = rng.choices(['SUCCESS', 'PENDING', 'FAILED'], weights=[70, 20, 10])[0]
+        return Order(
+            company=company,
+            product_id=rng.choice(product_ids),
+            quantity=rng.randint(1, 5),
+            created_by_id=rng.choice(user_ids),
+            created_at=created_at,
+            status=status,
+            shipped_at=created_at + timedelta(hours=rng.randint(1, 72)) if status == 'SUCCESS' else None,
+        )
@@ -0,0 +1,49 @@
+"""
+Query count and latency of POST /api/orders/ against the number of line items.
+
+    python -m benchmarks.order_create [--repeat 50]
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django, timed
+
+LINE_ITEMS = [1, 10, 50, 200]
+
+
+def run(repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    from products.models import Product
+
+    company, user = create_tenant()
+    products = Product.objects.bulk_create([
+        Product(company=company, name=f'Product {i}', price=Decimal('9.99'), stock=10 ** 9, created_by=user)
+        for i in range(max(LINE_ITEMS))
+    ])
+    client = APIClient()
+    client.force_authenticate(user)
+
+    print(f'{"items":>6} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}')
+    for count in LINE_ITEMS:
+        payload = {'orders': [{'product_id': p.id, 'quantity': 1} for p in products[:count]]}
+        samples = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                response, elapsed = timed(lambda: client.post('/api/orders/', payload, format='json'))
+            assert response.status_code == 201, response.content
+            samples.append(elapsed)
+        print(f'{count:>6} {len(ctx.captured_queries):>8} '
+              f'{percentile(samples, 50):>9.2f} {percentile(samples, 99):>9.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.repeat)
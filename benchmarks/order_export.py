@@ -0,0 +1,74 @@
+"""
+Time-to-first-byte, total time and peak memory of the streaming CSV export.
+
+    python -m benchmarks.order_export [--orders 1000000]
+"""
+import argparse
+import resource
+import time
+import tracemalloc
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, setup_django
+
+SEED_BATCH = 10000
+
+
+def seed_orders(company, user, count):
+    from orders.models import Order
+    from products.models import Product
+
+    product = Product.objects.create(
+        company=company, name='Export Product', price=Decimal('9.99'), stock=0, created_by=user
+    )
+    for start in range(0, count, SEED_BATCH):
+        Order.objects.bulk_create([
+            Order(company=company, product=product, quantity=1, created_by=user, status='SUCCESS')
+            for _ in range(min(SEED_BATCH, count - start))
+        ], batch_size=SEED_BATCH)
+
+
+def run(count):
+    from rest_framework.test import APIClient
+
+    company, user = create_tenant()
+    print(f'seeding {count} orders...')
+    seed_orders(company, user, count)
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get('/api/orders/export/')
+    content = iter(response.streaming_content)
+    header = next(content)
+    first_byte = time.perf_counter() - start
+
+    lines = 1
+    size = len(header)
+    for chunk in content:
+        lines += chunk.count(b'\n')
+        size += len(chunk)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f'rows:               {lines - 1}')
+    print(f'bytes:              {size}')
+    print(f'time to first byte: {first_byte * 1000:.1f} ms')
+    print(f'total time:         {total:.2f} s')
+    print(f'peak traced memory: {peak / 1024 / 1024:.1f} MiB')
+    print(f'peak RSS growth:    {(rss_after - rss_before) / 1024:.1f} MiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=1000000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.orders)
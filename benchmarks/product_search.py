@@ -0,0 +1,97 @@
+"""
+Latency of the indexed product search against a LIKE '%term%' scan.
+
+    python -m benchmarks.product_search [--products 1000000] [--repeat 200]
+
+Product names are random combinations of a fixed word list (seeded, so runs
+are comparable). Queries are typeahead-style prefixes of one and two words.
+On SQLite the first search also builds the in-process index; that build time
+is reported separately.
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django, timed
+
+SEED_BATCH = 10000
+LIMIT = 20
+
+ADJECTIVES = [
+    'blue', 'red', 'green', 'black', 'silver', 'compact', 'deluxe', 'classic', 'smart', 'wireless',
+    'portable', 'heavy', 'light', 'organic', 'vintage', 'modern', 'premium', 'mini', 'ultra', 'eco',
+]
+NOUNS = [
+    'widget', 'gadget', 'lamp', 'chair', 'table', 'speaker', 'keyboard', 'monitor', 'bottle', 'backpack',
+    'jacket', 'blender', 'kettle', 'drill', 'camera', 'headphones', 'charger', 'router', 'mug', 'notebook',
+]
+
+
+def seed_products(company, user, count, rng):
+    from products.models import Product
+
+    for start in range(0, count, SEED_BATCH):
+        Product.objects.bulk_create([
+            Product(
+                company=company,
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(NOUNS)} {i}',
+                price=Decimal('9.99'),
+                stock=1,
+                created_by=user,
+            )
+            for i in range(start, min(start + SEED_BATCH, count))
+        ], batch_size=SEED_BATCH)
+
+
+def make_queries(rng, repeat):
+    queries = []
+    for _ in range(repeat):
+        word = rng.choice(NOUNS)
+        if rng.random() < 0.5:
+            queries.append(word[:rng.randint(2, len(word))])
+        else:
+            queries.append(f'{rng.choice(ADJECTIVES)} {word[:rng.randint(2, len(word))]}')
+    return queries
+
+
+def like_scan(company_id, query):
+    from products.models import Product
+
+    queryset = Product.objects.filter(company_id=company_id, is_active=True)
+    for term in query.split():
+        queryset = queryset.filter(name__icontains=term)
+    return list(queryset.order_by('name').values_list('id', flat=True)[:LIMIT])
+
+
+def run(count, repeat, seed):
+    from products.search import search_product_ids
+
+    rng = random.Random(seed)
+    company, user = create_tenant()
+    print(f'seeding {count} products...')
+    seed_products(company, user, count, rng)
+    queries = make_queries(rng, repeat)
+
+    _, build = timed(lambda: search_product_ids(company.id, 'warm up', LIMIT))
+    print(f'first search (index build on SQLite): {build:.1f} ms')
+
+    print(f'{"method":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    for label, func in [
+        ('index', lambda q: search_product_ids(company.id, q, LIMIT)),
+        ('like', lambda q: like_scan(company.id, q)),
+    ]:
+        samples = [timed(lambda: func(query))[1] for query in queries]
+        print(f'{label:>8} {percentile(samples, 50):>9.2f} '
+              f'{percentile(samples, 95):>9.2f} {percentile(samples, 99):>9.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.products, args.repeat, args.seed)
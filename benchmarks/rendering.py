@@ -0,0 +1,91 @@
+"""
+Render time and bytes on the wire of the largest API payloads.
+
+    python -m benchmarks.rendering [--repeat 50]
+
+Payloads: a product list page of 100, an order list page of 200 and the
+echo of a 200-line POST /api/orders/. Each is rendered with DRF's stdlib
+JSONRenderer and with FastJSONRenderer (orjson, when installed), checked to
+be byte-identical, then compressed the way CompressionMiddleware would
+(gzip, and brotli when installed) to report size and compression time.
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django, timed
+
+
+def payloads(company, user):
+    from django.utils import timezone
+
+    from orders.models import Order
+    from orders.serializers import OrderSerializer, order_rows
+    from products.models import Product
+    from products.serializers import product_list_rows
+    from products.stock import with_available_stock
+
+    products = Product.objects.bulk_create([
+        Product(company=company, name=f'Product {i} – 東京', price=Decimal('19.99') + i, stock=100,
+                created_by=user)
+        for i in range(200)
+    ])
+    orders = Order.objects.bulk_create([
+        Order(company=company, product=product, quantity=2, created_by=user, status='SUCCESS',
+              shipped_at=timezone.now())
+        for product in products
+    ])
+
+    product_page = product_list_rows.serialize(product_list_rows.rows(
+        with_available_stock(Product.objects.filter(company=company)).order_by('-id')[:100]
+    ))
+    order_page = order_rows.serialize(order_rows.rows(
+        Order.objects.filter(company=company).order_by('-id')[:200]
+    ))
+    created = Order.objects.filter(pk__in=[order.pk for order in orders]).select_related(
+        'product', 'company', 'created_by'
+    )
+    return [
+        ('product_list_100', {'count': 200, 'next': None, 'previous': None, 'results': product_page}),
+        ('order_list_200', {'count': 200, 'next': None, 'previous': None, 'results': order_page}),
+        ('order_create_200', OrderSerializer(created, many=True).data),
+    ]
+
+
+def run(repeat):
+    from django.middleware.gzip import GZipMiddleware
+    from django.utils.text import compress_string
+    from rest_framework.renderers import JSONRenderer
+
+    from ecommerce.compression import BROTLI_QUALITY, brotli
+    from ecommerce.renderers import FastJSONRenderer, orjson
+
+    print(f'orjson: {"yes" if orjson else "no (stdlib fallback)"}, brotli: {"yes" if brotli else "no"}')
+    company, user = create_tenant()
+    encoders = [('gzip', lambda body: compress_string(body, max_random_bytes=GZipMiddleware.max_random_bytes))]
+    if brotli is not None:
+        encoders.append(('br', lambda body: brotli.compress(body, quality=BROTLI_QUALITY)))
+
+    print(f'{"payload":>17} {"stdlib ms":>10} {"fast ms":>8} {"bytes":>8} '
+          + ' '.join(f'{name + " bytes":>10} {name + " ms":>8}' for name, _ in encoders))
+    for label, data in payloads(company, user):
+        stdlib = JSONRenderer().render(data)
+        fast = FastJSONRenderer().render(data)
+        assert stdlib == fast, f'{label}: FastJSONRenderer output differs'
+
+        stdlib_ms = percentile([timed(lambda: JSONRenderer().render(data))[1] for _ in range(repeat)], 50)
+        fast_ms = percentile([timed(lambda: FastJSONRenderer().render(data))[1] for _ in range(repeat)], 50)
+        columns = []
+        for name, compress in encoders:
+            samples = [timed(lambda: compress(fast)) for _ in range(repeat)]
+            columns.append(f'{len(samples[0][0]):>10} {percentile([ms for _, ms in samples], 50):>8.2f}')
+        print(f'{label:>17} {stdlib_ms:>10.2f} {fast_ms:>8.2f} {len(fast):>8} ' + ' '.join(columns))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.repeat)
@@ -0,0 +1,93 @@
+"""
+Serialization cost of the list endpoints: DRF serializers against RowSerializer.
+
+    python -m benchmarks.serializers [--rows 1000] [--repeat 20]
+
+For orders (OrderSerializer) and products (ProductListSerializer) the script
+times, per 1k rows, serialization alone (rows already loaded: model
+instances for DRF, values() dicts for RowSerializer) and query plus
+serialization, and checks that both render to the same JSON bytes.
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django, timed
+
+
+def seed(company, user, count):
+    from orders.models import Order
+    from products.models import Product
+
+    products = Product.objects.bulk_create([
+        Product(company=company, name=f'Product {i}', price=Decimal('19.99'), stock=100, created_by=user)
+        for i in range(count)
+    ], batch_size=1000)
+    Order.objects.bulk_create([
+        Order(company=company, product=products[i], quantity=1 + i % 5, created_by=user if i % 10 else None,
+              status='PENDING')
+        for i in range(count)
+    ], batch_size=1000)
+
+
+def run(count, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from orders.models import Order
+    from orders.serializers import OrderSerializer, order_rows
+    from products.models import Product
+    from products.serializers import ProductListSerializer, product_list_rows
+    from products.stock import with_available_stock
+
+    company, user = create_tenant()
+    seed(company, user, count)
+
+    cases = [
+        (
+            'orders',
+            Order.objects.filter(company=company).select_related('product', 'company', 'created_by').only(
+                'id', 'quantity', 'status', 'created_at', 'shipped_at',
+                'product__name', 'company__name', 'created_by__email'
+            ).order_by('-id'),
+            OrderSerializer,
+            order_rows,
+        ),
+        (
+            'products',
+            with_available_stock(Product.objects.filter(company=company)).only(
+                'id', 'name', 'price', 'stock', 'stock_shards', 'is_active'
+            ).order_by('-id'),
+            ProductListSerializer,
+            product_list_rows,
+        ),
+    ]
+
+    scale = 1000 / count
+    print(f'{"case":>9} {"path":>6} {"serialize p50":>14} {"query+ser p50":>14} {"p99":>8}  (ms per 1k rows)')
+    for label, queryset, serializer_class, rows in cases:
+        instances = list(queryset)
+        dicts = list(rows.rows(queryset))
+        same = JSONRenderer().render(serializer_class(instances, many=True).data) == \
+            JSONRenderer().render(rows.serialize(dicts))
+        assert same, f'{label}: RowSerializer output differs from {serializer_class.__name__}'
+
+        for path, serialize, end_to_end in [
+            ('drf', lambda: serializer_class(instances, many=True).data,
+             lambda: serializer_class(list(queryset.all()), many=True).data),
+            ('rows', lambda: rows.serialize(dicts),
+             lambda: rows.serialize(rows.rows(queryset.all()))),
+        ]:
+            serialize_ms = [timed(serialize)[1] * scale for _ in range(repeat)]
+            total_ms = [timed(end_to_end)[1] * scale for _ in range(repeat)]
+            print(f'{label:>9} {path:>6} {percentile(serialize_ms, 50):>14.2f} '
+                  f'{percentile(total_ms, 50):>14.2f} {percentile(total_ms, 99):>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        run(args.rows, args.repeat)
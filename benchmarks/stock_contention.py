@@ -0,0 +1,116 @@
+"""
+Many threads buying the same product at once, per stock engine.
+
+    python -m benchmarks.stock_contention [--threads 16] [--stock 2000] [--shards 8]
+
+Every thread places single-unit orders until the product is sold out. For
+each engine (locking, reservation, reservation with sharded stock) the
+script reports throughput and latency and checks that exactly the initial
+stock was sold: no overselling, no stock lost.
+
+Use MySQL for meaningful numbers (set the usual DB_* variables). On SQLite
+the test database is file-backed and every write transaction serialises
+on the database lock, so only the correctness check is informative.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.utils import benchmark_database, create_tenant, percentile, setup_django
+
+ENGINES = [('locking', 0), ('reservation', 0), ('reservation', None)]
+
+
+def configure_sqlite():
+    from django.db import connection
+
+    if connection.vendor != 'sqlite':
+        return
+    # Threads need a shared on-disk database, and IMMEDIATE transactions so
+    # writers queue on the lock instead of failing to upgrade it.
+    connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'stock_contention.sqlite3')
+    connection.settings_dict['OPTIONS'].update({'timeout': 60, 'transaction_mode': 'IMMEDIATE'})
+
+
+def buyer(user, product_id, latencies, errors):
+    from django.db import connection
+
+    from orders.services import OrderCreateError, create_orders
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                create_orders(user, [{'product_id': product_id, 'quantity': 1}])
+            except OrderCreateError as exc:
+                if 'Insufficient stock' in str(exc):
+                    return
+                errors.append(str(exc))
+                continue
+            except Exception as exc:
+                errors.append(repr(exc))
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        connection.close()
+
+
+def run_engine(engine, shards, threads, stock):
+    from django.test.utils import override_settings
+
+    from accounts.models import User
+    from orders.models import Order
+    from products.models import Product
+    from products.stock import set_stock_shards, with_available_stock
+
+    company, user = create_tenant(name=f'Contention {engine} {shards}')
+    user = User.objects.select_related('company').get(pk=user.pk)
+    product = Product.objects.create(
+        company=company, name='Hot Product', price=Decimal('1.00'), stock=stock, created_by=user
+    )
+    with override_settings(STOCK_ENGINE=engine):
+        if shards:
+            set_stock_shards(product, shards)
+
+        latencies, errors = [], []
+        workers = [
+            threading.Thread(target=buyer, args=(user, product.id, latencies, errors))
+            for _ in range(threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+    sold = Order.objects.filter(product=product).count()
+    left = with_available_stock(Product.objects.filter(pk=product.pk)).values_list(
+        'available_stock', flat=True
+    ).get()
+    label = f'{engine}+{shards} shards' if shards else engine
+    print(f'{label:>22} {sold / elapsed:>9.1f} {percentile(latencies, 50):>9.2f} '
+          f'{percentile(latencies, 99):>9.2f} {sold:>6} {left:>5} {len(errors):>7}')
+    assert sold + left == stock and left == 0, f'{label}: sold {sold}, left {left} of {stock}'
+
+
+def run(threads, stock, shards):
+    print(f'{"engine":>22} {"orders/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"sold":>6} {"left":>5} {"errors":>7}')
+    for engine, engine_shards in ENGINES:
+        run_engine(engine, shards if engine_shards is None else engine_shards, threads, stock)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=2000)
+    parser.add_argument('--shards', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    configure_sqlite()
+    with benchmark_database():
+        run(args.threads, args.stock, args.shards)
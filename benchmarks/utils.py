@@ -0,0 +1,60 @@
+"""
+Shared helpers for the standalone benchmark scripts.
+
+Each script runs against a throw-away test database created from the
+configured DATABASES (set the usual DB_* variables to point it at MySQL),
+so it never touches real data.
+"""
+import math
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def create_tenant(name='Bench Co', role='ADMIN'):
+    from accounts.models import User
+    from companies.models import Company
+
+    company = Company.objects.create(name=name)
+    user = User.objects.create_user(
+        email=f'{role.lower()}@{name.lower().replace(" ", "-")}.test',
+        password='bench-password',
+        company=company,
+        role=role,
+    )
+    return company, user
@@ -1,10 +1,21 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import Company
 
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_at']
+    list_display = ['name', 'created_at', 'related_links']
     search_fields = ['name']
     ordering = ['name']
     readonly_fields = ['created_at']
+
+    @admin.display(description='Related')
+    def related_links(self, obj):
+        # Order and product changelists filter on ?company=<id> (CompanyFilter)
+        return format_html(
+            '<a href="{}?company={}">Orders</a> / <a href="{}?company={}">Products</a>',
+            reverse('admin:orders_order_changelist'), obj.pk,
+            reverse('admin:products_product_changelist'), obj.pk
+        )
@@ -0,0 +1,235 @@
+"""
+Admin changelists that stay fast on large tables.
+
+PerformanceModelAdmin changes what a changelist costs:
+
+- counts: no second COUNT(*) of the unfiltered table
+  (``show_full_result_count = False``), and EstimatedCountPaginator takes
+  the row count of an unfiltered list from the database statistics; a
+  filtered count stops at ADMIN_COUNT_LIMIT rows (or just past the page
+  shown) and is displayed as "10000+", with the next page still reachable;
+- search: a ``^field`` is a prefix match of the whole term (``LIKE 'x%'``,
+  which an index can serve, instead of ``LIKE '%x%'`` per word) and an
+  ``=field`` an exact match; related fields go through a subquery rather
+  than a join, and a number is looked up as an id;
+- date hierarchy: the year/month/day links come from the MIN and MAX of the
+  field rather than a DISTINCT over every row, so a period without rows can
+  be listed. MIN and MAX are read as two ORDER BY ... LIMIT 1 index lookups
+  (SQLite cannot answer both from an index in one statement);
+- CompanyFilter filters on ?company=<id> without loading every company into
+  the sidebar; CompanyAdmin links to it.
+
+Subclasses set ``list_select_related`` for every relation their
+``list_display`` (and the related ``__str__``) touches, and use
+``autocomplete_fields``/``raw_id_fields`` for foreign keys.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Min, Q, QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from companies.models import Company
+
+# Filtered changelists count at most this many rows.
+ADMIN_COUNT_LIMIT = 10000
+
+# Search field prefix -> lookup; fields without one are prefix matches.
+SEARCH_LOOKUPS = {'^': 'istartswith', '=': 'iexact'}
+
+
+def estimated_row_count(model, using):
+    """Row count of ``model``'s table from the database statistics, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 before the table was first analyzed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class CappedCount(int):
+    """A count that stopped at ``limit`` rows: one more than that, shown as "<limit>+"."""
+
+    def __new__(cls, limit):
+        count = super().__new__(cls, limit + 1)
+        count.limit = limit
+        return count
+
+    def __str__(self):
+        return f'{self.limit}+'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts a filtered list up to ADMIN_COUNT_LIMIT rows, or up to the end of
+    ``page_number`` when that is further. A count that stops there is a
+    CappedCount, one row over the limit, so the page after it exists.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, page_number=1):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_limit = max(ADMIN_COUNT_LIMIT, page_number * self.per_page)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            # small tables are counted exactly: the statistics can be far off
+            if estimate is not None and estimate > ADMIN_COUNT_LIMIT:
+                return estimate
+        count = queryset.order_by()[:self.count_limit + 1].count()
+        return CappedCount(self.count_limit) if count > self.count_limit else count
+
+
+def _periods(first, last, kind):
+    if kind == 'year':
+        return [date(year, 1, 1) for year in range(first.year, last.year + 1)]
+    if kind == 'month':
+        periods, month = [], first.replace(day=1)
+        while month <= last:
+            periods.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+        return periods
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def _column_bound(aggregate):
+    # Min('field') / Max('field') of a plain column, without filter
+    if type(aggregate) not in (Min, Max) or aggregate.filter is not None:
+        return None
+    expressions = aggregate.source_expressions
+    if len(expressions) != 1 or type(expressions[0]) is not F:
+        return None
+    return expressions[0].name
+
+
+class DateRangeQuerySet(QuerySet):
+    """
+    dates()/datetimes() listing every period between the MIN and MAX of the
+    field, which is what the admin date hierarchy asks for.
+    """
+
+    def _bound(self, field_name, descending):
+        # the date hierarchy asks for the same bounds twice per changelist
+        bounds = self.__dict__.setdefault('_bounds', {})
+        key = (field_name, descending)
+        if key not in bounds:
+            bounds[key] = self.filter(**{f'{field_name}__isnull': False}).order_by(
+                f'-{field_name}' if descending else field_name
+            ).values_list(field_name, flat=True).first()
+        return bounds[key]
+
+    def aggregate(self, *args, **kwargs):
+        fields = {name: _column_bound(aggregate) for name, aggregate in kwargs.items()}
+        if args or not fields or None in fields.values():
+            return super().aggregate(*args, **kwargs)
+        return {
+            name: self._bound(field_name, descending=type(kwargs[name]) is Max)
+            for name, field_name in fields.items()
+        }
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        periods = _periods(bounds['first'], bounds['last'], kind)
+        return periods if order == 'ASC' else periods[::-1]
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        tz = tzinfo or timezone.get_current_timezone()
+        first, last = (timezone.localtime(bounds[key], tz).date() for key in ('first', 'last'))
+        periods = [
+            timezone.make_aware(datetime.combine(day, time.min), tz) for day in _periods(first, last, kind)
+        ]
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class CompanyFilter(admin.SimpleListFilter):
+    """?company=<id>; the sidebar only shows the selected company."""
+    title = 'company'
+    parameter_name = 'company'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value:
+            return []
+        name = Company.objects.filter(pk=value).values_list('name', flat=True).first() if value.isdigit() else None
+        return [(value, name or f'#{value}')]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            raise IncorrectLookupParameters(f'Invalid company id: {value}')
+        return queryset.filter(company_id=int(value))
+
+
+class PerformanceModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            page_number = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            page_number = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page_number=page_number)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateRangeQuerySet(
+            model=queryset.model, query=queryset.query, using=queryset._db, hints=queryset._hints
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        # ids go to the primary key index instead of every search field
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+
+        # The whole term is one prefix ('Product 12' finds 'Product 120'),
+        # not a prefix per word. A field across a relation is matched with a
+        # subquery on the related table, which the foreign key index joins.
+        query = Q()
+        for field_name in self.get_search_fields(request):
+            lookup = SEARCH_LOOKUPS.get(field_name[0], 'istartswith')
+            path = field_name.lstrip(''.join(SEARCH_LOOKUPS)).split(LOOKUP_SEP)
+            field = self.opts.get_field(path[0])
+            if len(path) > 1 and field.many_to_one:
+                related = field.related_model._base_manager.filter(
+                    **{f'{LOOKUP_SEP.join(path[1:])}__{lookup}': term}
+                )
+                query |= Q(**{f'{path[0]}__in': related.values('pk')})
+            else:
+                query |= Q(**{f'{LOOKUP_SEP.join(path)}__{lookup}': term})
+        return queryset.filter(query), False
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+# Async views for the hot read paths (see ecommerce/async_views.py), unless
+# ASYNC_READ_VIEWS is set (an empty value from .env counts as unset).
+if not os.environ.get('ASYNC_READ_VIEWS'):
+    os.environ['ASYNC_READ_VIEWS'] = 'True'
 
 application = get_asgi_application()
@@ -0,0 +1,20 @@
+"""
+URL configuration of ASGI deployments (ROOT_URLCONF when ASYNC_READ_VIEWS
+is on): ecommerce.urls with the index page and the GETs of the product and
+order list and detail routes served by async views
+(ecommerce/async_views.py).
+"""
+from django.urls import include, path
+
+from orders.urls import router as order_router
+from products.urls import router as product_router
+from .async_views import with_async_reads
+from .urls import urlpatterns as sync_urlpatterns
+from .views import aindex
+
+urlpatterns = [
+    path('', aindex, name='index'),
+    path('api/products/', include(with_async_reads(product_router.urls))),
+    path('api/orders/', include(with_async_reads(order_router.urls))),
+    *sync_urlpatterns,
+]
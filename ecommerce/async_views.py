@@ -0,0 +1,179 @@
+"""
+Async read endpoints for ASGI deployments.
+
+Under ASGI a sync view holds a thread for the whole request, waiting on the
+database included. The hot read paths have async twins instead: a viewset
+using AsyncReadMixin defines ``alist``/``aretrieve`` next to
+``list``/``retrieve``, written with the async ORM (``afirst``, ``aget``,
+``async for``) and the async cache API. with_async_reads() serves GET and
+HEAD of a router's routes with them and leaves every other method on the
+regular (sync) view; ecommerce/asgi_urls.py applies it.
+
+The async path does what APIView.dispatch() does, awaiting the parts that
+may wait:
+
+- authenticators with an ``aauthenticate`` coroutine (StatelessJWTAuthentication)
+  are awaited, other ones run in a thread;
+- ``has_permission``/``has_object_permission`` may be coroutine functions;
+- the response is rendered before it is returned (Django would call
+  ``render()`` in a thread).
+
+Requests negotiating another renderer than JSON (the browsable API) go to
+the sync view. Django's async ORM still runs each query in a thread, one per
+request, so in-flight queries are not capped by a thread pool but do hold a
+database connection each (use DB_POOL).
+"""
+from functools import wraps
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.urls import URLPattern
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+ASYNC_METHODS = ('get', 'head')
+
+
+async def aauthenticate(request):
+    """Set request.user and request.auth like Request._authenticate(), awaiting async authenticators."""
+    for authenticator in request.authenticators:
+        if hasattr(authenticator, 'aauthenticate'):
+            authenticate = authenticator.aauthenticate
+        else:
+            authenticate = sync_to_async(authenticator.authenticate)
+        try:
+            user_auth_tuple = await authenticate(request)
+        except exceptions.APIException:
+            request._not_authenticated()
+            raise
+        if user_auth_tuple is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth_tuple
+            return
+    request._not_authenticated()
+
+
+async def _allowed(result):
+    return await result if isawaitable(result) else result
+
+
+def rendered(response):
+    """A DRF Response rendered now, as a plain HttpResponse (other responses as they are)."""
+    if not isinstance(response, SimpleTemplateResponse):
+        return response
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code, headers=dict(response.items()))
+    plain.cookies = response.cookies
+    return plain
+
+
+class AsyncReadMixin:
+    """
+    Async dispatch of a viewset's read actions to their ``a<action>`` twins,
+    with the async counterparts of the GenericAPIView helpers they need.
+    """
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch() for a request initialized with initialize_request()."""
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return rendered(self.response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await aauthenticate(request)
+        await self.acheck_permissions(request)
+        if self.get_throttles():
+            await sync_to_async(self.check_throttles)(request)
+
+    async def acheck_permissions(self, request):
+        for permission in self.get_permissions():
+            if not await _allowed(permission.has_permission(request, self)):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
+
+    async def acheck_object_permissions(self, request, obj):
+        for permission in self.get_permissions():
+            if not await _allowed(permission.has_object_permission(request, self, obj)):
+                self.permission_denied(
+                    request,
+                    message=getattr(permission, 'message', None),
+                    code=getattr(permission, 'code', None)
+                )
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        await self.acheck_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+def async_reads(view):
+    """
+    Wrap a viewset view from a router so GET and HEAD run the async twin of
+    the action (``list`` -> ``alist``); other methods, and other renderers
+    than JSON, run ``view`` in a thread.
+    """
+    cls, initkwargs, actions = view.cls, view.initkwargs, dict(view.actions)
+    actions.setdefault('head', actions['get'])
+    sync_view = sync_to_async(view)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method.lower() in ASYNC_METHODS:
+            # what ViewSetMixin.as_view() and APIView.dispatch() set up
+            self = cls(**initkwargs)
+            self.action_map = actions
+            self.args = args
+            self.kwargs = kwargs
+            self.request = self.initialize_request(request, *args, **kwargs)
+            self.headers = self.default_response_headers
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            renderer, _ = self.perform_content_negotiation(self.request, force=True)
+            if isinstance(renderer, JSONRenderer):
+                return await self.adispatch(self.request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    return async_view
+
+
+def with_async_reads(urlpatterns):
+    """
+    Copy of a router's ``urlpatterns`` where the routes whose GET action has
+    an async twin on the viewset are served by async_reads().
+    """
+    patterns = []
+    for pattern in urlpatterns:
+        callback = pattern.callback if isinstance(pattern, URLPattern) else None
+        action = (getattr(callback, 'actions', None) or {}).get('get')
+        if action and hasattr(getattr(callback, 'cls', None), f'a{action}'):
+            pattern = URLPattern(pattern.pattern, async_reads(callback), pattern.default_args, pattern.name)
+        patterns.append(pattern)
+    return patterns
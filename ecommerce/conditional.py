@@ -0,0 +1,36 @@
+"""
+Helpers for conditional GET (ETag / Last-Modified) on API views.
+
+Views compute cheap validators (an aggregate or a single-row lookup) before
+doing any serializer work and return a 304 as soon as the client's copy is
+still current.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag derived from the given validator values."""
+    raw = '|'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """Return a 304 response if the client's cached copy is current, else None."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Payloads are per tenant, so shared caches must key on the credentials.
+    patch_vary_headers(response, ['Authorization'])
+    return response
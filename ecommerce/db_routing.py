@@ -0,0 +1,223 @@
+"""
+Read-replica routing.
+
+DATABASE_REPLICAS lists database aliases that replicate ``default``. Inside
+a request handled by ReplicaRoutingMiddleware, ReplicaRouter sends reads to
+one of them when all of these hold:
+
+- the request method is safe (GET, HEAD, OPTIONS);
+- the request has not written anything yet (any write pins the rest of the
+  request to the primary);
+- the client has not written recently: a write response sets a cookie that
+  keeps its reads on the primary for REPLICA_PIN_SECONDS, so users see their
+  own changes;
+- the replica is not lagging more than REPLICA_MAX_LAG seconds. Lag is
+  measured at most every REPLICA_LAG_CHECK_INTERVAL seconds per process.
+
+A view can override this with a ``read_database`` attribute: 'replica' reads
+from a replica even on a pinned client (fine for exports and reports, which
+tolerate a few seconds of lag), 'primary' never does. On a viewset it can be
+set per action with ``@action(..., read_database='replica')``. On a function
+view, use the ``read_database`` decorator.
+
+Writes, and code running outside a request (management commands, workers),
+always use ``default``. The whole request uses one replica, so a count and
+its page agree.
+"""
+import contextvars
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+_lag_lock = threading.Lock()
+_lag = {}  # alias -> (checked_at, lag in seconds or None when unknown/broken)
+
+
+class RequestRouting:
+    """Routing state of the current request."""
+
+    def __init__(self, allow_replica, pinned):
+        self.allow_replica = allow_replica
+        self.pinned = pinned
+        self.preference = None
+        self.wrote = False
+        self.replica = None
+
+
+def measure_lag(alias):
+    """Replication lag of ``alias`` in seconds; None when replication is not running."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except DatabaseError:  # MySQL < 8.0.22
+                cursor.execute('SHOW SLAVE STATUS')
+            row = cursor.fetchone()
+            if row is None:
+                return 0.0  # not replicating: the server is its own source
+            status = dict(zip([column[0] for column in cursor.description], row))
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            return None if lag is None else float(lag)
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT CASE WHEN pg_is_in_recovery() '
+                'THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END'
+            )
+            lag = cursor.fetchone()[0]
+            return None if lag is None else float(lag)
+    return 0.0
+
+
+def replica_lag(alias):
+    """Cached measure_lag(); an unreachable replica counts as broken (None)."""
+    now = time.monotonic()
+    with _lag_lock:
+        cached = _lag.get(alias)
+    if cached is not None and now - cached[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return cached[1]
+    try:
+        lag = measure_lag(alias)
+    except DatabaseError:
+        lag = None
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    return [
+        alias for alias in settings.DATABASE_REPLICAS
+        if (lag := replica_lag(alias)) is not None and lag <= settings.REPLICA_MAX_LAG
+    ]
+
+
+def reading_from_replica():
+    """True when the current request has read from a replica."""
+    routing = _routing.get()
+    return routing is not None and routing.replica not in (None, DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not settings.DATABASE_REPLICAS or routing.wrote:
+            return DEFAULT_DB_ALIAS
+        if routing.preference == 'primary':
+            return DEFAULT_DB_ALIAS
+        if routing.preference != 'replica' and (not routing.allow_replica or routing.pinned):
+            return DEFAULT_DB_ALIAS
+        if routing.replica is None:
+            replicas = healthy_replicas()
+            routing.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def read_database(preference):
+    """Decorator setting the read preference ('replica' or 'primary') of a function view."""
+    def decorator(view):
+        view.read_database = preference
+        return view
+    return decorator
+
+
+def _view_preference(view_func):
+    preference = getattr(view_func, 'read_database', None)
+    if preference is None:
+        # DRF views: per-action initkwargs first, then the view class
+        preference = getattr(view_func, 'initkwargs', {}).get('read_database')
+    if preference is None:
+        preference = getattr(getattr(view_func, 'cls', None), 'read_database', None)
+    return preference
+
+
+def _stream_with(content, routing):
+    # Streaming responses are read after the middleware has returned.
+    _routing.set(routing)
+    try:
+        yield from content
+    finally:
+        _routing.set(None)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        routing = self.request_routing(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    async def __acall__(self, request):
+        # the ORM's threads run with a copy of this context, so they see routing
+        routing = self.request_routing(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    @staticmethod
+    def request_routing(request):
+        return RequestRouting(
+            allow_replica=request.method in SAFE_METHODS,
+            pinned=PIN_COOKIE in request.COOKIES
+        )
+
+    @staticmethod
+    def finish(response, routing):
+        if response.streaming and not response.is_async:
+            response.streaming_content = _stream_with(response.streaming_content, routing)
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is not None:
+            routing.preference = _view_preference(view_func)
+        return None
@@ -26,10 +26,11 @@ if not email_logger.handlers:
 
 
 def send_order_confirmation(order):
-
+    # Called by the outbox worker (orders.notifications) with created_by,
+    # company and product already loaded.
     message = (
         f"Order Confirmation - Order #{order.id}\n"
-        f"  Customer: {order.created_by.email}\n"
+        f"  Customer: {order.created_by.email if order.created_by else 'N/A'}\n"
         f"  Company: {order.company.name}\n"
         f"  Product: {order.product.name}\n"
         f"  Quantity: {order.quantity}\n"
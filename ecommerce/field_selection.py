@@ -0,0 +1,74 @@
+"""
+Partial responses: ``?fields=id,name,stock`` or ``?exclude=company_name``.
+
+FieldSelectionMixin trims the serializer of the list and retrieve actions to
+the selected fields and narrows the queryset to match: ``only()`` loads just
+the columns behind those fields and ``select_related()`` keeps only the
+relations they traverse, so excluding ``company_name`` drops the company
+join. List endpoints serializing ``values()`` rows (ecommerce/row_serializers.py)
+narrow them with ``RowSerializer.select()``. Unknown names are a 400.
+"""
+from rest_framework.exceptions import ParseError
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class FieldSelectionMixin:
+    field_selection_actions = ('list', 'retrieve')
+    # columns loaded whatever the selection (e.g. used by object permissions)
+    field_selection_columns = ('id',)
+
+    def get_selected_fields(self):
+        """Selected output field names in declaration order, or None for all of them."""
+        if hasattr(self, '_selected_fields'):
+            return self._selected_fields
+
+        selected = None
+        params = self.request.query_params
+        if self.action in self.field_selection_actions and (FIELDS_PARAM in params or EXCLUDE_PARAM in params):
+            available = list(self.get_serializer_class()().fields)
+            requested = _names(params.get(FIELDS_PARAM, '')) or available
+            excluded = _names(params.get(EXCLUDE_PARAM, ''))
+            unknown = [name for name in requested + excluded if name not in available]
+            if unknown:
+                raise ParseError(f'Unknown fields: {", ".join(unknown)}. Valid choices: {available}')
+            selected = [name for name in available if name in requested and name not in excluded]
+            if not selected:
+                raise ParseError('At least one field must be selected.')
+
+        self._selected_fields = selected
+        return selected
+
+    def select_fields(self, queryset):
+        """Narrow only()/select_related() of ``queryset`` to the selected fields."""
+        selected = self.get_selected_fields()
+        if selected is None:
+            return queryset
+
+        fields = self.get_serializer_class()().fields
+        columns = list(self.field_selection_columns)
+        related = []
+        for name in selected:
+            source = fields[name].source
+            columns.append(source.replace('.', '__'))
+            if '.' in source:
+                related.append(source.rsplit('.', 1)[0].replace('.', '__'))
+        queryset = queryset.select_related(None)
+        if related:  # select_related() without arguments would follow every relation
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.get_selected_fields()
+        if selected is not None:
+            fields = getattr(serializer, 'child', serializer).fields
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        return serializer
@@ -0,0 +1,46 @@
+"""
+Test fixtures shared by the apps' tests.
+
+TenantTestMixin gives a test case one tenant: company 'Acme', its ADMIN user
+admin@acme.test (authenticated on ``self.client`` in API tests) and a
+'Widget' product.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from accounts.models import User
+from companies.models import Company
+from orders.models import Order
+from products.models import Product
+
+
+def create_user(company, role='ADMIN', **fields):
+    return User.objects.create_user(
+        email=f'{role.lower()}@{company.name.lower()}.test', password='password', company=company, role=role,
+        **fields
+    )
+
+
+class TenantTestMixin:
+    product_price = Decimal('9.99')
+    product_stock = 10
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.company = Company.objects.create(name='Acme')
+        self.user = create_user(self.company)
+        self.product = self.create_product('Widget')
+        if hasattr(self.client, 'force_authenticate'):
+            self.client.force_authenticate(self.user)
+
+    def create_product(self, name, company=None, **fields):
+        fields = {'price': self.product_price, 'stock': self.product_stock, **fields}
+        company = company or self.company
+        created_by = self.user if company == self.company else None
+        return Product.objects.create(company=company, name=name, created_by=created_by, **fields)
+
+    def create_order(self, quantity=1, **fields):
+        fields = {'product': self.product, 'created_by': self.user, **fields}
+        return Order.objects.create(company=self.company, quantity=quantity, **fields)
@@ -0,0 +1,167 @@
+"""
+Per-endpoint SQL instrumentation.
+
+A sampled fraction of requests (QUERY_INSTRUMENTATION_SAMPLE_RATE) runs with
+a ``connection.execute_wrapper`` hook that times every statement. Results are
+aggregated per resolved URL name in this process, served to staff at
+/api/instrumentation/queries/ and summarised in a ``Server-Timing`` header.
+
+Statements with identical SQL text executed more than once in a request
+(same template, different parameters) are reported as duplicates; that is
+the signature of an N+1 lookup. Queries run while a streaming response is
+being consumed happen after the middleware returns and are not recorded.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('ecommerce.queries')
+
+
+class QueryRecorder:
+    """execute_wrapper hook collecting (sql, duration_ms) for one request."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, (time.perf_counter() - start) * 1000))
+
+
+class QueryStats:
+    """Thread-safe per-endpoint aggregates for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, statements, top_n):
+        counts = {}
+        for sql, _ in statements:
+            counts[sql] = counts.get(sql, 0) + 1
+        slowest = sorted(statements, key=lambda s: s[1], reverse=True)[:top_n]
+        db_time = sum(duration for _, duration in statements)
+
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_time_ms': 0.0,
+                'slowest': [],
+                'duplicates': {},
+            })
+            stats['requests'] += 1
+            stats['queries'] += len(statements)
+            stats['max_queries'] = max(stats['max_queries'], len(statements))
+            stats['db_time_ms'] += db_time
+            stats['slowest'] = sorted(
+                stats['slowest'] + [{'sql': sql, 'duration_ms': round(d, 3)} for sql, d in slowest],
+                key=lambda s: s['duration_ms'],
+                reverse=True
+            )[:top_n]
+            for sql, count in counts.items():
+                if count > 1:
+                    stats['duplicates'][sql] = stats['duplicates'].get(sql, 0) + count
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                duplicates = sorted(stats['duplicates'].items(), key=lambda item: item[1], reverse=True)
+                endpoints[endpoint] = {
+                    'requests': stats['requests'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_time_ms': round(stats['db_time_ms'] / stats['requests'], 3),
+                    'total_db_time_ms': round(stats['db_time_ms'], 3),
+                    'slowest': list(stats['slowest']),
+                    'duplicates': [{'sql': sql, 'executions': count} for sql, count in duplicates[:10]],
+                }
+            return endpoints
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+query_stats = QueryStats()
+
+
+def _record_queries(recorder):
+    # execute_wrapper() is per connection, and connections are per thread.
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+    return stack
+
+
+class QueryInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def sampled():
+        sample_rate = settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+        return sample_rate > 0 and random.random() < sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with _record_queries(recorder):
+            response = self.get_response(request)
+        return self.report(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        # Under ASGI the ORM runs a request's queries in one thread
+        # (asgiref's thread-sensitive mode): hook that thread's connections.
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        stack = await sync_to_async(_record_queries)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, recorder, start)
+
+    def report(self, request, response, recorder, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.view_name if match else '<unresolved>'
+        query_stats.record(endpoint, recorder.statements, settings.QUERY_INSTRUMENTATION_TOP_STATEMENTS)
+
+        slow_ms = settings.QUERY_INSTRUMENTATION_SLOW_QUERY_MS
+        for sql, duration in recorder.statements:
+            if duration >= slow_ms:
+                logger.warning('Slow query on %s (%.1f ms): %s', endpoint, duration, sql)
+
+        db_ms = sum(duration for _, duration in recorder.statements)
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{len(recorder.statements)} queries", app;dur={total_ms:.1f}'
+        )
+        return response
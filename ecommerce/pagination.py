@@ -1,13 +1,189 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+from collections import OrderedDict
+from datetime import datetime
 
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class ProductPagination(PageNumberPagination):
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination on (created_at, id), newest first.
+
+    Each page is a single indexed range query: no COUNT(*) and no OFFSET, so
+    page 10,000 costs the same as page 1. The cursor is an opaque token
+    holding the position of the last row of the previous page. The order
+    is fixed: an ``ordering`` parameter is rejected (400) rather than
+    silently ignored.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() reading the page with the async ORM."""
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if self.ordering_query_param in request.query_params:
+            raise ValidationError({
+                self.ordering_query_param: 'Keyset pages are always ordered by created_at, newest first.'
+            })
+
+        queryset = queryset.order_by('-created_at', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        # One extra row tells us whether a next page exists.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.position_of(results[-1]) if self.has_next else None
+        return results
+
+    @staticmethod
+    def position_of(row):
+        # model instances, or values() rows (see ecommerce/row_serializers.py)
+        if isinstance(row, dict):
+            return row['created_at'], row['id']
+        return row.created_at, row.pk
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at, pk = decoded.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_position(position):
+        created_at, pk = position
+        raw = f'{created_at.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def encode_cursor(self, position):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_position(position))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+async def apage(paginator, number):
+    """Paginator.page() reading the rows with the async ORM; ``paginator.count`` must be set."""
+    number = paginator.validate_number(number)
+    bottom = (number - 1) * paginator.per_page
+    top = bottom + paginator.per_page
+    if top + paginator.orphans >= paginator.count:
+        top = paginator.count
+    return Page([row async for row in paginator.object_list[bottom:top]], number, paginator)
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination (what the browser UI uses) unless the client opts
+    into keyset mode by sending a ``cursor`` parameter; an empty ``?cursor=``
+    requests the first page.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() counting and reading the page with the async ORM."""
+        if self.use_keyset(request):
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        # PageNumberPagination.paginate_queryset() with an awaited count and page
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = await apage(paginator, page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def use_keyset(self, request):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            self.keyset.page_size_query_param = self.page_size_query_param
+            self.keyset.max_page_size = self.max_page_size
+        return self.keyset is not None
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ProductPagination(OptionalKeysetPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class OrderPagination(PageNumberPagination):
+class OrderPagination(OptionalKeysetPagination):
     page_size = 50
     page_size_query_param = 'page_size'
     max_page_size = 200
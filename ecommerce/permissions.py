@@ -1,3 +1,4 @@
+from datetime import timedelta
 from rest_framework import permissions
 from django.utils import timezone
 
@@ -28,6 +29,15 @@ class OperatorPermission(permissions.BasePermission):
         
         return True
 
+    def filter_queryset(self, request, queryset):
+        # Same rule as has_object_permission, as a queryset filter for bulk
+        # operations: operators only get the orders created today.
+        if request.user.role == 'ADMIN':
+            return queryset
+
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return queryset.filter(created_at__gte=start, created_at__lt=start + timedelta(days=1))
+
 # Viewers have read only access.
 class ViewerPermission(permissions.BasePermission):
 
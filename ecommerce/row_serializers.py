@@ -0,0 +1,132 @@
+"""
+Serialize ``values()`` rows the way a DRF serializer serializes instances.
+
+A ModelSerializer builds its field objects per instantiation and, per row
+and field, walks ``source`` through model instances (``product.name`` loads
+the related object first). RowSerializer reads the serializer's fields once,
+turns each ``source`` into a ``values()`` lookup (``product__name``) and
+picks a converter per field: none for fields whose DRF representation of a
+database value is the value itself (integers, strings, choices, booleans,
+primary keys), a specialised one for ISO 8601 datetimes and the field's own
+``to_representation`` for anything else (decimals, for instance). The
+output renders to the same JSON as the serializer's, byte for byte:
+
+    order_rows = RowSerializer(OrderSerializer)
+    data = order_rows.serialize(order_rows.rows(queryset))
+
+As with the serializer, a dotted source whose relation is null leaves the
+key out of the output (DRF skips the field) while a null value is None.
+"""
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations
+from rest_framework.settings import api_settings
+
+# Field types whose representation of a database value is that value.
+IDENTITY_FIELDS = {
+    fields.IntegerField,
+    fields.CharField,
+    fields.EmailField,
+    fields.ChoiceField,
+    fields.BooleanField,
+    relations.PrimaryKeyRelatedField,
+}
+
+
+def _iso_datetime(value, tz):
+    # DateTimeField.to_representation with the default ISO 8601 format
+    if timezone.is_aware(value):
+        value = value.astimezone(tz)
+    else:
+        value = timezone.make_aware(value, tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _is_default_datetime(field):
+    if type(field) is not fields.DateTimeField or hasattr(field, 'timezone'):
+        return False
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return output_format is not None and output_format.lower() == ISO_8601
+
+
+class RowSerializer:
+
+    def __init__(self, serializer_class, sources=None):
+        """``sources`` overrides the lookup of some output fields, e.g. {'stock': 'available_stock'}."""
+        self.serializer_class = serializer_class
+        self.sources = sources or {}
+        self._plan = None
+        self._lookups = None
+
+    def _compile(self):
+        plan = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            source = self.sources.get(name, field.source)
+            if source == '*' or isinstance(field, fields.SerializerMethodField):
+                raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} cannot be read from a row.')
+            lookup = source.replace('.', '__')
+            guard = source.split('.', 1)[0] if '.' in source else None
+
+            if type(field) in IDENTITY_FIELDS:
+                convert = None
+            elif _is_default_datetime(field):
+                convert = _iso_datetime
+            else:
+                convert = field.to_representation
+
+            plan.append((name, lookup, guard, convert))
+        self._set_plan(plan)
+
+    def _set_plan(self, plan):
+        lookups = []
+        for name, lookup, guard, convert in plan:
+            lookups.append(lookup)
+            if guard:
+                lookups.append(guard)
+        self._plan = plan
+        self._lookups = tuple(dict.fromkeys(lookups))
+
+    def select(self, names):
+        """A RowSerializer limited to the ``names`` output fields, so rows() reads only their columns."""
+        if self._plan is None:
+            self._compile()
+        subset = RowSerializer(self.serializer_class, self.sources)
+        subset._set_plan([entry for entry in self._plan if entry[0] in names])
+        return subset
+
+    @property
+    def lookups(self):
+        if self._plan is None:
+            self._compile()
+        return self._lookups
+
+    def rows(self, queryset, *extra):
+        """``queryset`` as dicts of the lookups the output needs, plus ``extra`` ones (e.g. for a cursor)."""
+        return queryset.values(*dict.fromkeys(self.lookups + extra))
+
+    def serialize(self, rows):
+        if self._plan is None:
+            self._compile()
+        tz = timezone.get_current_timezone()
+        plan = [
+            (name, lookup, guard, partial(convert, tz=tz) if convert is _iso_datetime else convert)
+            for name, lookup, guard, convert in self._plan
+        ]
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, guard, convert in plan:
+                if guard is not None and row[guard] is None:
+                    continue
+                value = row[lookup]
+                item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
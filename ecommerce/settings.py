@@ -22,12 +22,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-9pyrfieazy20rv$7q@g@mpr05rif-_gp5ze1xqbj9+k!0(=z$&'
+SECRET_KEY = os.environ.get('SECRET_KEY') or (
+    'django-insecure-9pyrfieazy20rv$7q@g@mpr05rif-_gp5ze1xqbj9+k!0(=z$&'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = (os.environ.get('DEBUG') or 'True').lower() in ('1', 'true', 'yes')
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -48,11 +50,16 @@ INSTALLED_APPS = [
     'companies',
     'products',
     'orders',
+    'analytics',
+    'benchmarks',
 ]
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'index'
 MIDDLEWARE = [
+    'ecommerce.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ecommerce.compression.CompressionMiddleware',
+    'ecommerce.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,7 +68,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'ecommerce.urls'
+# Responses below this many bytes are sent uncompressed (ecommerce/compression.py).
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE') or 1024)
+
+# Fraction of requests whose SQL is timed and aggregated per endpoint
+# (ecommerce/middleware.py); 0 disables the instrumentation.
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('QUERY_INSTRUMENTATION_SAMPLE_RATE') or 0.01)
+QUERY_INSTRUMENTATION_SLOW_QUERY_MS = float(os.environ.get('QUERY_INSTRUMENTATION_SLOW_QUERY_MS') or 100)
+QUERY_INSTRUMENTATION_TOP_STATEMENTS = 5
+
+# Serve the hot read endpoints (index, product and order list/detail) with
+# async views (ecommerce/async_views.py); ecommerce/asgi.py turns it on.
+ASYNC_READ_VIEWS = (os.environ.get('ASYNC_READ_VIEWS') or 'False').lower() in ('1', 'true', 'yes')
+
+ROOT_URLCONF = 'ecommerce.asgi_urls' if ASYNC_READ_VIEWS else 'ecommerce.urls'
 
 TEMPLATES = [
     {
@@ -84,21 +104,120 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+DB_ENGINE = os.environ.get('DB_ENGINE') or 'django.db.backends.mysql'
+
+# Optional pooled MySQL backend (pip install django-db-connection-pool[mysql]).
+DB_POOL = (os.environ.get('DB_POOL') or 'False').lower() in ('1', 'true', 'yes')
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    # Local stand-in for benchmarks and load tests without MySQL.
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'dj_db_conn_pool.backends.mysql' if DB_POOL else DB_ENGINE,
+            'NAME': os.environ.get('DB_NAME', 'ecommerce_db'),
+            'USER': os.environ.get('DB_USER', 'ecommerce_user'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),
+            'HOST': os.environ.get('DB_HOST', 'db'),
+            'PORT': os.environ.get('DB_PORT', '3306'),
+            'OPTIONS': {
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                'charset': 'utf8mb4',
+            },
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['POOL_OPTIONS'] = {
+            'POOL_SIZE': int(os.environ.get('DB_POOL_SIZE') or 10),
+            'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW') or 10),
+            'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE') or 3600),
+        }
+
+# Persistent connections: reuse a connection for CONN_MAX_AGE seconds instead
+# of opening one per request, and check it is still alive before reusing it.
+# With a pool, connections go back to the pool at the end of each request.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE') or (0 if DB_POOL else 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Read replicas of 'default': comma-separated hosts (MySQL) or database files
+# (SQLite stand-ins, e.g. copies of the primary file). Safe reads are routed
+# to them by ecommerce/db_routing.py.
+DB_REPLICAS = [replica.strip() for replica in (os.environ.get('DB_REPLICAS') or '').split(',') if replica.strip()]
+DATABASE_REPLICAS = []
+for index, replica in enumerate(DB_REPLICAS, start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if 'HOST' in DATABASES['default'] else 'NAME': replica,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['ecommerce.db_routing.ReplicaRouter']
+
+# Adds the test-only 'standin_replica' database (ecommerce/test_runner.py).
+TEST_RUNNER = 'ecommerce.test_runner.TestRunner'
+
+# Replicas further behind than this many seconds get no reads; lag is checked
+# at most every REPLICA_LAG_CHECK_INTERVAL seconds. After a write, a client's
+# reads stay on the primary for REPLICA_PIN_SECONDS.
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG') or 5)
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL') or 5)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS') or REPLICA_MAX_LAG + REPLICA_LAG_CHECK_INTERVAL)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) in production.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': os.environ.get('DB_NAME', 'ecommerce_db'),
-        'USER': os.environ.get('DB_USER', 'ecommerce_user'),
-        'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),
-        'HOST': os.environ.get('DB_HOST', 'db'),
-        'PORT': os.environ.get('DB_PORT', '3306'),
-        'OPTIONS': {
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-            'charset': 'utf8mb4',
-        },
+        'BACKEND': os.environ.get('CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION') or 'ecommerce',
     }
 }
 
+# Per-company product catalog cache (products/cache.py)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT') or 300)
+
+# In-process product search index (products/search.py, non-MySQL): rows
+# updated up to SEARCH_INDEX_OVERLAP_SECONDS before its watermark are re-read
+# (longer than any transaction that updates products). With a per-process
+# cache the index is rebuilt every SEARCH_INDEX_MAX_AGE seconds.
+SEARCH_INDEX_OVERLAP_SECONDS = int(os.environ.get('SEARCH_INDEX_OVERLAP_SECONDS') or 60)
+SEARCH_INDEX_MAX_AGE = int(os.environ.get('SEARCH_INDEX_MAX_AGE') or 300)
+
+# How orders take stock: 'locking' (row locks held for the order
+# transaction) or 'reservation' (products/stock.py). Reservations not
+# consumed within STOCK_RESERVATION_TTL seconds are released by the
+# release_stock_reservations command.
+STOCK_ENGINE = os.environ.get('STOCK_ENGINE') or 'locking'
+STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL') or 300)
+
+# Finished orders created more than ORDER_ARCHIVE_AFTER_DAYS days ago are
+# moved to the archive table by the archive_orders command (orders/archive.py).
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS') or 90)
+
+# Idempotency-Key on POST /api/orders/ (orders/idempotency.py): outcomes are
+# kept IDEMPOTENCY_KEY_TTL seconds (expired rows are deleted by the
+# purge_idempotency_keys command), the last IDEMPOTENCY_CACHE_SIZE per
+# process also in memory. A retry of a request still being processed waits
+# up to IDEMPOTENCY_WAIT_SECONDS for it; a request that never finished (dead
+# worker) holds its key for IDEMPOTENCY_CLAIM_TTL seconds, which must exceed
+# the longest request (GUNICORN_TIMEOUT).
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL') or 86400)
+IDEMPOTENCY_CLAIM_TTL = int(os.environ.get('IDEMPOTENCY_CLAIM_TTL') or 120)
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE') or 1000)
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS') or 10)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -118,13 +237,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Set JWT_STATELESS_AUTH=True to build request.user from the access token's
+# claims (accounts.authentication) instead of loading the user row on every
+# request. Account state is re-checked at most every STATELESS_AUTH_CACHE_TTL
+# seconds per process.
+JWT_STATELESS_AUTH = (os.environ.get('JWT_STATELESS_AUTH') or 'False').lower() in ('1', 'true', 'yes')
+STATELESS_AUTH_CACHE_TTL = int(os.environ.get('STATELESS_AUTH_CACHE_TTL') or 30)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # orjson-backed when installed, plain JSONRenderer output otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'ecommerce.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'ecommerce.pagination.ProductPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
@@ -148,6 +281,8 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.CompanyTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.CompanyTokenRefreshSerializer',
 }
 
 # Internationalization
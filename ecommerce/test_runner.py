@@ -0,0 +1,23 @@
+"""
+Test runner for ``manage.py test`` (settings.TEST_RUNNER).
+
+It adds 'standin_replica', an in-memory SQLite database that never
+replicates, for the replica routing tests (ecommerce/tests.py): rows
+written to the primary are missing there, which shows where each read
+went. The alias only exists while tests run.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+STANDIN_REPLICA = 'standin_replica'
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        databases = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            STANDIN_REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })
+        connections.settings[STANDIN_REPLICA] = databases[STANDIN_REPLICA]
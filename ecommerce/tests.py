@@ -0,0 +1,323 @@
+import json
+from datetime import timedelta
+from inspect import iscoroutinefunction
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.authentication import StatelessJWTAuthentication
+from accounts.models import User
+from accounts.serializers import CompanyTokenObtainPairSerializer
+from companies.models import Company
+from ecommerce import db_routing
+from ecommerce.fixtures import TenantTestMixin, create_user
+from ecommerce.middleware import QueryStats, query_stats
+from orders.archive import archive_horizon, archive_orders
+from orders.models import Order
+from products.cache import invalidate_catalog
+from products.models import Product
+from products.views import ProductViewSet
+
+
+class KeysetPaginationTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        orders = [self.create_order() for _ in range(5)]
+        # the keyset breaks created_at ties on id
+        Order.objects.filter(pk__in=[orders[1].pk, orders[2].pk]).update(created_at=timezone.now())
+
+    def test_cursor_walks_every_row_once_without_counting(self):
+        ids, url, params = [], '/api/orders/', {'cursor': '', 'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.data['results']), 2)
+                ids += [order['id'] for order in response.data['results']]
+                url, params = response.data['next'], None
+
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_rejects_bad_cursor_and_ordering(self):
+        self.assertEqual(self.client.get('/api/orders/', {'cursor': 'not-a-cursor'}).status_code, 404)
+        response = self.client.get('/api/products/', {'cursor': '', 'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+
+class QueryInstrumentationTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        query_stats.reset()
+        self.addCleanup(query_stats.reset)
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_sampled_requests_are_timed_and_aggregated(self):
+        response = self.client.get('/api/products/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", app;dur=[\d.]+$')
+
+        self.assertEqual(self.client.get('/api/instrumentation/queries/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        stats = self.client.get('/api/instrumentation/queries/').json()
+        self.assertEqual(stats['product-list']['requests'], 1)
+        self.assertGreater(stats['product-list']['max_queries'], 0)
+
+        self.assertEqual(self.client.delete('/api/instrumentation/queries/').status_code, 204)
+        self.assertNotIn('product-list', self.client.get('/api/instrumentation/queries/').json())
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get('/api/products/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(query_stats.snapshot(), {})
+
+    def test_repeated_statements_are_reported_as_duplicates(self):
+        stats = QueryStats()
+        stats.record('order-list', [('SELECT a', 1.0), ('SELECT b', 3.0), ('SELECT a', 2.0)], top_n=2)
+
+        snapshot = stats.snapshot()['order-list']
+        self.assertEqual(snapshot['duplicates'], [{'sql': 'SELECT a', 'executions': 2}])
+        self.assertEqual([s['sql'] for s in snapshot['slowest']], ['SELECT b', 'SELECT a'])
+        self.assertEqual((snapshot['avg_queries'], snapshot['avg_db_time_ms']), (3, 6.0))
+
+
+class IndexPageTests(TenantTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_product('Gadget')
+        self.create_product('Gizmo')
+        token = CompanyTokenObtainPairSerializer.get_token(self.user).access_token
+        self.headers = {'authorization': f'Bearer {token}'}
+
+    def test_renders_one_cached_page_of_products(self):
+        response = self.client.get('/', {'page_size': 2}, headers=self.headers)
+        self.assertContains(response, 'Products (3)')
+        self.assertContains(response, 'Gizmo')
+        self.assertContains(response, 'Gadget')
+        self.assertNotContains(response, 'Widget')
+        self.assertContains(response, 'href="/?page=2&amp;page_size=2"')
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/', {'page_size': 2}, headers=self.headers)
+        self.assertEqual(cached.content, response.content)
+        self.assertFalse([q for q in queries if 'products_product' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name='Gizmo').update(name='Gizmo Pro')
+            invalidate_catalog(self.company.id)
+        self.assertContains(self.client.get('/', {'page_size': 2}, headers=self.headers), 'Gizmo Pro')
+
+    def test_out_of_range_page_and_anonymous_visit(self):
+        self.assertEqual(self.client.get('/', {'page': 9}, headers=self.headers).status_code, 404)
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'productsTable')
+
+
+@override_settings(DATABASE_REPLICAS=['standin_replica'])
+class ReplicaRoutingTests(TenantTestMixin, APITestCase):
+    # 'standin_replica' (ecommerce/test_runner.py) is a second database that
+    # never replicates: rows written to the primary are missing there, which
+    # shows where each read went.
+    databases = {'default', 'standin_replica'}
+
+    def setUp(self):
+        super().setUp()
+        db_routing._lag.clear()
+        self.create_order()
+
+    def product_names(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(self.product_names(), [])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post(
+            '/api/products/', {'name': 'Gadget', 'price': '5.00', 'stock': 1}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(db_routing.PIN_COOKIE, response.cookies)
+        self.assertEqual(sorted(self.product_names()), ['Gadget', 'Widget'])
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('ecommerce.db_routing.measure_lag', return_value=60.0):
+            self.assertEqual(self.product_names(), ['Widget'])
+
+    def test_export_reads_from_the_replica_even_when_pinned(self):
+        self.client.cookies[db_routing.PIN_COOKIE] = '1'
+
+        self.assertEqual(self.product_names(), ['Widget'])
+        export = b''.join(self.client.get('/api/orders/export/').streaming_content)
+        self.assertEqual(export.decode().strip().splitlines()[1:], [])
+
+    def test_no_routing_outside_requests(self):
+        self.assertEqual(Product.objects.filter(name='Widget').count(), 1)
+
+
+class AdminPerformanceTests(TenantTestMixin, TestCase):
+    product_stock = 100
+
+    def setUp(self):
+        super().setUp()
+        self.other = Company.objects.create(name='Other')
+        Order.objects.bulk_create([
+            Order(company=self.company, product=self.product, quantity=1, created_by=self.user)
+            for _ in range(30)
+        ])
+        self.order = self.create_order(2, created_by=None)
+        superuser = User.objects.create_superuser(email='root@acme.test', password='password')
+        self.client.force_login(superuser)
+
+    def changelist(self, params=None):
+        response = self.client.get('/admin/orders/order/', params or {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist()
+
+        self.assertEqual(response.context['cl'].result_count, 31)
+        self.assertLess(len(queries), 12)
+        self.assertFalse([query for query in queries if 'DISTINCT' in query['sql']])
+
+    def test_company_filter_and_id_search(self):
+        self.assertEqual(self.changelist({'company': self.other.pk}).context['cl'].result_count, 0)
+        self.assertEqual(
+            list(self.changelist({'q': str(self.order.pk)}).context['cl'].result_list), [self.order]
+        )
+        self.assertEqual(self.changelist({'q': 'Wid'}).context['cl'].result_count, 31)
+        self.assertEqual(self.changelist({'q': 'idget'}).context['cl'].result_count, 0)
+        self.assertEqual(self.changelist({'q': 'acm'}).context['cl'].result_count, 31)
+        self.assertEqual(self.changelist({'q': 'ADMIN@acme.test'}).context['cl'].result_count, 30)
+        self.assertEqual(self.changelist({'q': 'admin@acme'}).context['cl'].result_count, 0)
+
+    def test_date_hierarchy_periods_span_min_and_max(self):
+        oldest = timezone.now() - timedelta(days=800)
+        Order.objects.filter(pk=self.order.pk).update(created_at=oldest)
+
+        response = self.changelist()
+
+        years = [choice['title'] for choice in date_hierarchy(response.context['cl'])['choices']]
+        first, last = timezone.localtime(oldest).year, timezone.localdate().year
+        self.assertEqual(years, [str(year) for year in range(first, last + 1)])
+
+    def test_estimated_count_above_the_limit(self):
+        with mock.patch('ecommerce.admin_performance.estimated_row_count', return_value=10_000_000):
+            self.assertEqual(self.changelist().context['cl'].result_count, 10_000_000)
+            self.assertEqual(self.changelist({'status__exact': 'PENDING'}).context['cl'].result_count, 31)
+
+    def test_capped_count_keeps_later_pages_reachable(self):
+        with mock.patch('ecommerce.admin_performance.ADMIN_COUNT_LIMIT', 20), \
+                mock.patch.object(admin.site._registry[Order], 'list_per_page', 5):
+            response = self.changelist({'status__exact': 'PENDING'})
+            self.assertEqual(str(response.context['cl'].result_count), '20+')
+            self.assertContains(response, '20+ Orders')
+            self.assertEqual(response.context['cl'].paginator.num_pages, 5)
+
+            # each page counts just past itself, up to the real end
+            response = self.changelist({'status__exact': 'PENDING', 'p': 6})
+            self.assertEqual(str(response.context['cl'].result_count), '30+')
+            self.assertEqual(len(response.context['cl'].result_list), 5)
+            response = self.changelist({'status__exact': 'PENDING', 'p': 7})
+            self.assertEqual(response.context['cl'].result_count, 31)
+            self.assertEqual(len(response.context['cl'].result_list), 1)
+
+
+@override_settings(ROOT_URLCONF='ecommerce.asgi_urls')
+class AsyncReadViewTests(TenantTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order(2)
+        self.old_order = self.create_order(status='SUCCESS')
+        Order.objects.filter(pk=self.old_order.pk).update(created_at=timezone.now() - timedelta(days=200))
+        archive_orders(archive_horizon())
+        for role in ('VIEWER', 'OPERATOR'):
+            create_user(self.company, role)
+
+    def headers(self, user=None):
+        token = CompanyTokenObtainPairSerializer.get_token(user or self.user).access_token
+        return {'authorization': f'Bearer {token}'}
+
+    async def test_reads_match_the_sync_views(self):
+        paths = [
+            '/api/products/', f'/api/products/{self.product.id}/', '/api/products/?fields=id,name&cursor=',
+            '/api/orders/', f'/api/orders/{self.order.id}/', f'/api/orders/{self.old_order.id}/',
+            '/api/orders/?created_after=2000-01-01', '/api/orders/?created_after=2000-01-01&cursor=&page_size=1',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                await cache.aclear()
+                response = await self.async_client.get(path, headers=self.headers())
+                with self.settings(ROOT_URLCONF='ecommerce.urls'):
+                    expected = await self.async_client.get(path, headers=self.headers())
+
+                self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    async def test_conditional_get_and_errors(self):
+        url = f'/api/products/{self.product.id}/'
+        etag = (await self.async_client.get(url, headers=self.headers()))['ETag']
+        users = User.objects.select_related('company').filter(role__in=['VIEWER', 'OPERATOR'])
+        viewer, operator = [user async for user in users.order_by('-role')]
+
+        for path, headers, status in [
+            (url, {**self.headers(), 'if-none-match': etag}, 304),
+            (url, {}, 401),
+            ('/api/products/999999/', self.headers(), 404),
+            ('/api/products/abc/', self.headers(), 404),
+            ('/api/orders/', self.headers(viewer), 403),
+            (f'/api/orders/{self.old_order.id}/', self.headers(operator), 403),
+            ('/api/orders/?page=9', self.headers(), 404),
+        ]:
+            with self.subTest(path=path, status=status):
+                response = await self.async_client.get(path, headers=headers)
+                self.assertEqual(response.status_code, status)
+
+    async def test_writes_and_browsable_api_use_the_viewset(self):
+        response = await self.async_client.post(
+            '/api/orders/', {'orders': [{'product_id': self.product.id, 'quantity': 1}]},
+            content_type='application/json', headers=self.headers()
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = await self.async_client.get('/api/products/', headers={**self.headers(), 'accept': 'text/html'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    async def test_stateless_authentication_is_awaited(self):
+        with mock.patch.object(ProductViewSet, 'authentication_classes', [StatelessJWTAuthentication]), \
+                mock.patch.object(StatelessJWTAuthentication, 'get_user', side_effect=AssertionError):
+            response = await self.async_client.get(f'/api/products/{self.product.id}/', headers=self.headers())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['company_name'], 'Acme')
+
+    @override_settings(QUERY_INSTRUMENTATION_SAMPLE_RATE=1)
+    async def test_index_page_and_query_instrumentation(self):
+        response = await self.async_client.get('/', headers=self.headers())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        self.assertContains(response, 'Widget')
+        self.assertNotIn('desc="0 queries"', response['Server-Timing'])
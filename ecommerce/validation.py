@@ -0,0 +1,11 @@
+"""Parsing of request values shared by the views."""
+
+
+def strict_int(value):
+    """
+    ``int(value)`` for integers and integer strings. Raises TypeError for
+    booleans and floats, which int() would take as 1/0 or truncate.
+    """
+    if isinstance(value, (bool, float)):
+        raise TypeError(f'Expected an integer, got {value!r}')
+    return int(value)
@@ -1,8 +1,31 @@
+from urllib.parse import urlencode
+
+from django.http import Http404
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django.contrib.auth import logout as django_logout, get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from products.cache import (
+    acatalog_cache_key, aget_catalog_entry, aset_catalog_entry, catalog_cache_key, get_catalog_entry,
+    set_catalog_entry
+)
 from products.models import Product
+from products.stock import with_available_stock
+from .middleware import query_stats
+from .pagination import KeysetPagination, ProductPagination
+
+# Query parameters that select a page of the index product table.
+INDEX_PAGE_PARAMS = ('page', 'page_size', 'cursor')
 
 
 def login_page(request):
@@ -10,41 +33,157 @@ def login_page(request):
     return render(request, 'login.html')
 
 
-def index(request):
-    # Serve the index page. Attempt to decode JWT (from cookie or header)
-    # and, if valid, load the user and their company's products (server-side
-    # rendering like before). If no valid token exists, render the template
-    # with empty context; the frontend will redirect to /login/.
-    token = None
+def _product_page_links(request, paginator):
+    # Relative links so a cached fragment is valid whatever host served it.
+    path = request.get_full_path()
+    if paginator.keyset is not None:
+        position = paginator.keyset.next_position
+        next_link = None
+        if position is not None:
+            next_link = replace_query_param(
+                path, paginator.cursor_query_param, KeysetPagination.encode_position(position)
+            )
+        return None, next_link
+
+    page = paginator.page
+    previous_link = next_link = None
+    if page.has_previous():
+        previous_link = (
+            replace_query_param(path, 'page', page.previous_page_number())
+            if page.previous_page_number() > 1 else remove_query_param(path, 'page')
+        )
+    if page.has_next():
+        next_link = replace_query_param(path, 'page', page.next_page_number())
+    return previous_link, next_link
+
+
+def _index_cache_key_suffix(request):
+    page_params = sorted((k, request.GET[k]) for k in INDEX_PAGE_PARAMS if k in request.GET)
+    return 'index?' + urlencode(page_params)
+
+
+def _index_products(company_id):
+    return with_available_stock(Product.objects.filter(
+        company_id=company_id,
+        is_active=True
+    ).select_related('created_by').only(
+        'id', 'name', 'price', 'stock', 'stock_shards', 'created_at', 'is_active', 'created_by__email'
+    )).order_by('-created_at', '-id')
+
+
+def _product_table_fragment(request, paginator, products):
+    previous_link, next_link = _product_page_links(request, paginator)
+    return str(render_to_string('partials/product_table.html', {
+        'products': products,
+        'count': paginator.page.paginator.count if paginator.keyset is None else None,
+        'previous_link': previous_link,
+        'next_link': next_link,
+    }))
+
+
+def render_product_table(request, company_id):
+    """
+    Render one page of the company's active products as an HTML fragment.
+
+    Paging follows the product API (``?page=``/``?page_size=``, or keyset
+    mode with ``?cursor=``) and only the columns the table shows are loaded.
+    Fragments live in the catalog cache, so any product change (which bumps
+    the company's catalog version) invalidates them.
+    """
+    cache_key = catalog_cache_key(company_id, _index_cache_key_suffix(request))
+    fragment = get_catalog_entry(cache_key)
+    if fragment is not None:
+        return mark_safe(fragment)
+
+    paginator = ProductPagination()
+    try:
+        products = paginator.paginate_queryset(_index_products(company_id), Request(request))
+    except NotFound as exc:
+        raise Http404(exc.detail)
+
+    fragment = _product_table_fragment(request, paginator, products)
+    set_catalog_entry(cache_key, fragment)
+    return mark_safe(fragment)
+
+
+async def arender_product_table(request, company_id):
+    """render_product_table() with the async ORM and cache API."""
+    cache_key = await acatalog_cache_key(company_id, _index_cache_key_suffix(request))
+    fragment = await aget_catalog_entry(cache_key)
+    if fragment is not None:
+        return mark_safe(fragment)
+
+    paginator = ProductPagination()
+    try:
+        products = await paginator.apaginate_queryset(_index_products(company_id), Request(request))
+    except NotFound as exc:
+        raise Http404(exc.detail)
+
+    fragment = _product_table_fragment(request, paginator, products)
+    await aset_catalog_entry(cache_key, fragment)
+    return mark_safe(fragment)
+
+
+def _token_user_id(request):
+    # JWT from the Authorization header or the frontend's cookie; None
+    # when missing, invalid or expired.
     auth_header = request.META.get('HTTP_AUTHORIZATION', '')
     if auth_header.startswith('Bearer '):
         token = auth_header.split(' ', 1)[1].strip()
     else:
         token = request.COOKIES.get('access_token') or request.COOKIES.get('access')
+    if not token:
+        return None
+    try:
+        access = AccessToken(token)
+    except TokenError:
+        return None
+    return access.get('user_id') or access.get('user')
+
+
+def _index_users():
+    return get_user_model().objects.only('id', 'email', 'role', 'company_id')
+
 
+def index(request):
+    # Serve the index page. Attempt to decode JWT (from cookie or header)
+    # and, if valid, load the user and render a page of their company's
+    # products. If no valid token exists, render the template with empty
+    # context; the frontend will redirect to /login/.
     user = None
-    products = []
-    if token:
+    product_table = ''
+    user_id = _token_user_id(request)
+    if user_id:
+        User = get_user_model()
         try:
-            access = AccessToken(token)
-            user_id = access.get('user_id') or access.get('user')
-            if user_id:
-                User = get_user_model()
-                try:
-                    user = User.objects.get(id=user_id)
-                    products = Product.objects.filter(
-                        company=user.company,
-                        is_active=True
-                    ).select_related('created_by').order_by('-created_at')
-                except User.DoesNotExist:
-                    user = None
-        except TokenError:
-            # invalid/expired token -> ignore and render login on client
+            user = _index_users().get(id=user_id)
+            product_table = render_product_table(request, user.company_id)
+        except User.DoesNotExist:
             user = None
 
     context = {
         'user': user,
-        'products': products
+        'product_table': product_table
+    }
+    return render(request, 'index.html', context)
+
+
+async def aindex(request):
+    """index() for ASGI deployments (ecommerce/asgi_urls.py), with the async ORM."""
+    user = None
+    product_table = ''
+    user_id = _token_user_id(request)
+    if user_id:
+        User = get_user_model()
+        try:
+            user = await _index_users().aget(id=user_id)
+            product_table = await arender_product_table(request, user.company_id)
+        except User.DoesNotExist:
+            user = None
+
+    context = {
+        'user': user,
+        'product_table': product_table
     }
     return render(request, 'index.html', context)
 
@@ -58,4 +197,14 @@ def logout_view(request):
     response.delete_cookie('refresh_token', path='/')
     return response
 
- 
+
+@api_view(['GET', 'DELETE'])
+@authentication_classes([*api_settings.DEFAULT_AUTHENTICATION_CLASSES, SessionAuthentication])
+@permission_classes([IsAdminUser])
+def query_stats_view(request):
+    """Per-endpoint SQL statistics of this process (staff only); DELETE resets them."""
+    if request.method == 'DELETE':
+        query_stats.reset()
+        return Response(status=204)
+    return Response(query_stats.snapshot())
+
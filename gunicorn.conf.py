@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration for production serving (read automatically by
+`gunicorn` from the working directory).
+
+    SERVER_MODE=wsgi   gthread workers serving ecommerce.wsgi (default)
+    SERVER_MODE=asgi   uvicorn workers serving ecommerce.asgi
+
+Worker and thread counts are derived from the CPU count and can be
+overridden with WEB_CONCURRENCY and GUNICORN_THREADS.
+"""
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+server_mode = os.environ.get('SERVER_MODE') or 'wsgi'
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or cores * 2 + 1)
+
+if server_mode == 'asgi':
+    wsgi_app = 'ecommerce.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # Each async worker runs its sync ORM calls on many threads, so a
+    # persistent connection per thread would pile up; rely on DB_POOL
+    # instead (see the Django docs on persistent connections under ASGI).
+    os.environ.setdefault('CONN_MAX_AGE', '0')
+else:
+    wsgi_app = 'ecommerce.wsgi:application'
+    worker_class = 'gthread'
+    # Threads overlap the time requests spend waiting on MySQL.
+    threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE') or 5)
+# Recycle workers now and then to bound memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 10000)
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER') or 1000)
+
+accesslog = '-'
+errorlog = '-'
@@ -1,39 +1,78 @@
-import csv
 from django.contrib import admin
-from django.http import HttpResponse
-from .models import Order
+from django.db import router, transaction
+
+from analytics.rollups import ORDER_STATE_FIELDS, record_order_changes
+from ecommerce.admin_performance import CompanyFilter, PerformanceModelAdmin
+from .models import ArchivedOrder, Order, OrderNotification
+from .exports import iter_row_chunks, streaming_csv_response
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(PerformanceModelAdmin):
     list_display = ['id', 'company', 'product', 'quantity', 'status', 'created_by', 'created_at', 'shipped_at']
-    list_filter = ['status', 'company', 'created_at']
-    search_fields = ['product__name', 'company__name', 'created_by__email']
+    # Product.__str__ and User.__str__ show their company's name
+    list_select_related = ['company', 'product__company', 'created_by__company']
+    list_filter = ['status', CompanyFilter]
+    date_hierarchy = 'created_at'
+    search_fields = ['^product__name', '^company__name', '=created_by__email']
+    autocomplete_fields = ['company', 'product']
     ordering = ['-created_at']
     readonly_fields = ['created_by', 'created_at']
     
     actions = ['export_as_csv']
+
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes skip Order.delete(): take the orders out of the
+        # analytics rollup here.
+        using = router.db_for_write(Order)
+        with transaction.atomic(using=using):
+            rows = queryset.using(using).values_list('company_id', 'created_at', *ORDER_STATE_FIELDS)
+            record_order_changes([(company_id, created_at, state, None) for company_id, created_at, *state in rows], using)
+            super().delete_queryset(request, queryset)
     
     def export_as_csv(self, request, queryset):
+        # Streamed in keyset-paged chunks so large selections never sit in memory.
+        chunks = iter_row_chunks(queryset, [
+            'id', 'company__name', 'product__name', 'quantity', 'status', 'created_by__email', 'created_at'
+        ])
+
+        def format_row(row):
+            order_id, company_name, product_name, quantity, status, email, created_at = row
+            return [
+                order_id,
+                company_name,
+                product_name,
+                quantity,
+                status,
+                email or 'N/A',
+                created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ]
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="all_orders.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Order ID', 'Company', 'Product', 'Quantity', 'Status', 'Created By', 'Created At'])
-        
-        for order in queryset.select_related('company', 'product', 'created_by'):
-            writer.writerow([
-                order.id,
-                order.company.name,
-                order.product.name,
-                order.quantity,
-                order.status,
-                order.created_by.email if order.created_by else 'N/A',
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        return response
+        return streaming_csv_response(
+            'all_orders.csv',
+            ['Order ID', 'Company', 'Product', 'Quantity', 'Status', 'Created By', 'Created At'],
+            chunks,
+            format_row
+        )
     
     export_as_csv.short_description = "Export selected orders as CSV"
-    
+
+
+@admin.register(OrderNotification)
+class OrderNotificationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    raw_id_fields = ['order']
+    ordering = ['-id']
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(PerformanceModelAdmin):
+    list_display = ['id', 'company', 'product', 'quantity', 'status', 'created_at', 'shipped_at']
+    list_select_related = ['company', 'product__company']
+    list_filter = ['status', CompanyFilter]
+    raw_id_fields = ['company', 'product', 'created_by']
+    ordering = ['-created_at']
+
+    def has_change_permission(self, request, obj=None):
+        return False
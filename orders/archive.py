@@ -0,0 +1,202 @@
+"""
+Order archival: finished orders leave the orders table for ArchivedOrder.
+
+archive_orders() moves SUCCESS/FAILED orders created more than
+ORDER_ARCHIVE_AFTER_DAYS ago in batches. Each batch is its own short
+transaction: lock up to ``batch_size`` rows (skipping rows another
+transaction holds), copy them, delete them. Orders whose confirmation is
+still queued are left in place until it is delivered.
+
+Reads stay transparent: list and export consult the archive when their
+created_at range starts before the archive horizon (or has no start), and
+retrieve falls back to it for ids missing from the orders table.
+
+On MySQL, partition_archive_by_month() adds native RANGE partitioning by
+month to the archive table, so old months can be dropped in O(1) and
+date-bounded reads only touch their months.
+"""
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, router, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order
+
+FINISHED_STATUSES = ('SUCCESS', 'FAILED')
+# Orders moved per transaction.
+ARCHIVE_BATCH_SIZE = 1000
+
+ARCHIVE_COLUMNS = [
+    'id', 'company_id', 'product_id', 'quantity', 'unit_price', 'created_by_id', 'created_at', 'status',
+    'shipped_at'
+]
+
+
+def archive_horizon():
+    """Orders created before this may be in the archive."""
+    return timezone.now() - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def reads_history(filters):
+    """True when export_filters() ``filters`` ask for a range reaching into the archive."""
+    if 'created_at__gte' not in filters and 'created_at__lt' not in filters:
+        return False
+    if filters.get('status') == 'PENDING':  # never archived
+        return False
+    start = filters.get('created_at__gte')
+    return start is None or start < archive_horizon()
+
+
+def archive_orders(older_than, batch_size=ARCHIVE_BATCH_SIZE, pause=0, using=None):
+    """Move finished orders created before ``older_than`` to the archive; returns how many moved."""
+    using = using or router.db_for_write(Order)
+    candidates = Order.objects.using(using).filter(
+        status__in=FINISHED_STATUSES, created_at__lt=older_than
+    ).exclude(notifications__status='PENDING').order_by('id')
+
+    moved = 0
+    last_id = 0
+    while True:
+        with transaction.atomic(using=using):
+            batch = candidates.filter(id__gt=last_id).select_for_update(skip_locked=True)
+            rows = list(batch.values(*ARCHIVE_COLUMNS)[:batch_size])
+            if not rows:
+                return moved
+            ids = [row['id'] for row in rows]
+            ArchivedOrder.objects.using(using).bulk_create([ArchivedOrder(**row) for row in rows])
+            # cascades to the delivered notifications of these orders
+            Order.objects.using(using).filter(id__in=ids).delete()
+
+        moved += len(rows)
+        last_id = ids[-1]
+        if len(rows) < batch_size:
+            return moved
+        if pause:
+            time.sleep(pause)  # lets replicas and other writers catch up
+
+
+class OrderHistory:
+    """
+    values() rows of the orders table and of the archive, read by the
+    paginators as one queryset: filter() applies to both parts, count() adds
+    them up and a slice is one UNION ALL query in the requested order. Where
+    the backend allows it (MySQL, PostgreSQL), each part is first ordered
+    and cut at the end of the slice, so a page is two index range scans
+    rather than a sort of the whole history. Slices stay lazy querysets, so
+    async views read them with ``async for`` (acount() counts).
+    """
+    ordered = True
+
+    def __init__(self, hot, archived, ordering=None):
+        self.hot = hot
+        self.archived = archived
+        self.ordering = tuple(ordering or hot.query.order_by or ('-created_at', '-id'))
+
+    def filter(self, *args, **kwargs):
+        return OrderHistory(self.hot.filter(*args, **kwargs), self.archived.filter(*args, **kwargs), self.ordering)
+
+    def order_by(self, *fields):
+        return OrderHistory(self.hot, self.archived, fields)
+
+    def count(self):
+        return self.hot.count() + self.archived.count()
+
+    async def acount(self):
+        return await self.hot.acount() + await self.archived.acount()
+
+    def _union(self, stop=None):
+        hot, archived = self.hot.order_by(), self.archived.order_by()
+        if stop is not None and connections[hot.db].features.supports_slicing_ordering_in_compound:
+            hot = self.hot.order_by(*self.ordering)[:stop]
+            archived = self.archived.order_by(*self.ordering)[:stop]
+        return hot.union(archived, all=True).order_by(*self.ordering)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step is None and index.stop is not None and index.stop >= 0:
+                return self._union(index.stop)[index]
+            return list(self._union())[index]
+        return self._union(index + 1)[index]
+
+    def __iter__(self):
+        return iter(self._union())
+
+    def __aiter__(self):
+        return aiter(self._union())
+
+    def __len__(self):
+        return self.count()
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def month_partitions(first, last):
+    """(name, upper bound) of the monthly partitions covering ``first``..``last``."""
+    month = first.replace(day=1)
+    partitions = []
+    while month <= last:
+        following = _next_month(month)
+        partitions.append((f'p{month:%Y%m}', following))
+        month = following
+    return partitions
+
+
+def _partition_clauses(partitions):
+    clauses = [
+        f"PARTITION {name} VALUES LESS THAN (TO_DAYS('{bound.isoformat()}'))" for name, bound in partitions
+    ]
+    clauses.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    return ', '.join(clauses)
+
+
+def partition_archive_by_month(months_ahead=3, using=DEFAULT_DB_ALIAS):
+    """
+    Partition the archive table by month of created_at (MySQL only), with
+    partitions up to ``months_ahead`` months from now; on an already
+    partitioned table, add the missing future months. Returns the names of
+    the partitions created.
+
+    MySQL requires the partitioning column in every unique key, so the
+    primary key becomes (id, created_at); ids stay unique because they come
+    from the orders table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        raise NotSupportedError('RANGE partitioning of the order archive needs MySQL.')
+
+    table = ArchivedOrder._meta.db_table
+    quoted = connection.ops.quote_name(table)
+    last = timezone.now().date()
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT partition_name FROM information_schema.partitions '
+            'WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL',
+            [table]
+        )
+        existing = sorted(name for (name,) in cursor.fetchall() if name != 'pmax')
+
+        if not existing:
+            oldest = ArchivedOrder.objects.using(using).order_by('created_at').values_list(
+                'created_at', flat=True
+            ).first()
+            partitions = month_partitions((oldest or timezone.now()).date(), last)
+            cursor.execute(f'ALTER TABLE {quoted} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)')
+            cursor.execute(
+                f'ALTER TABLE {quoted} PARTITION BY RANGE (TO_DAYS(created_at)) ({_partition_clauses(partitions)})'
+            )
+        else:
+            newest = existing[-1]
+            partitions = month_partitions(_next_month(date(int(newest[1:5]), int(newest[5:7]), 1)), last)
+            if partitions:
+                # pmax only holds rows dated after the last month: splitting it is cheap
+                cursor.execute(
+                    f'ALTER TABLE {quoted} REORGANIZE PARTITION pmax INTO ({_partition_clauses(partitions)})'
+                )
+    return [name for name, _ in partitions]
@@ -0,0 +1,126 @@
+import csv
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import chain, islice
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from orders.models import Order
+
+# Rows fetched per query while streaming an export.
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def _parse_bound(value, name, end_of_range=False):
+    # a bare date first: parse_datetime() also accepts one, as midnight
+    day = parse_date(value)
+    if day is not None:
+        # A bare date covers the whole day, so the upper bound is the start
+        # of the following day (exclusive).
+        if end_of_range:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'`{name}` must be an ISO date or datetime.')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_filters(params):
+    """
+    Build queryset filters from the export query parameters:
+
+    - status: one of Order.STATUS_CHOICES
+    - created_after / created_before: ISO date or datetime bounds
+
+    Bounds are applied on created_at directly (not on its date) so the
+    company/created_at index stays usable. Raises ValueError on bad input.
+    """
+    filters = {}
+
+    status_value = params.get('status')
+    if status_value:
+        valid_choices = [c[0] for c in Order.STATUS_CHOICES]
+        if status_value not in valid_choices:
+            raise ValueError(f'Invalid status. Valid choices: {valid_choices}')
+        filters['status'] = status_value
+
+    created_after = params.get('created_after')
+    if created_after:
+        filters['created_at__gte'] = _parse_bound(created_after, 'created_after')
+
+    created_before = params.get('created_before')
+    if created_before:
+        filters['created_at__lt'] = _parse_bound(created_before, 'created_before', end_of_range=True)
+
+    return filters
+
+
+def _keyset_pages(queryset, fields, chunk_size):
+    # rows end with their (created_at, id) position
+    queryset = queryset.order_by('-created_at', '-id').values_list(*fields, 'created_at', 'id')
+    page = queryset
+
+    while True:
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+
+        last_created_at, last_id = rows[-1][-2:]
+        page = queryset.filter(
+            Q(created_at__lt=last_created_at) | Q(created_at=last_created_at, id__lt=last_id)
+        )
+
+
+def iter_row_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of ``values_list(*fields)`` rows, newest first.
+
+    Rows are paged with a (created_at, id) keyset instead of one big cursor:
+    MySQLdb buffers a whole result set client-side even for ``.iterator()``,
+    so this is what keeps memory flat whatever the number of orders.
+    """
+    for rows in _keyset_pages(queryset, fields, chunk_size):
+        yield [row[:-2] for row in rows]
+
+
+def iter_merged_row_chunks(querysets, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """iter_row_chunks() over several querysets (orders and archive), merged newest first."""
+    streams = [chain.from_iterable(_keyset_pages(queryset, fields, chunk_size)) for queryset in querysets]
+    merged = heapq.merge(*streams, key=lambda row: row[-2:], reverse=True)
+    while True:
+        rows = [row[:-2] for row in islice(merged, chunk_size)]
+        if not rows:
+            return
+        yield rows
+
+
+def streaming_csv_response(filename, header, chunks, format_row):
+    """Stream ``chunks`` of rows as CSV, one write per chunk."""
+    writer = csv.writer(Echo())
+
+    def content():
+        yield writer.writerow(header)
+        for rows in chunks:
+            yield ''.join(writer.writerow(format_row(row)) for row in rows)
+
+    response = StreamingHttpResponse(content(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
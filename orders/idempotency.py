@@ -0,0 +1,253 @@
+"""
+Idempotency-Key support for POST endpoints (order creation).
+
+A client that times out can retry with the same ``Idempotency-Key`` header
+and get the first outcome back instead of placing the orders twice:
+
+1. A per-process LRU of completed responses answers a replay without any
+   query.
+2. Otherwise the key is claimed by inserting an IdempotencyKey row; the
+   (user, key) unique index makes a single request win.
+3. The winner runs the view and stores its response (2xx only) on the row.
+   A view that writes calls store_response inside its own transaction, so
+   the outcome commits or rolls back together with what it wrote. A 4xx or
+   an exception releases the claim: nothing was written, so a retry runs
+   again.
+4. A request that finds the row replays the stored response. If the first
+   request is still running, it waits (polling the row) up to
+   IDEMPOTENCY_WAIT_SECONDS and then gets a 409.
+
+A claim expires after IDEMPOTENCY_CLAIM_TTL seconds, longer than any request
+may run (GUNICORN_TIMEOUT): when the worker holding it died before its
+transaction committed, a retry claims the key again after that and runs the
+request again. A request whose claim expired and was taken over meanwhile
+rolls back and gets a 409 (IdempotencyClaimLost). A stored outcome is
+scoped to the user and kept for IDEMPOTENCY_KEY_TTL seconds. The
+request fingerprint (method, path and body) must match: reusing a key for a
+different request is a 422. Keys are read and written on the primary
+database, never on a replica.
+"""
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from ecommerce.renderers import FastJSONRenderer
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+StoredResponse = namedtuple('StoredResponse', 'fingerprint status_code body expires_at')
+
+
+class ResponseCache:
+    """Thread-safe LRU of completed responses, per process."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= timezone.now():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.IDEMPOTENCY_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_responses = ResponseCache()
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _key_reused():
+    return Response(
+        {'detail': f'{IDEMPOTENCY_HEADER} was already used for a different request.'},
+        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+class IdempotencyClaimLost(Exception):
+    """Raised by store_response when another request took over the key."""
+
+
+def _replay(entry, fingerprint):
+    if entry.fingerprint != fingerprint:
+        return _key_reused()
+    response = Response(json.loads(zlib.decompress(entry.body)), status=entry.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _stored(row):
+    return StoredResponse(row.fingerprint, row.status_code, bytes(row.response), row.expires_at)
+
+
+def _claim(user_id, key, fingerprint, using):
+    """The new claim row, or None when the key is already taken (by a live row)."""
+    expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TTL)
+    for _ in range(2):
+        try:
+            with transaction.atomic(using=using):
+                return IdempotencyKey.objects.using(using).create(
+                    user_id=user_id, key=key, fingerprint=fingerprint, expires_at=expires_at
+                )
+        except IntegrityError:
+            # an expired row does not hold the key: drop it and claim again
+            deleted, _ = IdempotencyKey.objects.using(using).filter(
+                user_id=user_id, key=key, expires_at__lte=timezone.now()
+            ).delete()
+            if not deleted:
+                return None
+    return None
+
+
+def _wait_for(user_id, key, using):
+    """
+    Poll the key until its first request completes: the row, or None if
+    that request gave up or its claim expired.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.02
+    while True:
+        row = IdempotencyKey.objects.using(using).filter(user_id=user_id, key=key).first()
+        if row is not None and row.expires_at <= timezone.now():
+            return None
+        if row is None or row.status_code is not None or time.monotonic() >= deadline:
+            return row
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _still_processing():
+    return Response(
+        {'detail': f'A request with this {IDEMPOTENCY_HEADER} is still being processed.'},
+        status=status.HTTP_409_CONFLICT
+    )
+
+
+def _complete(claim, status_code, data):
+    """Store the outcome on the claim row; False if the row is no longer ours."""
+    claim.status_code = status_code
+    claim.response = zlib.compress(FastJSONRenderer().render(data))
+    claim.expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    # 0 rows when the claim expired and was taken over meanwhile
+    return bool(IdempotencyKey.objects.using(claim._state.db).filter(pk=claim.pk).update(
+        status_code=claim.status_code, response=claim.response, expires_at=claim.expires_at
+    ))
+
+
+def store_response(request, status_code, data):
+    """
+    Store the response of an idempotent request now, in the caller's
+    transaction, so that it commits or rolls back with the request's writes.
+    Does nothing without an Idempotency-Key. Raises IdempotencyClaimLost
+    (rolling the caller back) if another request took over the key.
+    """
+    claim = getattr(request, '_idempotency_claim', None)
+    if claim is None:
+        return
+    if not _complete(claim, status_code, data):
+        claim.status_code = None
+        raise IdempotencyClaimLost()
+
+
+def idempotent(view_method):
+    """Honour the Idempotency-Key header on a view(set) method."""
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view_method(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = (request.user.pk, key)
+        fingerprint = request_fingerprint(request)
+        entry = _responses.get(cache_key)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        using = router.db_for_write(IdempotencyKey)
+        while True:
+            claim = _claim(request.user.pk, key, fingerprint, using)
+            if claim is not None:
+                break
+            row = _wait_for(request.user.pk, key, using)
+            if row is None:
+                continue  # the first request failed, released the key or died
+            if row.status_code is None:
+                if row.fingerprint != fingerprint:
+                    return _key_reused()
+                return _still_processing()
+            entry = _stored(row)
+            _responses.set(cache_key, entry)
+            return _replay(entry, fingerprint)
+
+        request._idempotency_claim = claim
+        try:
+            response = view_method(view, request, *args, **kwargs)
+        except IdempotencyClaimLost:
+            return _still_processing()
+        except BaseException:
+            # an outcome stored by the view committed with its writes: keep it
+            IdempotencyKey.objects.using(using).filter(pk=claim.pk, status_code__isnull=True).delete()
+            raise
+        if claim.status_code is not None:
+            _responses.set(cache_key, _stored(claim))
+            return response
+        if not status.is_success(response.status_code):
+            claim.delete()
+            return response
+        if _complete(claim, response.status_code, response.data):
+            _responses.set(cache_key, _stored(claim))
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000, using=None):
+    """Delete expired IdempotencyKey rows; returns how many were deleted."""
+    using = using or router.db_for_write(IdempotencyKey)
+    purged = 0
+    while True:
+        ids = list(IdempotencyKey.objects.using(using).filter(
+            expires_at__lte=timezone.now()
+        ).order_by('expires_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.using(using).filter(id__in=ids).delete()[0]
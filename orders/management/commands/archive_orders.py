@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.archive import ARCHIVE_BATCH_SIZE, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move finished (SUCCESS/FAILED) orders older than ORDER_ARCHIVE_AFTER_DAYS to the archive table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Defaults to ORDER_ARCHIVE_AFTER_DAYS; cannot be lower.')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Orders moved per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        if days is None:
+            days = settings.ORDER_ARCHIVE_AFTER_DAYS
+        # list and export only look in the archive past ORDER_ARCHIVE_AFTER_DAYS
+        if days < settings.ORDER_ARCHIVE_AFTER_DAYS:
+            raise CommandError(
+                f'--older-than-days cannot be lower than ORDER_ARCHIVE_AFTER_DAYS ({settings.ORDER_ARCHIVE_AFTER_DAYS}).'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        moved = archive_orders(
+            timezone.now() - timedelta(days=days),
+            batch_size=options['batch_size'],
+            pause=options['pause']
+        )
+        self.stdout.write(f'archived {moved} orders')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from orders.archive import partition_archive_by_month
+
+
+class Command(BaseCommand):
+    help = (
+        'Partition the order archive table by month (MySQL RANGE partitioning), '
+        'or add the upcoming months to an already partitioned table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Create partitions up to this many months from now.')
+
+    def handle(self, *args, **options):
+        try:
+            created = partition_archive_by_month(months_ahead=options['months_ahead'])
+        except NotSupportedError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(f'created {len(created)} partitions' + (f': {", ".join(created)}' if created else ''))
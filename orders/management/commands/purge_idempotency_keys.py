@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--poll-interval', type=float, default=300.0,
+                            help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_expired_keys(batch_size=options['batch_size'])
+            if purged:
+                self.stdout.write(f'purged {purged} idempotency keys')
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.notifications import deliver_pending_notifications
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued order confirmations from the notification outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help='Threads sending each batch.')
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = deliver_pending_notifications(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                max_attempts=options['max_attempts']
+            )
+            if sent or failed:
+                self.stdout.write(f'sent {sent}, failed {failed}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
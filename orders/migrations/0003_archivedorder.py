@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0001_initial"),
+        ("orders", "0002_order_notification"),
+        ("products", "0003_stock_reservations"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("quantity", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("SUCCESS", "Success"),
+                            ("FAILED", "Failed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("shipped_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "company",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to="companies.company",
+                    ),
+                ),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_orders",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived order",
+                "verbose_name_plural": "Archived orders",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["company", "created_at"],
+                        name="idx_archive_company_created",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:59
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_unit_price(apps, schema_editor):
+    # The price paid is not known for existing orders: use the product's
+    # current price, as the analytics rollup did until now.
+    Product = apps.get_model("products", "Product")
+    price = Subquery(
+        Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+    )
+    for name in ("Order", "ArchivedOrder"):
+        model = apps.get_model("orders", name)
+        model.objects.using(schema_editor.connection.alias).filter(
+            unit_price__isnull=True
+        ).update(unit_price=price)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0004_idempotencykey"),
+        ("products", "0002_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedorder",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=10, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, editable=False, max_digits=10, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_unit_price, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
 from django.utils import timezone  
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
-from ecommerce.email_utils import send_order_confirmation
 from django.core.validators import MinValueValidator
+
+from analytics.rollups import ORDER_STATE_FIELDS, order_state, record_order_changes, record_orders_created
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -23,6 +26,9 @@ class Order(models.Model):
     
 
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    # Product price when the order was placed; the analytics rollup counts
+    # revenue at it. Null on rows bulk-inserted without it.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -45,28 +51,197 @@ class Order(models.Model):
             models.Index(fields=['status', 'created_at'], name='idx_order_status_created'),
         ]
 
+    # ORDER_STATE_FIELDS as loaded from the database; lets save() and
+    # delete() update the analytics rollup without re-reading the row.
+    _loaded_state = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # deferred fields are absent from __dict__
+        if all(name in instance.__dict__ for name in ORDER_STATE_FIELDS):
+            instance._loaded_state = order_state(instance)
+        return instance
+
+    def _previous_state(self, using=None):
+        if self._loaded_state is not None:
+            return self._loaded_state
+        # a field was deferred or the instance was built by hand
+        return Order.objects.using(using).filter(pk=self.pk).values_list(*ORDER_STATE_FIELDS).first()
+
     def save(self, *args, **kwargs):
+        notify = False
+        created = self.pk is None
+        old_state = old_status = None
+
         # if this is an existing order being updated
-        if self.pk:
-            try:
-
-                old_order = Order.objects.get(pk=self.pk)
-                old_status = old_order.status
-                
-                # If status changed to 'success', set shipped_at
-                if self.status == 'SUCCESS' and old_status != 'SUCCESS':
-                    if not self.shipped_at:
-                        self.shipped_at = timezone.now()
-                    send_order_confirmation(self)
-            except Order.DoesNotExist:
-                pass 
+        if not created:
+            old_state = self._previous_state()
+            if old_state is not None:
+                old_status = old_state[3]
+                if self.product_id != old_state[0]:
+                    # moved to another product (admin): priced as if placed now
+                    self.unit_price = self.product.price
+
+            # If status changed to 'success', set shipped_at
+            if old_status is not None and self.status == 'SUCCESS' and old_status != 'SUCCESS':
+                if not self.shipped_at:
+                    self.shipped_at = timezone.now()
+                notify = True
 
         # if its a new order being created
-        elif self.status == 'SUCCESS' and not self.shipped_at:
-            self.shipped_at = timezone.now()
-            send_order_confirmation(self)
-        
-        super().save(*args, **kwargs)
-        
+        else:
+            if self.unit_price is None:
+                self.unit_price = self.product.price
+            if self.status == 'SUCCESS' and not self.shipped_at:
+                self.shipped_at = timezone.now()
+                notify = True
+
+        state_changed = old_state is not None and tuple(old_state) != order_state(self)
+        if notify or created or state_changed:
+            # The confirmation is only queued here: the outbox row is written in
+            # the same transaction and the send_order_confirmations command
+            # delivers it. The analytics rollup is updated alongside.
+            using = kwargs.get('using') or router.db_for_write(Order, instance=self)
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                if notify:
+                    OrderNotification.objects.using(using).create(order=self)
+                if created:
+                    record_orders_created([self], using)
+                elif state_changed:
+                    record_order_changes([(self.company_id, self.created_at, old_state, order_state(self))], using)
+        else:
+            super().save(*args, **kwargs)
+
+        self._loaded_state = order_state(self)
+
+    def delete(self, using=None, keep_parents=False):
+        # Takes the order out of the analytics rollup. Queryset deletes
+        # bypass this (see OrderAdmin.delete_queryset); archive_orders
+        # relies on that, the rollup also counts archived orders.
+        using = using or router.db_for_write(Order, instance=self)
+        with transaction.atomic(using=using):
+            state = self._previous_state(using)
+            company_id, created_at = self.company_id, self.created_at
+            deleted = super().delete(using=using, keep_parents=keep_parents)
+            if state is not None:
+                record_order_changes([(company_id, created_at, state, None)], using)
+        return deleted
+
     def __str__(self):
         return f"Order #{self.id} - {self.product.name} x {self.quantity} ({self.status})"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A finished order moved out of the orders table by the archive_orders
+    command (orders/archive.py), with its id and columns unchanged.
+
+    The table is kept compact: one (company, created_at) index and no
+    foreign key constraints, which also lets MySQL partition it by month
+    (partition_order_archive). Archived orders are read-only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    company = models.ForeignKey(
+        'companies.Company',
+        on_delete=models.CASCADE,
+        related_name='archived_orders',
+        db_constraint=False,
+        db_index=False
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='archived_orders',
+        db_constraint=False,
+        db_index=False
+    )
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_orders',
+        db_constraint=False,
+        db_index=False
+    )
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    shipped_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Archived order'
+        verbose_name_plural = 'Archived orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['company', 'created_at'], name='idx_archive_company_created'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} ({self.status})"
+
+
+class OrderNotification(models.Model):
+    """Outbox row for an order confirmation waiting to be delivered."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Order notification'
+        verbose_name_plural = 'Order notifications'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_notification_due'),
+        ]
+
+    def __str__(self):
+        return f"Notification for order #{self.order_id} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a request sent with an ``Idempotency-Key`` header
+    (orders/idempotency.py). A row without status_code is a request still
+    being processed (until its short claim expires); expired rows are
+    deleted by purge_idempotency_keys.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False  # covered by the (user, key) unique index
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    # zlib-compressed JSON body
+    response = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Idempotency key'
+        verbose_name_plural = 'Idempotency keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='uniq_idempotency_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} of user #{self.user_id} ({self.status_code or 'in progress'})"
@@ -0,0 +1,94 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ecommerce.email_utils import send_order_confirmation
+from orders.models import OrderNotification
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is hidden from other workers while it is sent.
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_BASE_DELAY = timedelta(seconds=30)
+
+
+def enqueue_order_confirmations(order_ids, using=None):
+    """Queue confirmations for several orders with a single INSERT."""
+    return OrderNotification.objects.using(using).bulk_create([
+        OrderNotification(order_id=order_id) for order_id in order_ids
+    ])
+
+
+def _claim_batch(batch_size):
+    # Claimed rows get their next attempt pushed past CLAIM_TIMEOUT, so a
+    # worker that dies mid-batch simply lets them become due again.
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OrderNotification.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            OrderNotification.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + CLAIM_TIMEOUT
+            )
+
+    return list(
+        OrderNotification.objects.filter(id__in=ids).select_related(
+            'order__created_by', 'order__company', 'order__product'
+        )
+    )
+
+
+def _send(notification):
+    try:
+        send_order_confirmation(notification.order)
+    except Exception as exc:
+        logger.exception('Order confirmation for order #%s failed', notification.order_id)
+        return notification, exc
+    return notification, None
+
+
+def deliver_pending_notifications(batch_size=100, workers=4, max_attempts=5):
+    """
+    Send one batch of due confirmations on a thread pool and record the
+    outcome with two writes: one UPDATE for the sent rows and one
+    bulk_update for the failures. Failed rows are retried with exponential
+    backoff until max_attempts, then marked FAILED.
+
+    Returns (sent, failed) counts; (0, 0) means the queue is drained.
+    """
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_send, batch))
+
+    now = timezone.now()
+    sent_ids = [notification.id for notification, error in results if error is None]
+    failed = []
+    for notification, error in results:
+        if error is None:
+            continue
+        notification.last_error = repr(error)
+        if notification.attempts >= max_attempts:
+            notification.status = 'FAILED'
+        else:
+            notification.next_attempt_at = now + RETRY_BASE_DELAY * 2 ** (notification.attempts - 1)
+        failed.append(notification)
+
+    with transaction.atomic():
+        if sent_ids:
+            OrderNotification.objects.filter(id__in=sent_ids).update(status='SENT', sent_at=now)
+        if failed:
+            OrderNotification.objects.bulk_update(failed, ['status', 'next_attempt_at', 'last_error'])
+
+    return len(sent_ids), len(failed)
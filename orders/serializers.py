@@ -1,7 +1,6 @@
 from rest_framework import serializers
 from orders.models import Order
-from products.models import Product
-from django.db import transaction
+from ecommerce.row_serializers import RowSerializer
 
 
 class OrderItemSerializer(serializers.Serializer):
@@ -18,34 +17,9 @@ class OrderCreateSerializer(serializers.Serializer):
         return value
     
     def validate(self, data):
-        user = self.context['request'].user
-        
-        # First verify all products exist and belong to user's company (no locks yet)
-        for item in data['orders']:
-            try:
-                product = Product.objects.get(
-                    id=item['product_id'],
-                    company=user.company,
-                    is_active=True
-                )
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(
-                    f"Product with id {item['product_id']} not found, inactive, or does not belong to your company."
-                )
-        
-        # Now check stock within transaction with locks
-        with transaction.atomic():
-            for item in data['orders']:
-                product = Product.objects.select_for_update().get(
-                    id=item['product_id'],
-                    company=user.company,
-                    is_active=True
-                )
-                if product.stock < item['quantity']:
-                    raise serializers.ValidationError(
-                        f"Product {product.name} has insufficient stock. Available: {product.stock}"
-                    )
-        
+        # Product existence, ownership and stock are checked once, under row
+        # locks, when the orders are created (orders.services.create_orders).
+        # Looking them up here as well would only repeat the same queries.
         return data
 
 
@@ -63,3 +37,7 @@ class OrderSerializer(serializers.ModelSerializer):
             'company', 'company_name'
         ]
         read_only_fields = ['created_at', 'created_by', 'company']
+
+
+# OrderSerializer output straight from values() rows, for the list endpoint
+order_rows = RowSerializer(OrderSerializer)
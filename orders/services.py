@@ -0,0 +1,231 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from analytics.rollups import record_orders_created, record_status_changes
+from orders.models import Order
+from orders.notifications import enqueue_order_confirmations
+from products.cache import invalidate_catalog
+from products.models import Product
+from products.stock import StockError, confirm_reservations, release_reservations, reserve_stock
+
+
+class OrderCreateError(Exception):
+    """Raised when a batch of order items cannot be fulfilled."""
+
+
+def _requested_quantities(items):
+    # Several lines may reference the same product; stock is checked and
+    # decremented against the total requested for each product.
+    wanted = {}
+    for item in items:
+        wanted[item['product_id']] = wanted.get(item['product_id'], 0) + item['quantity']
+    return wanted
+
+
+def _bulk_insert_orders(orders, using):
+    Order.objects.using(using).bulk_create(orders)
+
+    if orders and orders[0].pk is None:
+        # Backends without INSERT ... RETURNING (MySQL) do not hand back the
+        # primary keys, and LAST_INSERT_ID() plus an offset is only right
+        # while AUTO_INCREMENT ranges are contiguous (not with Galera, group
+        # replication or innodb_autoinc_lock_mode=2). The rows are read back
+        # instead: bulk_create() stamped each order's created_at, and ids
+        # grow in insert order.
+        first = orders[0]
+        rows = list(Order.objects.using(using).filter(
+            company_id=first.company_id,
+            created_by_id=first.created_by_id,
+            created_at__in={order.created_at for order in orders}
+        ).order_by('id').values_list('id', 'product_id', 'quantity'))
+        if [row[1:] for row in rows] != [(order.product_id, order.quantity) for order in orders]:
+            raise OrderCreateError('The orders could not be read back, please retry')
+        for order, row in zip(orders, rows):
+            order.pk = row[0]
+
+    return orders
+
+
+def _build_orders(user, items, products):
+    return [
+        Order(
+            company=user.company,
+            product=products[item['product_id']],
+            quantity=item['quantity'],
+            unit_price=products[item['product_id']].price,
+            created_by=user,
+            status='PENDING'
+        )
+        for item in items
+    ]
+
+
+def create_orders(user, items, on_created=None):
+    """
+    Create one order per item and decrement product stock, with the engine
+    selected by STOCK_ENGINE: 'locking' (default, below) or 'reservation'
+    (see create_orders_with_reservation).
+
+    The locking engine runs a fixed number of queries, whatever the number
+    of items:
+
+    1. lock every referenced product with one ``id__in`` query, in id order
+       so concurrent batches always acquire row locks in the same sequence;
+    2. check stock in memory;
+    3. decrement stock with one conditional UPDATE;
+    4. insert the orders with one ``bulk_create`` (plus one SELECT for their
+       ids where the backend cannot return them);
+    5. count them in the daily analytics rollup (analytics.rollups).
+
+    ``on_created(orders)``, if given, runs last in the transaction that
+    writes the orders (both engines), e.g. to store the idempotent response
+    with them (orders/idempotency.py).
+
+    Raises OrderCreateError (and rolls back) if a product is missing,
+    inactive, outside the user's company, sharded (products/stock.py; merge
+    it back with ``shard_stock --shards 0``) or short on stock.
+    """
+    if settings.STOCK_ENGINE == 'reservation':
+        return create_orders_with_reservation(user, items, on_created)
+
+    wanted = _requested_quantities(items)
+    using = router.db_for_write(Order)
+
+    with transaction.atomic(using=using):
+        products = {
+            product.id: product
+            for product in Product.objects.using(using).select_for_update().filter(
+                id__in=wanted,
+                company_id=user.company_id,
+                is_active=True
+            ).only('id', 'name', 'stock', 'stock_shards', 'price').order_by('id')
+        }
+
+        for product_id, quantity in wanted.items():
+            product = products.get(product_id)
+            if product is None:
+                raise OrderCreateError(
+                    f'Product with id {product_id} not found or does not belong to your company'
+                )
+            if product.stock_shards:
+                # Product.stock is 0 while the stock sits in StockShard rows.
+                raise OrderCreateError(
+                    f'Stock of {product.name} is sharded and can only be ordered with STOCK_ENGINE=reservation'
+                )
+            if product.stock < quantity:
+                raise OrderCreateError(f'Insufficient stock for {product.name}')
+
+        # Each row is only touched if it still holds enough stock, so a
+        # short row count means something changed underneath us.
+        updated = Product.objects.using(using).filter(
+            reduce(or_, (Q(id=pid, stock__gte=qty) for pid, qty in wanted.items()))
+        ).update(
+            stock=Case(
+                *(When(id=pid, then=F('stock') - qty) for pid, qty in wanted.items()),
+                output_field=PositiveIntegerField()
+            ),
+            last_updated_at=timezone.now()
+        )
+        if updated != len(wanted):
+            raise OrderCreateError('Stock changed while the order was being placed, please retry')
+
+        for product_id, quantity in wanted.items():
+            products[product_id].stock -= quantity
+        invalidate_catalog(user.company_id, using=using)
+
+        orders = _bulk_insert_orders(_build_orders(user, items, products), using)
+        record_orders_created(orders, using)
+        if on_created is not None:
+            on_created(orders)
+
+    return orders
+
+
+def create_orders_with_reservation(user, items, on_created=None):
+    """
+    Reservation engine: stock is taken and committed first by
+    products.stock.reserve_stock (conditional decrements, no long-held
+    locks, sharded stock for hot products), then the orders are written in
+    a second transaction that consumes the reservation. If that transaction
+    fails the stock is returned.
+    """
+    wanted = _requested_quantities(items)
+    using = router.db_for_write(Order)
+
+    try:
+        products, token, count = reserve_stock(user.company_id, wanted, using)
+    except StockError as exc:
+        raise OrderCreateError(str(exc))
+
+    try:
+        with transaction.atomic(using=using):
+            confirm_reservations(token, count, using)
+            orders = _bulk_insert_orders(_build_orders(user, items, products), using)
+            record_orders_created(orders, using)
+            if on_created is not None:
+                on_created(orders)
+    except StockError as exc:
+        # expired and already released by release_stock_reservations
+        raise OrderCreateError(str(exc))
+    except Exception:
+        release_reservations(token, using)
+        raise
+
+    return orders
+
+
+def apply_status_changes(queryset, changes):
+    """
+    Apply ``{order_id: status}`` changes to the orders in ``queryset``.
+
+    Work is done set-wise: one locking SELECT for the current statuses, one
+    UPDATE per target status (shipped_at is stamped in SQL for SUCCESS), one
+    INSERT queueing the confirmations and a batched analytics rollup
+    update. Returns ``{order_id: result}``
+    with result one of 'updated', 'unchanged' or 'not_found' (outside
+    ``queryset``).
+    """
+    using = router.db_for_write(Order)
+    results = {}
+    to_update = {}
+
+    with transaction.atomic(using=using):
+        current = {
+            row[0]: row[1:]
+            for row in queryset.using(using).select_for_update().filter(id__in=changes).values_list(
+                'id', 'status', 'company_id', 'product_id', 'created_at', 'quantity', 'unit_price'
+            )
+        }
+
+        for order_id, new_status in changes.items():
+            old_status = current[order_id][0] if order_id in current else None
+            if old_status is None:
+                results[order_id] = 'not_found'
+            elif old_status == new_status:
+                results[order_id] = 'unchanged'
+            else:
+                to_update.setdefault(new_status, []).append(order_id)
+                results[order_id] = 'updated'
+
+        for new_status, order_ids in to_update.items():
+            fields = {'status': new_status}
+            if new_status == 'SUCCESS':
+                fields['shipped_at'] = Coalesce('shipped_at', Now())
+            Order.objects.using(using).filter(id__in=order_ids).update(**fields)
+
+        if 'SUCCESS' in to_update:
+            enqueue_order_confirmations(to_update['SUCCESS'], using=using)
+
+        record_status_changes([
+            (company_id, product_id, created_at, quantity, unit_price, old_status, changes[order_id])
+            for order_id, (old_status, company_id, product_id, created_at, quantity, unit_price) in current.items()
+            if results[order_id] == 'updated'
+        ], using)
+
+    return results
@@ -1,3 +1,678 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from analytics.models import DailyOrderRollup
+from analytics.rollups import rebuild_rollups
+from companies.models import Company
+from ecommerce.fixtures import TenantTestMixin, create_user
+from orders import idempotency, notifications, services
+from orders.archive import month_partitions
+from orders.exports import iter_row_chunks
+from orders.models import ArchivedOrder, IdempotencyKey, Order, OrderNotification
+from orders.serializers import OrderSerializer, order_rows
+from orders.views import OrderViewSet
+from products.models import Product, StockReservation
+from products.stock import release_expired_reservations, reserve_stock, set_stock_shards
+
+
+class OrderConditionalGetTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order()
+        self.url = f'/api/orders/{self.order.id}/'
+
+    def test_retrieve_not_modified_runs_single_query(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_status_change_invalidates_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.patch(self.url, {'status': 'SUCCESS'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'SUCCESS')
+
+    def test_renamed_relations_invalidate_etag(self):
+        for model, obj, name in [(Product, self.product, 'Widget Pro'), (Company, self.company, 'Acme Corp')]:
+            with self.subTest(model=model.__name__):
+                etag = self.client.get(self.url)['ETag']
+                model.objects.filter(pk=obj.pk).update(name=name)
+
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(name, response.data.values())
+
+    def test_operator_gets_no_304_for_orders_outside_today(self):
+        etag = self.client.get(self.url)['ETag']
+        Order.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(days=2))
+        self.user.role = 'OPERATOR'
+        self.user.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 403)
+
+
+class OrderCreateTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.gadget = self.create_product('Gadget')
+
+    def post(self, items):
+        return self.client.post('/api/orders/', {'orders': items}, format='json')
+
+    def stock(self):
+        return dict(Product.objects.values_list('name', 'stock'))
+
+    def test_invalid_item_rejects_the_whole_batch(self):
+        foreign = self.create_product('Foreign', company=Company.objects.create(name='Other'))
+
+        for items in [
+            [{'product_id': self.product.id, 'quantity': 1}, {'product_id': foreign.id, 'quantity': 1}],
+            [{'product_id': self.product.id, 'quantity': 1}, {'product_id': self.gadget.id, 'quantity': 0}],
+        ]:
+            with self.subTest(items=items):
+                self.assertEqual(self.post(items).status_code, 400)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock()['Widget'], 10)
+
+    def test_locking_engine_refuses_sharded_stock(self):
+        set_stock_shards(self.gadget, 2)
+
+        response = self.post([{'product_id': self.gadget.id, 'quantity': 1}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sharded', str(response.data))
+        self.assertFalse(Order.objects.exists())
+
+    def test_insufficient_stock_rolls_back_the_batch(self):
+        response = self.post([
+            {'product_id': self.product.id, 'quantity': 4},
+            {'product_id': self.gadget.id, 'quantity': 6},
+            {'product_id': self.gadget.id, 'quantity': 5},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Gadget', response.data['error'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), {'Widget': 10, 'Gadget': 10})
+
+    def test_query_count_does_not_grow_with_items(self):
+        def queries(items):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.post(items).status_code, 201)
+            return len(captured)
+
+        one = queries([{'product_id': self.product.id, 'quantity': 1}])
+        many = queries([
+            {'product_id': product_id, 'quantity': 1} for product_id in [self.product.id, self.gadget.id] * 4
+        ])
+
+        self.assertEqual(many, one)
+        self.assertEqual(self.stock(), {'Widget': 5, 'Gadget': 6})
+
+    def test_ids_are_read_back_without_returning(self):
+        # MySQL cannot return the ids of a bulk INSERT
+        self.create_order()  # ids do not start at 1
+        items = [
+            {'product_id': self.gadget.id, 'quantity': 2},
+            {'product_id': self.product.id, 'quantity': 1},
+            {'product_id': self.gadget.id, 'quantity': 3},
+        ]
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.post(items)
+
+        self.assertEqual(response.status_code, 201)
+        created = Order.objects.in_bulk([order['id'] for order in response.data])
+        self.assertEqual(
+            [(created[order['id']].product_id, created[order['id']].quantity) for order in response.data],
+            [(item['product_id'], item['quantity']) for item in items]
+        )
+
+
+class OrderExportTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.orders = [self.create_order(status=status) for status in ['PENDING', 'SUCCESS', 'SUCCESS', 'FAILED']]
+        self.orders.append(self.create_order(created_by=None))
+        # two orders share a timestamp: the keyset has to break the tie on id
+        for order, days_ago in zip(self.orders, [3, 2, 2, 1, 0]):
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=days_ago))
+
+    def export(self, params=None):
+        response = self.client.get('/api/orders/export/', params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return [line.split(',') for line in b''.join(response.streaming_content).decode().strip().splitlines()]
+
+    def test_streams_every_order_newest_first(self):
+        lines = self.export()
+
+        self.assertEqual(lines[0][0], 'Order ID')
+        newest_first = [self.orders[4], self.orders[3], self.orders[2], self.orders[1], self.orders[0]]
+        self.assertEqual([int(line[0]) for line in lines[1:]], [order.id for order in newest_first])
+        self.assertEqual(lines[1][4], 'N/A')
+
+    def test_chunks_cover_every_row_once(self):
+        queryset = Order.objects.filter(company=self.company)
+
+        chunks = list(iter_row_chunks(queryset, ['id'], chunk_size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(sorted(row[0] for chunk in chunks for row in chunk), sorted(o.id for o in self.orders))
+
+    def test_filters(self):
+        yesterday = str(timezone.localdate() - timedelta(days=1))
+
+        self.assertEqual(
+            [int(line[0]) for line in self.export({'status': 'SUCCESS'})[1:]],
+            [self.orders[2].id, self.orders[1].id]
+        )
+        self.assertEqual(len(self.export({'created_after': yesterday})), 3)
+        self.assertEqual(len(self.export({'created_before': yesterday})), 5)
+        for params in [{'status': 'SHIPPED'}, {'created_after': 'yesterday'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/orders/export/', params).status_code, 400)
+
+
+class OrderBulkStatusTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pending, self.done, self.old = [self.create_order() for _ in range(3)]
+        Order.objects.filter(pk=self.done.pk).update(status='SUCCESS')
+        Order.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=2))
+        other = Company.objects.create(name='Other')
+        self.foreign = Order.objects.create(
+            company=other, product=self.create_product('Foreign', company=other), quantity=1
+        )
+
+    def bulk_status(self, entries):
+        return self.client.patch('/api/orders/bulk_status/', {'orders': entries}, format='json')
+
+    def statuses(self):
+        return dict(Order.objects.values_list('id', 'status'))
+
+    def test_reports_a_result_per_id_in_request_order(self):
+        response = self.bulk_status([
+            {'id': self.old.id, 'status': 'FAILED'},
+            {'id': self.done.id, 'status': 'SUCCESS'},
+            {'id': self.foreign.id, 'status': 'SUCCESS'},
+            {'id': 999999, 'status': 'SUCCESS'},
+            {'id': self.pending.id, 'status': 'SHIPPED'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['results'], [
+            {'id': self.old.id, 'result': 'updated'},
+            {'id': self.done.id, 'result': 'unchanged'},
+            {'id': self.foreign.id, 'result': 'not_found'},
+            {'id': 999999, 'result': 'not_found'},
+            {'id': self.pending.id, 'result': 'invalid'},
+        ])
+        statuses = self.statuses()
+        self.assertEqual((statuses[self.old.id], statuses[self.pending.id]), ('FAILED', 'PENDING'))
+        self.assertEqual(statuses[self.foreign.id], 'PENDING')
+
+    def test_repeated_id_takes_its_last_status(self):
+        response = self.bulk_status([
+            {'id': self.pending.id, 'status': 'SUCCESS'},
+            {'id': self.old.id, 'status': 'SUCCESS'},
+            {'id': self.pending.id, 'status': 'FAILED'},
+            {'id': self.old.id, 'status': 'bogus'},
+        ])
+
+        self.assertEqual(response.data['results'], [
+            {'id': self.pending.id, 'result': 'updated'},
+            {'id': self.old.id, 'result': 'invalid'},
+        ])
+        statuses = self.statuses()
+        self.assertEqual((statuses[self.pending.id], statuses[self.old.id]), ('FAILED', 'PENDING'))
+
+    def test_rejects_malformed_requests(self):
+        entries = [{'id': order.id, 'status': 'FAILED'} for order in [self.pending, self.old, self.done]]
+        with mock.patch.object(OrderViewSet, 'max_bulk_status', 2):
+            self.assertEqual(self.bulk_status(entries).status_code, 400)
+
+        for entries in [
+            [], [{'id': True, 'status': 'FAILED'}], [{'id': 1.5, 'status': 'FAILED'}], [{'status': 'FAILED'}], ['1']
+        ]:
+            with self.subTest(entries=entries):
+                self.assertEqual(self.bulk_status(entries).status_code, 400)
+        self.assertEqual(set(self.statuses().values()), {'PENDING', 'SUCCESS'})
+
+    def test_operator_only_changes_orders_created_today(self):
+        self.client.force_authenticate(create_user(self.company, 'OPERATOR'))
+
+        response = self.bulk_status([
+            {'id': self.pending.id, 'status': 'SUCCESS'},
+            {'id': self.old.id, 'status': 'SUCCESS'},
+        ])
+
+        self.assertEqual(response.data['results'], [
+            {'id': self.pending.id, 'result': 'updated'},
+            {'id': self.old.id, 'result': 'not_found'},
+        ])
+        self.assertEqual(self.statuses()[self.old.id], 'PENDING')
+
+
+class OrderNotificationTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.create_order(status='SUCCESS') for _ in range(3)]
+
+    def deliver(self, error=None, **kwargs):
+        with mock.patch('orders.notifications.send_order_confirmation', side_effect=error) as send:
+            if error is None:
+                result = notifications.deliver_pending_notifications(**kwargs)
+            else:
+                with self.assertLogs('orders.notifications', 'ERROR'):
+                    result = notifications.deliver_pending_notifications(**kwargs)
+        return result, send.call_count
+
+    def make_due(self):
+        OrderNotification.objects.update(next_attempt_at=timezone.now())
+
+    def test_successful_orders_are_queued_and_sent(self):
+        self.assertEqual(self.deliver(), ((3, 0), 3))
+        self.assertEqual(set(OrderNotification.objects.values_list('status', flat=True)), {'SENT'})
+        self.assertEqual(self.deliver(), ((0, 0), 0))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        for attempt, delay in [(1, 30), (2, 60), (3, 120)]:
+            before = timezone.now()
+            self.assertEqual(self.deliver(OSError('smtp down')), ((0, 3), 3))
+
+            notification = OrderNotification.objects.first()
+            self.assertEqual((notification.status, notification.attempts), ('PENDING', attempt))
+            self.assertIn('smtp down', notification.last_error)
+            self.assertGreaterEqual(notification.next_attempt_at, before + timedelta(seconds=delay))
+            self.assertLess(notification.next_attempt_at, before + timedelta(seconds=delay + 5))
+            # not due yet
+            self.assertEqual(self.deliver(), ((0, 0), 0))
+            self.make_due()
+
+        self.assertEqual(self.deliver(), ((3, 0), 3))
+
+    def test_rows_over_the_attempt_limit_are_not_sent_again(self):
+        self.assertEqual(self.deliver(OSError, max_attempts=2), ((0, 3), 3))
+        self.make_due()
+        self.assertEqual(self.deliver(OSError, max_attempts=2), ((0, 3), 3))
+
+        self.assertEqual(set(OrderNotification.objects.values_list('status', flat=True)), {'FAILED'})
+        self.make_due()
+        self.assertEqual(self.deliver(max_attempts=2), ((0, 0), 0))
+
+    def test_claimed_rows_are_hidden_from_other_claimers(self):
+        # SQLite has no SKIP LOCKED; what keeps two workers apart once the
+        # claim is committed is its next_attempt_at, checked here.
+        first = notifications._claim_batch(2)
+        second = notifications._claim_batch(2)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({row.id for row in first} & {row.id for row in second})
+        self.assertEqual(notifications._claim_batch(2), [])
+        self.assertEqual(sorted(OrderNotification.objects.values_list('attempts', flat=True)), [1, 1, 1])
+
+
+@override_settings(STOCK_ENGINE='reservation')
+class ReservationStockEngineTests(TenantTestMixin, APITestCase):
+
+    def order(self, quantity):
+        return self.client.post('/api/orders/', {
+            'orders': [{'product_id': self.product.id, 'quantity': quantity}]
+        }, format='json')
+
+    def available_stock(self):
+        return self.client.get(f'/api/products/{self.product.id}/').data['stock']
+
+    def test_order_consumes_its_reservation(self):
+        response = self.order(4)
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 6)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_insufficient_stock_leaves_stock_untouched(self):
+        response = self.order(11)
+
+        self.assertEqual(response.status_code, 400)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_sharded_stock_never_oversells(self):
+        set_stock_shards(self.product, 4)
+
+        self.assertEqual(self.order(3).status_code, 201)
+        # more than any single shard holds: gathered from several shards
+        self.assertEqual(self.order(6).status_code, 201)
+        self.assertEqual(self.order(2).status_code, 400)
+        self.assertEqual(self.available_stock(), 1)
+
+        set_stock_shards(self.product, 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_expired_reservation_is_released(self):
+        reserve_stock(self.company.id, {self.product.id: 7})
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired_reservations(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+
+class OrderListSerializationTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_order(2)
+        self.create_order(status='SUCCESS', shipped_at=timezone.now(), created_by=None)
+
+    def test_rows_render_like_the_serializer(self):
+        orders = Order.objects.filter(company=self.company).order_by('id')
+        expected = JSONRenderer().render(OrderSerializer(orders, many=True).data)
+
+        with self.assertNumQueries(1):
+            data = order_rows.serialize(order_rows.rows(orders))
+
+        self.assertEqual(JSONRenderer().render(data), expected)
+        self.assertNotIn('created_by_email', data[1])  # no creator: DRF skips the field
+
+    def test_list_pages_with_keyset_cursor(self):
+        response = self.client.get('/api/orders/', {'cursor': '', 'page_size': 1})
+        next_page = self.client.get(response.data['next'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotEqual(next_page.data['results'][0]['id'], response.data['results'][0]['id'])
+
+
+class OrderFieldSelectionTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order(3)
+
+    def select_sql(self, path, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        sql = [query['sql'] for query in queries if 'FROM "orders_order"' in query['sql']]
+        return response, sql[-1]
+
+    def test_list_fields_drop_joins(self):
+        response, sql = self.select_sql('/api/orders/', {'fields': 'id,quantity,status'})
+
+        self.assertEqual(response.data['results'], [{'id': self.order.id, 'quantity': 3, 'status': 'PENDING'}])
+        self.assertNotIn('JOIN', sql)
+
+    def test_list_exclude_keeps_needed_joins(self):
+        response, sql = self.select_sql('/api/orders/', {'exclude': 'company_name,created_by_email'})
+
+        self.assertEqual(response.data['results'][0]['product_name'], 'Widget')
+        self.assertNotIn('company_name', response.data['results'][0])
+        self.assertEqual(sql.count('JOIN'), 1)
+        self.assertIn('"products_product"', sql)
+
+    def test_retrieve_fields_narrow_columns(self):
+        response, sql = self.select_sql(f'/api/orders/{self.order.id}/', {'fields': 'id,product_name'})
+
+        self.assertEqual(response.data, {'id': self.order.id, 'product_name': 'Widget'})
+        self.assertEqual(sql.count('JOIN'), 1)
+        self.assertNotIn('"shipped_at"', sql)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/orders/', {'fields': 'id,secret'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderArchiveTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.old_success = self.aged_order('SUCCESS', days_ago=200)
+        self.old_failed = self.aged_order('FAILED', days_ago=150)
+        self.old_pending = self.aged_order('PENDING', days_ago=300)
+        self.recent = self.aged_order('SUCCESS', days_ago=1)
+        OrderNotification.objects.update(status='SENT')
+
+    def aged_order(self, status, days_ago):
+        order = self.create_order(status=status)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def archive(self):
+        call_command('archive_orders', batch_size=1, stdout=StringIO())
+
+    def list_ids(self, params=None):
+        response = self.client.get('/api/orders/', params or {})
+        self.assertEqual(response.status_code, 200)
+        return [order['id'] for order in response.data['results']]
+
+    def test_moves_old_finished_orders(self):
+        self.archive()
+
+        self.assertEqual(
+            sorted(ArchivedOrder.objects.values_list('id', flat=True)),
+            [self.old_success.id, self.old_failed.id]
+        )
+        self.assertEqual(
+            sorted(Order.objects.values_list('id', flat=True)), [self.old_pending.id, self.recent.id]
+        )
+        self.assertFalse(OrderNotification.objects.filter(order_id=self.old_success.id).exists())
+
+    def test_queued_confirmation_keeps_order_in_place(self):
+        OrderNotification.objects.filter(order=self.old_success).update(status='PENDING')
+
+        self.archive()
+
+        self.assertTrue(Order.objects.filter(pk=self.old_success.pk).exists())
+
+    def test_list_reads_archive_for_history_ranges(self):
+        self.archive()
+        history = [self.recent.id, self.old_failed.id, self.old_success.id, self.old_pending.id]
+
+        self.assertEqual(self.list_ids(), [self.recent.id, self.old_pending.id])
+        self.assertEqual(self.list_ids({'created_after': '2000-01-01'}), history)
+        self.assertEqual(self.list_ids({'created_before': str(timezone.localdate() - timedelta(days=7))}), history[1:])
+
+        ids, params = [], {'created_after': '2000-01-01', 'cursor': '', 'page_size': 1}
+        url = '/api/orders/'
+        while url:
+            response = self.client.get(url, params)
+            ids += [order['id'] for order in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(ids, history)
+
+    def test_retrieve_and_export_archived_orders(self):
+        self.archive()
+
+        response = self.client.get(f'/api/orders/{self.old_success.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product_name'], 'Widget')
+        url = f'/api/orders/{self.old_success.id}/'
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.patch(url, {'status': 'FAILED'}, format='json').status_code, 404)
+
+        export = b''.join(self.client.get('/api/orders/export/', {'created_after': '2000-01-01'}).streaming_content)
+        exported = [int(line.split(',')[0]) for line in export.decode().strip().splitlines()[1:]]
+        self.assertEqual(exported, [self.recent.id, self.old_failed.id, self.old_success.id, self.old_pending.id])
+
+    def test_rebuild_rollups_counts_archived_orders(self):
+        self.archive()
+        day = timezone.localdate(ArchivedOrder.objects.get(pk=self.old_success.pk).created_at)
+
+        rebuild_rollups(day, day)
+
+        self.assertEqual(DailyOrderRollup.objects.get(day=day, status='SUCCESS').orders, 1)
+
+    def test_month_partitions(self):
+        self.assertEqual(month_partitions(date(2025, 11, 15), date(2026, 1, 1)), [
+            ('p202511', date(2025, 12, 1)),
+            ('p202512', date(2026, 1, 1)),
+            ('p202601', date(2026, 2, 1)),
+        ])
+
+
+class OrderIdempotencyTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        idempotency._responses.clear()
+
+    def post(self, quantity=2, key='retry-1'):
+        return self.client.post(
+            '/api/orders/', {'orders': [{'product_id': self.product.id, 'quantity': quantity}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def stock(self):
+        return Product.objects.values_list('stock', flat=True).get(pk=self.product.pk)
+
+    def test_retry_replays_without_touching_products(self):
+        first = self.post()
+
+        with self.assertNumQueries(0):
+            cached = self.post()
+        idempotency._responses.clear()  # as seen from another process
+        with CaptureQueriesContext(connection) as queries:
+            stored = self.post()
+
+        self.assertEqual(first.status_code, 201)
+        for replay in (cached, stored):
+            self.assertEqual(replay.status_code, 201)
+            self.assertEqual(replay.data, first.data)
+            self.assertEqual(replay[idempotency.REPLAYED_HEADER], 'true')
+        self.assertFalse([query for query in queries if 'products_product' in query['sql']])
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.post()
+
+        self.assertEqual(self.post(quantity=3).status_code, 422)
+
+    def test_failed_request_releases_the_key(self):
+        self.assertEqual(self.post(quantity=20).status_code, 400)
+        Product.objects.filter(pk=self.product.pk).update(stock=30)
+
+        self.assertEqual(self.post(quantity=20).status_code, 201)
+        self.assertEqual(self.stock(), 10)
+
+    def test_duplicate_waits_for_the_first_request(self):
+        self.post()
+        idempotency._responses.clear()
+        row = IdempotencyKey.objects.get()
+        IdempotencyKey.objects.filter(pk=row.pk).update(status_code=None)
+
+        def first_request_finishes(delay):
+            IdempotencyKey.objects.filter(pk=row.pk).update(status_code=201)
+
+        with mock.patch('orders.idempotency.time.sleep', side_effect=first_request_finishes) as sleep:
+            response = self.post()
+
+        sleep.assert_called_once()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), 8)
+
+        IdempotencyKey.objects.filter(pk=row.pk).update(status_code=None)
+        idempotency._responses.clear()
+        with override_settings(IDEMPOTENCY_WAIT_SECONDS=0):
+            self.assertEqual(self.post().status_code, 409)
+
+    def test_claim_of_a_dead_request_expires_before_the_key(self):
+        before = timezone.now()
+        self.post()
+        row = IdempotencyKey.objects.get()
+        self.assertGreater(row.expires_at, before + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL - 60))
+
+        # the worker died before storing its outcome
+        idempotency._responses.clear()
+        claimed_at = timezone.now()
+        IdempotencyKey.objects.filter(pk=row.pk).update(
+            status_code=None, response=None, expires_at=claimed_at + timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TTL)
+        )
+        with override_settings(IDEMPOTENCY_WAIT_SECONDS=0):
+            self.assertEqual(self.post().status_code, 409)
+
+        IdempotencyKey.objects.filter(pk=row.pk).update(expires_at=claimed_at)
+        response = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, response)
+        self.assertEqual(self.stock(), 6)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_response_commits_with_the_orders(self):
+        def crash_after_commit(*args, **kwargs):
+            services.create_orders(*args, **kwargs)
+            raise RuntimeError('worker died')
+
+        with mock.patch('orders.views.create_orders', side_effect=crash_after_commit):
+            with self.assertRaises(RuntimeError):
+                self.post()
+        response = self.post()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(self.stock(), 8)
+        self.assertEqual(Order.objects.count(), 1)
+
+    @override_settings(STOCK_ENGINE='reservation')
+    def test_claim_taken_over_rolls_the_orders_back(self):
+        def taken_over_meanwhile(user, items, on_created):
+            def store_created(orders):
+                IdempotencyKey.objects.all().delete()
+                on_created(orders)
+            return services.create_orders(user, items, on_created=store_created)
+
+        with mock.patch('orders.views.create_orders', side_effect=taken_over_meanwhile):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_expired_keys_are_reclaimed_and_purged(self):
+        self.post(key='old')
+        self.post(key='new')
+        idempotency._responses.clear()
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.post(key='old')
+
+        self.assertNotIn(idempotency.REPLAYED_HEADER, response)
+        self.assertEqual(self.stock(), 4)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(idempotency.purge_expired_keys(), 2)
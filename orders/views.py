@@ -1,24 +1,47 @@
-import csv
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.http import HttpResponse
-from django.db import transaction
 from django.utils import timezone
-from .models import Order
-from products.models import Product
-from .serializers import OrderSerializer, OrderCreateSerializer
+from .archive import OrderHistory, reads_history
+from .idempotency import idempotent, store_response
+from .models import ArchivedOrder, Order
+from .serializers import OrderSerializer, OrderCreateSerializer, order_rows
+from .services import apply_status_changes, create_orders, OrderCreateError
+from .exports import export_filters, iter_merged_row_chunks, iter_row_chunks, streaming_csv_response
+from ecommerce.async_views import AsyncReadMixin
+from ecommerce.conditional import make_etag, not_modified, set_validators
+from ecommerce.field_selection import FieldSelectionMixin
 from ecommerce.permissions import OperatorPermission
 from ecommerce.pagination import OrderPagination
+from ecommerce.validation import strict_int
 # from ecommerce.email_utils import send_order_confirmation
 
+# What an order's ETag is built from: every field of OrderSerializer but
+# id and created_at, which never change.
+ORDER_ETAG_FIELDS = (
+    'status', 'shipped_at', 'quantity', 'product_id', 'product__name', 'company__name', 'created_by__email'
+)
 
-class OrderViewSet(viewsets.ModelViewSet):
+
+def order_etag_state(order):
+    """ORDER_ETAG_FIELDS of an order instance with its relations loaded."""
+    return (
+        order.status, order.shipped_at, order.quantity, order.product_id, order.product.name,
+        order.company.name, order.created_by.email if order.created_by else None
+    )
+
+
+class OrderViewSet(AsyncReadMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     permission_classes = [OperatorPermission]
     pagination_class = OrderPagination
     serializer_class = OrderSerializer
     # Only allow PATCH for updates (status changes)
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    max_bulk_status = 10000
+    # read preference (ecommerce/db_routing.py); export overrides it per action
+    read_database = None
+    # OperatorPermission checks created_at of the retrieved order
+    field_selection_columns = ('id', 'created_at')
     
     def get_queryset(self):
         """
@@ -32,7 +55,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         queryset = Order.objects.filter(
-            company=user.company
+            company_id=user.company_id
         ).select_related(
             'product',
             'company',
@@ -44,58 +67,161 @@ class OrderViewSet(viewsets.ModelViewSet):
             'created_by__email'
         ).order_by('-created_at')
         
-        return queryset
-    
+        return self.select_fields(queryset)
+
+    def get_archived_queryset(self):
+        """Archived orders of the user's company (orders/archive.py)."""
+        return ArchivedOrder.objects.filter(company_id=self.request.user.company_id).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Optional filters: ?status=SUCCESS&created_after=2025-01-01&created_before=2025-01-31
+
+        A created_at range starting before the archive horizon (or with no
+        start) also returns archived orders.
+        """
+        try:
+            filters = export_filters(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, queryset = self.list_rows(filters)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(rows.serialize(queryset))
+        return self.get_paginated_response(rows.serialize(page))
+
+    async def alist(self, request, *args, **kwargs):
+        """list() for async views (ecommerce/async_views.py)."""
+        try:
+            filters = export_filters(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, queryset = self.list_rows(filters)
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            return Response(rows.serialize([row async for row in queryset]))
+        return self.get_paginated_response(rows.serialize(page))
+
+    def list_rows(self, filters):
+        # Serialization dominated large pages: rows are read with values()
+        # and mapped by a precompiled plan that yields OrderSerializer's JSON.
+        rows = order_rows
+        selected = self.get_selected_fields()
+        if selected is not None:
+            rows = rows.select(selected)
+        queryset = rows.rows(self.filter_queryset(self.get_queryset().filter(**filters)), 'id', 'created_at')
+        if reads_history(filters):
+            archived = self.filter_queryset(self.get_archived_queryset().filter(**filters))
+            queryset = OrderHistory(queryset, rows.rows(archived, 'id', 'created_at'))
+        return rows, queryset
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Create one or more orders with stock validation.
-        Uses transaction and select_for_update to prevent race conditions.
+        All referenced products are locked, checked and decremented in one
+        batch (see orders.services.create_orders), so the number of queries
+        does not grow with the number of items.
+
+        With an Idempotency-Key header, a retry returns the first response
+        instead of placing the orders again (orders/idempotency.py). The
+        response is stored in the transaction that writes the orders.
         """
         serializer = OrderCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        
-        created_orders = []
-        
-        with transaction.atomic():
-            for item in serializer.validated_data['orders']:
-                try:
-                    product = Product.objects.select_for_update().get(
-                        id=item['product_id'],
-                        company=request.user.company,
-                        is_active=True
-                    )
-                except Product.DoesNotExist:
-                    return Response(
-                        {'error': f'Product with id {item["product_id"]} not found or does not belong to your company'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-                if product.stock < item['quantity']:
-                    return Response(
-                        {'error': f'Insufficient stock for {product.name}'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-               
-                product.stock -= item['quantity']
-                product.save(update_fields=['stock'])
-                
-                # Create order
-                order = Order.objects.create(
-                    company=request.user.company,
-                    product=product,
-                    quantity=item['quantity'],
-                    created_by=request.user,
-                    status='PENDING'   
-                )
-                
-                created_orders.append(order)
-                
-                # send_order_confirmation(order)
-        
+
+        output = []
+
+        def store_created(orders):
+            output.extend(OrderSerializer(orders, many=True).data)
+            store_response(request, status.HTTP_201_CREATED, output)
+
+        try:
+            create_orders(request.user, serializer.validated_data['orders'], on_created=store_created)
+        except OrderCreateError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
         # Return created orders
-        output_serializer = OrderSerializer(created_orders, many=True)
-        return Response(output_serializer.data, status=status.HTTP_201_CREATED)
+        return Response(output, status=status.HTTP_201_CREATED)
+
+    def retrieve_state(self, request, pk):
+        return OperatorPermission().filter_queryset(
+            request, self.get_queryset()
+        ).filter(pk=pk).values_list(*ORDER_ETAG_FIELDS)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Orders carry no modification timestamp, so the ETag is built from
+        # every value of the response that can change (related names
+        # included); reading them is the only query of a 304.
+        try:
+            state = self.retrieve_state(request, kwargs['pk']).first()
+        except (TypeError, ValueError):
+            state = None
+
+        if state is None:
+            return self.retrieve_archived(request, *args, **kwargs)
+
+        etag = make_etag(kwargs['pk'], *state)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """retrieve() for async views."""
+        try:
+            state = await self.retrieve_state(request, kwargs['pk']).afirst()
+        except (TypeError, ValueError):
+            state = None
+
+        if state is None:
+            return await self.aretrieve_archived(request, *args, **kwargs)
+
+        etag = make_etag(kwargs['pk'], *state)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        response = await super().aretrieve(request, *args, **kwargs)
+        return set_validators(response, etag)
+
+    def archived_order(self, request, pk):
+        return OperatorPermission().filter_queryset(
+            request, self.get_archived_queryset()
+        ).select_related('product', 'company', 'created_by').filter(pk=pk)
+
+    def retrieve_archived(self, request, *args, **kwargs):
+        # Finished orders move to the archive, where they no longer change.
+        try:
+            order = self.archived_order(request, kwargs['pk']).first()
+        except (TypeError, ValueError):
+            order = None
+
+        if order is None:
+            # unknown or forbidden order: let the regular path respond
+            return super().retrieve(request, *args, **kwargs)
+        return self.archived_response(request, order)
+
+    async def aretrieve_archived(self, request, *args, **kwargs):
+        try:
+            order = await self.archived_order(request, kwargs['pk']).afirst()
+        except (TypeError, ValueError):
+            order = None
+
+        if order is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        return self.archived_response(request, order)
+
+    def archived_response(self, request, order):
+        etag = make_etag(order.pk, *order_etag_state(order))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        return set_validators(Response(self.get_serializer(order).data), etag)
 
     def partial_update(self, request, *args, **kwargs):
 
@@ -121,28 +247,85 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = OrderSerializer(instance)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['patch'])
+    def bulk_status(self, request):
+        """Change the status of many orders at once (PATCH).
+
+        Body: {"orders": [{"id": 1, "status": "SUCCESS"}, {"id": 2, "status": "FAILED"}]}
+
+        Returns: {"updated": N, "results": [{"id": 1, "result": "updated"}, ...]}
+        where result is one of updated, unchanged, not_found or invalid.
+        Operators can only change orders created today.
+        """
+        entries = request.data.get('orders')
+        if not isinstance(entries, list) or not entries:
+            return Response({'detail': '`orders` (non-empty list) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.max_bulk_status:
+            return Response({'detail': f'At most {self.max_bulk_status} orders per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        valid_choices = [c[0] for c in Order.STATUS_CHOICES]
+        changes = {}
+        results = {}
+        for entry in entries:
+            try:
+                order_id = strict_int(entry['id'])
+            except (KeyError, TypeError, ValueError):
+                return Response({'detail': 'Each entry needs an integer `id`.'}, status=status.HTTP_400_BAD_REQUEST)
+            # results keeps request order; a repeated id takes its last status
+            results[order_id] = None
+            if entry.get('status') in valid_choices:
+                changes[order_id] = entry['status']
+            else:
+                changes.pop(order_id, None)
+                results[order_id] = 'invalid'
+
+        queryset = OperatorPermission().filter_queryset(
+            request, Order.objects.filter(company_id=request.user.company_id)
+        )
+        if changes:
+            results.update(apply_status_changes(queryset, changes))
+
+        return Response({
+            'updated': sum(1 for result in results.values() if result == 'updated'),
+            'results': [{'id': order_id, 'result': result} for order_id, result in results.items()],
+        }, status=status.HTTP_200_OK)
+
     # export specific user's company
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], read_database='replica')
     def export(self, request):
-        
-        orders = Order.objects.filter(
-            company=request.user.company
-        ).select_related('product', 'created_by').order_by('-created_at')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="company_orders.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Order ID', 'Product', 'Quantity', 'Status', 'Created By', 'Created At'])
-        
-        for order in orders:
-            writer.writerow([
-                order.id,
-                order.product.name,
-                order.quantity,
-                order.status,
-                order.created_by.email,
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        return response
+        """
+        Stream the company's orders as CSV, newest first.
+
+        Optional filters: ?status=SUCCESS&created_after=2025-01-01&created_before=2025-01-31
+        (archived orders are included as in list).
+        """
+        try:
+            filters = export_filters(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = ['id', 'product__name', 'quantity', 'status', 'created_by__email', 'created_at']
+        orders = Order.objects.filter(company_id=request.user.company_id, **filters)
+        if reads_history(filters):
+            archived = ArchivedOrder.objects.filter(company_id=request.user.company_id, **filters)
+            chunks = iter_merged_row_chunks([orders, archived], fields)
+        else:
+            chunks = iter_row_chunks(orders, fields)
+
+        def format_row(row):
+            order_id, product_name, quantity, status_value, email, created_at = row
+            return [
+                order_id,
+                product_name,
+                quantity,
+                status_value,
+                email or 'N/A',
+                created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ]
+
+        return streaming_csv_response(
+            'company_orders.csv',
+            ['Order ID', 'Product', 'Quantity', 'Status', 'Created By', 'Created At'],
+            chunks,
+            format_row
+        )
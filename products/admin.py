@@ -1,19 +1,41 @@
 from django.contrib import admin
+from django.utils import timezone
+from ecommerce.admin_performance import CompanyFilter, PerformanceModelAdmin
 from .models import Product
+from .cache import invalidate_catalog
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(PerformanceModelAdmin):
     list_display = ['id', 'name', 'company', 'price', 'stock', 'is_active', 'created_by', 'created_at']
-    list_filter = ['is_active', 'company', 'created_at']
-    search_fields = ['name', 'company__name']
+    # User.__str__ shows the company's name
+    list_select_related = ['company', 'created_by__company']
+    list_filter = ['is_active', CompanyFilter]
+    date_hierarchy = 'created_at'
+    search_fields = ['^name', '^company__name']
+    autocomplete_fields = ['company']
     ordering = ['-created_at']
     readonly_fields = ['created_by', 'created_at', 'last_updated_at']
     
     actions = ['mark_inactive']
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_catalog(obj.company_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_catalog(obj.company_id)
+
+    def delete_queryset(self, request, queryset):
+        company_ids = list(queryset.values_list('company_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        invalidate_catalog(*company_ids)
+    
     def mark_inactive(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        company_ids = list(queryset.values_list('company_id', flat=True).distinct())
+        updated = queryset.update(is_active=False, last_updated_at=timezone.now())
+        invalidate_catalog(*company_ids)
         self.message_user(request, f'{updated} product(s) marked as inactive.')
     
     mark_inactive.short_description = "Mark selected products as inactive"
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from .models import Product
+        from .search import drop_deleted_product
+
+        post_delete.connect(drop_deleted_product, sender=Product, dispatch_uid='products.search.drop_deleted_product')
@@ -0,0 +1,125 @@
+"""
+Per-tenant cache for product catalog responses.
+
+Entries are keyed by company, catalog version and request URL. Writes never
+delete entries: they bump the company's version number so every older entry
+becomes unreachable and simply expires. The backend is whatever cache alias
+CATALOG_CACHE_ALIAS points at (local memory by default, see CACHES). The
+``a``-prefixed functions are the same through the async cache API, for
+async views.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from ecommerce.db_routing import reading_from_replica
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _version_key(company_id):
+    return f'catalog:{company_id}:version'
+
+
+def catalog_version(company_id):
+    cache = _cache()
+    key = _version_key(company_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed with a timestamp rather than 1 so an evicted version key can
+        # never make old entries reachable again.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def acatalog_version(company_id):
+    cache = _cache()
+    key = _version_key(company_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump_version(company_id):
+    cache = _cache()
+    key = _version_key(company_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    _count('invalidations')
+
+
+def invalidate_catalog(*company_ids, using=None):
+    """Drop the cached catalog of the given companies once the current transaction commits."""
+    for company_id in set(company_ids):
+        transaction.on_commit(lambda company_id=company_id: _bump_version(company_id), using=using)
+
+
+def _entry_key(company_id, version, key):
+    digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return f'catalog:{company_id}:{version}:{digest}'
+
+
+def catalog_cache_key(company_id, key):
+    """Cache key for ``key`` (e.g. a request URL) in the company's current catalog."""
+    return _entry_key(company_id, catalog_version(company_id), key)
+
+
+async def acatalog_cache_key(company_id, key):
+    return _entry_key(company_id, await acatalog_version(company_id), key)
+
+
+def get_catalog_entry(cache_key):
+    entry = _cache().get(cache_key)
+    _count('hits' if entry is not None else 'misses')
+    return entry
+
+
+async def aget_catalog_entry(cache_key):
+    entry = await _cache().aget(cache_key)
+    _count('hits' if entry is not None else 'misses')
+    return entry
+
+
+def _entry_timeout():
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    if reading_from_replica():
+        # A lagging replica may miss a write whose invalidation already
+        # happened; keep such entries no longer than the lag allowance.
+        timeout = min(timeout, settings.REPLICA_PIN_SECONDS)
+    return timeout
+
+
+def set_catalog_entry(cache_key, entry):
+    _cache().set(cache_key, entry, _entry_timeout())
+
+
+async def aset_catalog_entry(cache_key, entry):
+    await _cache().aset(cache_key, entry, _entry_timeout())
+
+
+def catalog_cache_stats():
+    """Hit/miss/invalidation counters of this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
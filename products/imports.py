@@ -0,0 +1,249 @@
+"""
+Streaming product import (CSV or JSONL) with upsert on (company, name).
+
+Input is read line by line and handled ``chunk_size`` rows at a time, so
+memory stays bounded whatever the file size. Each chunk is validated
+column by column, then written with one ``bulk_create(update_conflicts=True)``
+in its own transaction; one extra SELECT per chunk tells created rows from
+updated ones. Rows are expected to carry:
+
+- name: required, at most 255 characters
+- price: required, > 0 with at most two decimals
+- stock: required, integer >= 0
+- is_active: optional boolean, default true
+
+Rejected rows are reported with their line number (first MAX_REPORTED_ERRORS).
+"""
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import connections, router, transaction
+
+from .cache import invalidate_catalog
+from .models import Product
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+NAME_MAX_LENGTH = Product._meta.get_field('name').max_length
+MAX_PRICE = Decimal('99999999.99')
+MAX_STOCK = 2147483647
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+class ImportFormatError(Exception):
+    """Raised when the input cannot be parsed at all."""
+
+
+def iter_records(lines, fmt):
+    """Yield ``(line_number, record, error)`` from an iterable of byte lines."""
+    text = codecs.iterdecode(lines, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or 'name' not in reader.fieldnames:
+            raise ImportFormatError('CSV input needs a header row with at least a `name` column.')
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None, {'row': 'Invalid JSON.'}
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, {'row': 'Each line must be a JSON object.'}
+                continue
+            yield line_number, record, None
+    else:
+        raise ImportFormatError(f'Unknown format. Valid choices: {list(IMPORT_FORMATS)}')
+
+
+# Column validators: each maps raw values to (value, error) pairs. Also
+# used by the bulk_update action (products/services.py).
+
+def clean_names(values):
+    for value in values:
+        value = '' if value is None else str(value).strip()
+        if not value:
+            yield None, 'This field is required.'
+        elif len(value) > NAME_MAX_LENGTH:
+            yield None, f'Ensure this field has no more than {NAME_MAX_LENGTH} characters.'
+        else:
+            yield value, None
+
+
+def clean_prices(values):
+    for value in values:
+        try:
+            price = Decimal(str(value).strip())
+        except (InvalidOperation, ValueError):
+            yield None, 'A valid number is required.'
+            continue
+        if not price.is_finite() or price <= 0:
+            yield None, 'Price must be greater than 0.'
+        elif price.as_tuple().exponent < -2:
+            yield None, 'Ensure that there are no more than 2 decimal places.'
+        elif price > MAX_PRICE:
+            yield None, f'Ensure this value is at most {MAX_PRICE}.'
+        else:
+            yield price, None
+
+
+def clean_stocks(values):
+    for value in values:
+        try:
+            stock = int(str(value).strip())
+        except ValueError:
+            yield None, 'A valid integer is required.'
+            continue
+        if not 0 <= stock <= MAX_STOCK:
+            yield None, f'Ensure this value is between 0 and {MAX_STOCK}.'
+        else:
+            yield stock, None
+
+
+def clean_booleans(values):
+    for value in values:
+        if value is None or value == '':
+            yield True, None
+        elif isinstance(value, bool):
+            yield value, None
+        elif str(value).strip().lower() in TRUE_VALUES:
+            yield True, None
+        elif str(value).strip().lower() in FALSE_VALUES:
+            yield False, None
+        else:
+            yield None, 'Must be a valid boolean.'
+
+
+COLUMNS = [
+    ('name', clean_names),
+    ('price', clean_prices),
+    ('stock', clean_stocks),
+    ('is_active', clean_booleans),
+]
+
+
+def validate_chunk(records):
+    """
+    Validate ``[(line_number, record)]`` column by column. Returns
+    ``(valid, errors)``: ``valid`` maps name -> (line_number, fields), later
+    rows winning over earlier ones with the same name; ``errors`` is a list
+    of ``{'line': n, 'errors': {field: message}}``.
+    """
+    results = {
+        field: list(validator(record.get(field) for _, record in records))
+        for field, validator in COLUMNS
+    }
+    valid = {}
+    errors = []
+    for position, (line_number, _) in enumerate(records):
+        row_errors = {
+            field: results[field][position][1]
+            for field, _ in COLUMNS if results[field][position][1]
+        }
+        if row_errors:
+            errors.append({'line': line_number, 'errors': row_errors})
+            continue
+        fields = {field: results[field][position][0] for field, _ in COLUMNS}
+        valid[fields['name']] = (line_number, fields)
+    return valid, errors
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+        }
+
+
+def _upsert_chunk(company, user, valid, report, using):
+    names = list(valid)
+    with transaction.atomic(using=using):
+        existing = dict(
+            Product.objects.using(using).filter(company=company, name__in=names).values_list('name', 'stock_shards')
+        )
+        products = []
+        for name in names:
+            line_number, fields = valid[name]
+            if existing.get(name):
+                report.reject({'line': line_number, 'errors': {
+                    'stock': 'Stock of this product is sharded; merge it first (shard_stock <id> --shards 0).'
+                }})
+                continue
+            products.append(Product(company=company, created_by=user, **fields))
+        if not products:
+            return
+
+        options = {}
+        if connections[using].features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['company', 'name']
+        Product.objects.using(using).bulk_create(
+            products,
+            update_conflicts=True,
+            update_fields=['price', 'stock', 'is_active', 'last_updated_at'],
+            **options
+        )
+    updated = sum(1 for product in products if product.name in existing)
+    report.updated += updated
+    report.created += len(products) - updated
+
+
+def import_products(company, user, lines, fmt, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Upsert the company's products from ``lines`` (an iterable of byte lines
+    in ``fmt``). Each chunk commits on its own, so a failure part-way keeps
+    the chunks already written. Returns an ImportReport; raises
+    ImportFormatError for unreadable input.
+    """
+    using = router.db_for_write(Product)
+    report = ImportReport()
+    records = iter_records(lines, fmt)
+
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            parsed = []
+            for line_number, record, error in chunk:
+                if error:
+                    report.reject({'line': line_number, 'errors': error})
+                else:
+                    parsed.append((line_number, record))
+            valid, errors = validate_chunk(parsed)
+            for error in errors:
+                report.reject(error)
+            if valid:
+                _upsert_chunk(company, user, valid, report, using)
+    except UnicodeDecodeError:
+        raise ImportFormatError('Input must be UTF-8 encoded.')
+    finally:
+        if report.created or report.updated:
+            invalidate_catalog(company.id, using=using)
+
+    return report
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from companies.models import Company
+from products.imports import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, ImportFormatError, import_products
+
+
+class Command(BaseCommand):
+    help = 'Create or update a company\'s products from a CSV or JSONL file, upserting on name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--user', help='Email of the user recorded as creator (default: a company admin).')
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f'Company {options["company_id"]} does not exist.')
+
+        users = User.objects.filter(company=company)
+        if options['user']:
+            user = users.filter(email=options['user']).first()
+        else:
+            user = users.filter(role='ADMIN').order_by('id').first()
+        if user is None:
+            raise CommandError('No matching user in this company.')
+
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(f'Cannot tell the format of {options["path"]}; pass --format.')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be positive.')
+
+        try:
+            with open(options['path'], 'rb') as lines:
+                report = import_products(company, user, lines, fmt, chunk_size=options['chunk_size'])
+        except (OSError, ImportFormatError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stderr.write(f'line {error["line"]}: {error["errors"]}')
+        if report.rejected > len(report.errors):
+            self.stderr.write(f'... {report.rejected - len(report.errors)} more rejected rows not shown')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} created, {report.updated} updated, {report.rejected} rejected.'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Return the stock of expired reservations (orders that were never written).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--poll-interval', type=float, default=30.0,
+                            help='Seconds between sweeps.')
+        parser.add_argument('--once', action='store_true', help='Sweep once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            if released:
+                self.stdout.write(f'released {released} reservations')
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
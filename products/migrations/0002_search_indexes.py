@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:45
+
+import django.core.validators
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Only MySQL has FULLTEXT; other backends use the in-process index in
+    # products/search.py.
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX idx_product_name_ft ON products_product (name)"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute("DROP INDEX idx_product_name_ft ON products_product")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("companies", "0001_initial"),
+        ("products", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="price",
+            field=models.DecimalField(
+                decimal_places=2,
+                max_digits=10,
+                validators=[django.core.validators.MinValueValidator(Decimal("0.01"))],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["company", "last_updated_at"],
+                name="idx_product_company_updated",
+            ),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="stock_shards",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("shard", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("quantity", models.PositiveIntegerField()),
+                ("token", models.CharField(db_index=True, max_length=32)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_reservations",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock reservation",
+                "verbose_name_plural": "Stock reservations",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="StockShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                ("stock", models.PositiveIntegerField(default=0)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_shard_rows",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Stock shard",
+                "verbose_name_plural": "Stock shards",
+                "ordering": ["product", "index"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "index"),
+                        name="uniq_stock_shard_product_index",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -17,6 +17,8 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal('0.01'))]
     )
     stock = models.PositiveIntegerField(default=0)
+    # Number of StockShard rows holding this product's stock (0: not sharded).
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -37,7 +39,57 @@ class Product(models.Model):
             models.Index(fields=['company', 'is_active'], name='idx_product_company_active'),
             models.Index(fields=['company', 'name'], name='idx_product_company_name'),
             models.Index(fields=['created_at'], name='idx_product_created'),
+            models.Index(fields=['company', 'last_updated_at'], name='idx_product_company_updated'),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.company.name})"
+
+
+class StockShard(models.Model):
+    """One slice of a hot product's stock; buyers decrement a random slice."""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_shard_rows'
+    )
+    index = models.PositiveSmallIntegerField()
+    stock = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Stock shard'
+        verbose_name_plural = 'Stock shards'
+        ordering = ['product', 'index']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'index'], name='uniq_stock_shard_product_index'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.index} of product #{self.product_id}: {self.stock}"
+
+
+class StockReservation(models.Model):
+    """
+    Stock taken for an order that has not been written yet. Deleted when the
+    order commits; stock of expired reservations is returned by the
+    release_stock_reservations command.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+    quantity = models.PositiveIntegerField()
+    token = models.CharField(max_length=32, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Stock reservation'
+        verbose_name_plural = 'Stock reservations'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity} x product #{self.product_id} ({self.token})"
+
@@ -0,0 +1,278 @@
+"""
+Ranked product name search.
+
+On MySQL the search runs against the FULLTEXT index on ``Product.name``
+(migration 0002) in boolean mode, every term as a required prefix
+(``+term*``), ranked by MATCH relevance.
+
+Other backends (SQLite in development and tests) use an in-process index
+per company: a token -> product ids posting map, a sorted vocabulary for
+prefix lookups and a trigram -> token map for matches inside a word. The
+index is built on first use and kept current incrementally: whenever the
+company's catalog version moves (products/cache.py), only the rows whose
+``last_updated_at`` is past the index's watermark, less
+SEARCH_INDEX_OVERLAP_SECONDS, are re-read. The overlap catches rows that
+committed after a newer row had moved the watermark past their timestamp.
+Hard-deleted rows cannot be re-read, so ``drop_deleted_product`` (connected
+to ``post_delete`` in ProductsConfig.ready) removes them once the delete
+commits.
+
+With a per-process cache (locmem, the default), a process never sees the
+version bumps of the others, so its index is also rebuilt from scratch
+once it is SEARCH_INDEX_MAX_AGE seconds old.
+
+Both paths return product ids; callers load the rows they need.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models.expressions import RawSQL
+
+from .cache import catalog_version
+from .models import Product
+
+# Shortest query (after normalisation) that is searched at all.
+MIN_QUERY_LENGTH = 2
+
+# Words of a query beyond this many are ignored.
+MAX_QUERY_TERMS = 6
+
+# Per matched term: whole word, start of a word, inside a word.
+EXACT_WEIGHT, PREFIX_WEIGHT, INFIX_WEIGHT = 3, 2, 1
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Cache backends that are not shared between processes.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class TenantSearchIndex:
+    """Token index over the active products of one company."""
+
+    def __init__(self, company_id):
+        self.company_id = company_id
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.version = None
+        self.watermark = None
+        self.built_at = None
+        self.documents = {}               # product id -> tokens
+        self.postings = defaultdict(list)  # token -> negated product ids, sorted
+        self.vocabulary = []              # sorted tokens, for prefix ranges
+        self.trigrams = defaultdict(set)  # trigram -> tokens
+
+    def _expired(self):
+        backend = settings.CACHES[settings.CATALOG_CACHE_ALIAS]['BACKEND']
+        return (
+            backend in LOCAL_CACHE_BACKENDS and self.built_at is not None
+            and time.monotonic() - self.built_at >= settings.SEARCH_INDEX_MAX_AGE
+        )
+
+    def refresh(self, using):
+        version = catalog_version(self.company_id)
+        if self._expired():
+            self._reset()
+        elif version == self.version:
+            return
+        queryset = Product.objects.using(using).filter(company_id=self.company_id)
+        building = self.watermark is None
+        if building:
+            self.built_at = time.monotonic()
+        else:
+            # Rows in the overlap are re-read; applying a row twice is
+            # harmless.
+            queryset = queryset.filter(
+                last_updated_at__gte=self.watermark - timedelta(seconds=settings.SEARCH_INDEX_OVERLAP_SECONDS)
+            )
+        rows = queryset.values_list('id', 'name', 'is_active', 'last_updated_at')
+
+        new_tokens = set()
+        for product_id, name, is_active, updated_at in rows.iterator(chunk_size=10000):
+            self._remove(product_id)
+            if is_active:
+                new_tokens.update(self._add(product_id, name, building))
+            if self.watermark is None or updated_at > self.watermark:
+                self.watermark = updated_at
+
+        # A token can be added and dropped again within one refresh.
+        new_tokens = {token for token in new_tokens if token in self.postings}
+        if building:
+            for keys in self.postings.values():
+                keys.sort()
+            self.vocabulary = sorted(new_tokens)
+        for token in new_tokens:
+            if not building:
+                bisect.insort(self.vocabulary, token)
+            for trigram in _trigrams(token):
+                self.trigrams[trigram].add(token)
+        self.version = version
+
+    def _add(self, product_id, name, building=False):
+        # Equally scored products rank newest first (as on MySQL), so
+        # postings hold negated ids in ascending order.
+        key = -product_id
+        tokens = tuple(set(tokenize(name)))
+        self.documents[product_id] = tokens
+        added = []
+        for token in tokens:
+            if token not in self.postings:
+                added.append(token)
+            if building:
+                self.postings[token].append(key)
+            else:
+                bisect.insort(self.postings[token], key)
+        return added
+
+    def _remove(self, product_id):
+        key = -product_id
+        for token in self.documents.pop(product_id, ()):
+            keys = self.postings[token]
+            del keys[bisect.bisect_left(keys, key)]
+            if not keys:
+                del self.postings[token]
+                position = bisect.bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    del self.vocabulary[position]
+                for trigram in _trigrams(token):
+                    self.trigrams[trigram].discard(token)
+
+    def _matching_tokens(self, term):
+        """{token: weight} of indexed tokens equal to, starting with or containing ``term``."""
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = EXACT_WEIGHT if token == term else PREFIX_WEIGHT
+
+        if len(term) >= 3:
+            candidates = None
+            for trigram in _trigrams(term):
+                tokens = self.trigrams.get(trigram, set())
+                candidates = tokens if candidates is None else candidates & tokens
+                if not candidates:
+                    break
+            for token in candidates or ():
+                if token not in matches and term in token:
+                    matches[token] = INFIX_WEIGHT
+        return matches
+
+    def search(self, terms, limit):
+        per_term = [self._matching_tokens(term) for term in terms]
+        if not all(per_term):
+            return []
+
+        # A product's score is the sum of its best weight for each term.
+        # Candidates are streamed newest first from the postings of the
+        # most selective term, so once ``limit`` products reach the best
+        # score any product could get, nothing later can outrank them.
+        driver = min(per_term, key=lambda matches: sum(len(self.postings[t]) for t in matches))
+        best_possible = sum(max(matches.values()) for matches in per_term)
+        by_score = defaultdict(list)
+
+        for key in heapq.merge(*(self.postings[token] for token in driver)):
+            product_id = -key
+            tokens = self.documents[product_id]
+            score = 0
+            for matches in per_term:
+                weight = max((matches.get(token, 0) for token in tokens), default=0)
+                if not weight:
+                    break
+                score += weight
+            else:
+                ranked = by_score[score]
+                if ranked and ranked[-1] == product_id:
+                    continue  # several of its tokens match the driver term
+                ranked.append(product_id)
+                if score == best_possible and len(ranked) >= limit:
+                    break
+
+        results = []
+        for score in sorted(by_score, reverse=True):
+            results.extend(by_score[score][:limit - len(results)])
+            if len(results) >= limit:
+                break
+        return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _tenant_index(company_id):
+    with _indexes_lock:
+        index = _indexes.get(company_id)
+        if index is None:
+            index = _indexes[company_id] = TenantSearchIndex(company_id)
+        return index
+
+
+def drop_deleted_product(sender, instance, using, **kwargs):
+    """post_delete receiver: forget a hard-deleted product once the delete commits."""
+    # Model.delete() clears instance.pk once the signal has run.
+    company_id, product_id = instance.company_id, instance.pk
+
+    def drop():
+        with _indexes_lock:
+            index = _indexes.get(company_id)
+        if index is not None:
+            with index.lock:
+                index._remove(product_id)
+
+    transaction.on_commit(drop, using=using)
+
+
+def _fulltext_search(company_id, terms, limit, using):
+    query = ' '.join(f'+{term}*' for term in terms)
+    quote_name = connections[using].ops.quote_name
+    column = f'{quote_name(Product._meta.db_table)}.{quote_name(Product._meta.get_field("name").column)}'
+    return list(
+        Product.objects.using(using).filter(
+            company_id=company_id,
+            is_active=True
+        ).annotate(
+            score=RawSQL(f'MATCH ({column}) AGAINST (%s IN BOOLEAN MODE)', (query,))
+        ).filter(score__gt=0).order_by('-score', '-id').values_list('id', flat=True)[:limit]
+    )
+
+
+def search_product_ids(company_id, query, limit=20):
+    """
+    Ids of the company's active products matching every word of ``query``
+    (each word as a prefix, so partial input works for typeahead), best
+    match first. Returns [] for queries shorter than MIN_QUERY_LENGTH.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if sum(len(term) for term in terms) < MIN_QUERY_LENGTH:
+        return []
+
+    using = router.db_for_read(Product)
+    if connections[using].vendor == 'mysql':
+        return _fulltext_search(company_id, terms, limit, using)
+
+    index = _tenant_index(company_id)
+    with index.lock:
+        # The index only reads changes past its watermark once per catalog
+        # version, so it must read them where they are already committed.
+        index.refresh(DEFAULT_DB_ALIAS)
+        return index.search(terms, limit)
@@ -1,11 +1,23 @@
 from rest_framework import serializers
 from products.models import Product
 from django.contrib.auth import get_user_model
+from ecommerce.row_serializers import RowSerializer
 
 User = get_user_model()
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class AvailableStockMixin:
+    """Report ``available_stock`` (stock plus sharded stock) as ``stock`` when annotated."""
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        available = getattr(instance, 'available_stock', None)
+        if available is not None:
+            data['stock'] = available
+        return data
+
+
+class ProductSerializer(AvailableStockMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.email', read_only=True)
     company_name = serializers.CharField(source='company.name', read_only=True)
     
@@ -23,6 +35,13 @@ class ProductSerializer(serializers.ModelSerializer):
         # set the company and created_by fields in the view
         return super().create(validated_data)
 
+    def validate_stock(self, value):
+        if self.instance is not None and self.instance.stock_shards and value != self.instance.stock:
+            raise serializers.ValidationError(
+                'Stock of this product is sharded; merge it first (shard_stock <id> --shards 0).'
+            )
+        return value
+
     def validate_price(self, value):
         from decimal import Decimal
         if value is None:
@@ -35,8 +54,13 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(AvailableStockMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'price', 'stock', 'is_active']
+
+
+# ProductListSerializer output straight from values() rows of a queryset
+# annotated with available_stock, for the list endpoint
+product_list_rows = RowSerializer(ProductListSerializer, sources={'stock': 'available_stock'})
@@ -0,0 +1,102 @@
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .imports import MAX_STOCK
+from .models import Product
+
+# Rows locked, read and written per statement.
+BULK_UPDATE_BATCH = 1000
+
+
+def _update_sql(connection, rows):
+    quote = connection.ops.quote_name
+    table = quote(Product._meta.db_table)
+    if connection.vendor == 'mysql':
+        values = ' UNION ALL '.join(['SELECT %s AS id, %s AS price, %s AS stock'] * rows)
+        return (
+            f'UPDATE {table} JOIN ({values}) AS v ON {table}.id = v.id '
+            f'SET {table}.price = v.price, {table}.stock = v.stock, {table}.last_updated_at = %s'
+        )
+    # SQLite and PostgreSQL name the columns of a VALUES list column1, column2, ...
+    values = ', '.join(['(%s, %s, %s)'] * rows)
+    return (
+        f'UPDATE {table} SET price = v.column2, stock = v.column3, last_updated_at = %s '
+        f'FROM (VALUES {values}) AS v WHERE {table}.id = v.column1'
+    )
+
+
+def _write_batch(rows, now, using):
+    connection = connections[using]
+    params = []
+    for product_id, price, stock in rows:
+        params.extend([product_id, connection.ops.adapt_decimalfield_value(price, 10, 2), stock])
+    now = connection.ops.adapt_datetimefield_value(now)
+    if connection.vendor == 'mysql':
+        params.append(now)
+    else:
+        params.insert(0, now)
+    with connection.cursor() as cursor:
+        cursor.execute(_update_sql(connection, len(rows)), params)
+
+
+def apply_product_updates(queryset, updates):
+    """
+    Apply ``{product_id: {'price'?, 'stock'?, 'stock_delta'?}}`` (validated
+    values) to the products in ``queryset``.
+
+    Per batch of BULK_UPDATE_BATCH products: one locking SELECT of the
+    current price and stock, then one UPDATE joining a list of the new
+    values, so the cost does not grow with the number of distinct prices.
+    Returns ``{product_id: result}`` with result one of 'updated',
+    'unchanged', 'not_found' (outside ``queryset``), 'sharded' (stock change
+    on a product with sharded stock), 'insufficient_stock' (``stock_delta``
+    below zero) or 'invalid' (``stock_delta`` past the column's range).
+    """
+    using = router.db_for_write(Product)
+    ids = sorted(updates)  # lock rows in a stable order
+    results = {}
+    company_ids = set()
+    now = timezone.now()
+
+    with transaction.atomic(using=using):
+        for start in range(0, len(ids), BULK_UPDATE_BATCH):
+            batch = ids[start:start + BULK_UPDATE_BATCH]
+            current = {
+                row[0]: row[1:]
+                for row in queryset.using(using).select_for_update().filter(id__in=batch).values_list(
+                    'id', 'price', 'stock', 'stock_shards', 'company_id'
+                ).order_by()
+            }
+            rows = []
+            for product_id in batch:
+                if product_id not in current:
+                    results[product_id] = 'not_found'
+                    continue
+                price, stock, stock_shards, company_id = current[product_id]
+                update = updates[product_id]
+                new_price = update.get('price', price)
+                if 'stock_delta' in update:
+                    new_stock = stock + update['stock_delta']
+                else:
+                    new_stock = update.get('stock', stock)
+
+                if new_stock != stock and stock_shards:
+                    results[product_id] = 'sharded'
+                elif new_stock < 0:
+                    results[product_id] = 'insufficient_stock'
+                elif new_stock > MAX_STOCK:
+                    results[product_id] = 'invalid'
+                elif new_price == price and new_stock == stock:
+                    results[product_id] = 'unchanged'
+                else:
+                    results[product_id] = 'updated'
+                    rows.append((product_id, new_price, new_stock))
+                    company_ids.add(company_id)
+            if rows:
+                _write_batch(rows, now, using)
+
+        if company_ids:
+            invalidate_catalog(*company_ids, using=using)
+
+    return results
@@ -0,0 +1,229 @@
+"""
+Reservation-based stock engine (STOCK_ENGINE = 'reservation').
+
+Stock is taken in a short transaction of its own: one conditional UPDATE
+(``stock = stock - q WHERE stock >= q``) for the requested products plus a
+StockReservation row per product, committed before the order is written.
+Product rows are locked for those two statements only, instead of for the
+whole order transaction. The order transaction then confirms (deletes) its
+reservations; if it fails, release_reservations() puts the stock back, and
+release_expired_reservations() (release_stock_reservations command) returns
+the stock of reservations whose order never completed.
+
+Stock of very hot products can be split over StockShard rows (shard_stock
+command). A reservation then decrements one randomly chosen shard, so
+concurrent buyers of the same product rarely wait on the same row. The
+product's available stock is its own ``stock`` plus its shards.
+"""
+import random
+import uuid
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, F, OuterRef, PositiveIntegerField, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .models import Product, StockReservation, StockShard
+
+
+class StockError(Exception):
+    """Raised when stock cannot be reserved (or a reservation has expired)."""
+
+
+def with_available_stock(queryset):
+    """Annotate ``available_stock``: ``stock`` plus the stock held in shards."""
+    # order_by(): StockShard's default ordering would join products into the subquery
+    shard_total = StockShard.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('stock')
+    ).values('total')
+    return queryset.annotate(available_stock=Case(
+        When(stock_shards__gt=0, then=F('stock') + Coalesce(Subquery(shard_total), 0)),
+        default=F('stock'),
+        output_field=PositiveIntegerField()
+    ))
+
+
+def _take_from_shards(product, quantity, using):
+    """Decrement the product's shards by ``quantity``; returns [(shard index, taken)]."""
+    shards = StockShard.objects.using(using).filter(product_id=product.id)
+    start = random.randrange(product.stock_shards)
+    for offset in range(product.stock_shards):
+        index = (start + offset) % product.stock_shards
+        if shards.filter(index=index, stock__gte=quantity).update(stock=F('stock') - quantity):
+            return [(index, quantity)]
+
+    # No single shard holds enough (stock is running out): gather it from
+    # several shards under lock. Rare by construction.
+    locked = list(shards.select_for_update().order_by('index'))
+    if sum(shard.stock for shard in locked) < quantity:
+        raise StockError(f'Insufficient stock for {product.name}')
+    taken = []
+    remaining = quantity
+    for shard in locked:
+        take = min(shard.stock, remaining)
+        if take:
+            shards.filter(index=shard.index).update(stock=F('stock') - take)
+            taken.append((shard.index, take))
+            remaining -= take
+        if not remaining:
+            break
+    return taken
+
+
+def reserve_stock(company_id, wanted, using=None):
+    """
+    Take ``{product_id: quantity}`` from the company's active products and
+    commit the reservation. Returns ``(products, token, count)``: the
+    products by id (id, name, price, stock, stock_shards loaded), the
+    reservation token and the number of reservation rows to confirm.
+    Raises StockError.
+    """
+    using = using or router.db_for_write(Product)
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    token = uuid.uuid4().hex
+
+    with transaction.atomic(using=using):
+        products = {
+            product.id: product
+            for product in Product.objects.using(using).filter(
+                id__in=wanted,
+                company_id=company_id,
+                is_active=True
+            ).only('id', 'name', 'price', 'stock', 'stock_shards')
+        }
+        for product_id in wanted:
+            if product_id not in products:
+                raise StockError(f'Product with id {product_id} not found or does not belong to your company')
+
+        plain = {pid: qty for pid, qty in sorted(wanted.items()) if not products[pid].stock_shards}
+        reservations = []
+        if plain:
+            updated = Product.objects.using(using).filter(
+                reduce(or_, (Q(id=pid, stock__gte=qty) for pid, qty in plain.items())),
+                stock_shards=0
+            ).update(
+                stock=Case(
+                    *(When(id=pid, then=F('stock') - qty) for pid, qty in plain.items()),
+                    output_field=PositiveIntegerField()
+                ),
+                last_updated_at=now
+            )
+            if updated != len(plain):
+                stock = dict(
+                    Product.objects.using(using).filter(id__in=plain).values_list('id', 'stock')
+                )
+                short = next(pid for pid, qty in plain.items() if stock.get(pid, 0) < qty)
+                raise StockError(f'Insufficient stock for {products[short].name}')
+            reservations += [
+                StockReservation(product_id=pid, quantity=qty, token=token, expires_at=expires_at)
+                for pid, qty in plain.items()
+            ]
+
+        for product_id, quantity in sorted(wanted.items()):
+            if products[product_id].stock_shards:
+                reservations += [
+                    StockReservation(
+                        product_id=product_id, shard=index, quantity=taken, token=token, expires_at=expires_at
+                    )
+                    for index, taken in _take_from_shards(products[product_id], quantity, using)
+                ]
+
+        StockReservation.objects.using(using).bulk_create(reservations)
+        invalidate_catalog(company_id, using=using)
+
+    for product_id, quantity in plain.items():
+        products[product_id].stock -= quantity
+    return products, token, len(reservations)
+
+
+def confirm_reservations(token, count, using=None):
+    """Consume a reservation inside the order transaction; StockError if it has expired."""
+    deleted, _ = StockReservation.objects.using(using).filter(token=token).delete()
+    if deleted != count:
+        raise StockError('Stock reservation expired, please retry')
+
+
+def _restore(reservations, using):
+    plain = {}
+    for reservation in reservations:
+        # A shard that no longer exists (stock was re-sharded) gives the
+        # quantity back to the product itself.
+        if reservation.shard is None or not StockShard.objects.using(using).filter(
+            product_id=reservation.product_id, index=reservation.shard
+        ).update(stock=F('stock') + reservation.quantity):
+            plain[reservation.product_id] = plain.get(reservation.product_id, 0) + reservation.quantity
+    if plain:
+        Product.objects.using(using).filter(id__in=plain).update(
+            stock=Case(
+                *(When(id=pid, then=F('stock') + qty) for pid, qty in plain.items()),
+                output_field=PositiveIntegerField()
+            ),
+            last_updated_at=timezone.now()
+        )
+    StockReservation.objects.using(using).filter(id__in=[r.id for r in reservations]).delete()
+    # Company ids are read here rather than with select_related on the
+    # locking queries, which would lock the product rows as well.
+    invalidate_catalog(*Product.objects.using(using).filter(
+        id__in={r.product_id for r in reservations}
+    ).values_list('company_id', flat=True).distinct(), using=using)
+
+
+def release_reservations(token, using=None):
+    """Return the stock of a reservation whose order was not written."""
+    using = using or router.db_for_write(Product)
+    with transaction.atomic(using=using):
+        reservations = list(
+            StockReservation.objects.using(using).select_for_update().filter(token=token)
+        )
+        if reservations:
+            _restore(reservations, using)
+
+
+def release_expired_reservations(batch_size=500, using=None):
+    """Return the stock of expired reservations; returns how many were released."""
+    using = using or router.db_for_write(Product)
+    released = 0
+    while True:
+        with transaction.atomic(using=using):
+            reservations = list(
+                StockReservation.objects.using(using).select_for_update(skip_locked=True).filter(
+                    expires_at__lt=timezone.now()
+                ).order_by('id')[:batch_size]
+            )
+            if not reservations:
+                return released
+            _restore(reservations, using)
+        released += len(reservations)
+
+
+def set_stock_shards(product, shards, using=None):
+    """
+    Spread the product's available stock evenly over ``shards`` StockShard
+    rows, or fold it back into ``Product.stock`` with ``shards=0``.
+    """
+    using = using or router.db_for_write(Product)
+    with transaction.atomic(using=using):
+        product = Product.objects.using(using).select_for_update().get(pk=product.pk)
+        rows = StockShard.objects.using(using).filter(product=product)
+        total = product.stock + sum(shard.stock for shard in rows.select_for_update())
+        rows.delete()
+
+        if shards:
+            per_shard, extra = divmod(total, shards)
+            StockShard.objects.using(using).bulk_create([
+                StockShard(product=product, index=index, stock=per_shard + (1 if index < extra else 0))
+                for index in range(shards)
+            ])
+            product.stock = 0
+        else:
+            product.stock = total
+        product.stock_shards = shards
+        product.save(update_fields=['stock', 'stock_shards', 'last_updated_at'])
+        invalidate_catalog(product.company_id, using=using)
+    return total
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import gzip
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from companies.models import Company
+from ecommerce.fixtures import TenantTestMixin, create_user
+from ecommerce.renderers import FastJSONRenderer
+from products.cache import catalog_cache_stats, catalog_version, invalidate_catalog
+from products.imports import import_products
+from products.models import Product
+from products.search import search_product_ids
+from products.serializers import ProductListSerializer, ProductSerializer, product_list_rows
+from products.stock import set_stock_shards, with_available_stock
+
+
+class ProductCatalogCacheTests(TenantTestMixin, APITestCase):
+
+    def list_cache(self, client=None):
+        response = (client or self.client).get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache'], [product['name'] for product in response.data['results']]
+
+    def test_hits_and_misses_are_counted(self):
+        before = catalog_cache_stats()
+
+        self.assertEqual(self.list_cache(), ('MISS', ['Widget']))
+        self.assertEqual(self.list_cache(), ('HIT', ['Widget']))
+
+        stats = self.client.get('/api/products/cache_stats/').data
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.client.force_authenticate(create_user(self.company, 'VIEWER'))
+        self.assertEqual(self.client.get('/api/products/cache_stats/').status_code, 403)
+
+    def test_writes_invalidate_only_their_tenant(self):
+        other = Company.objects.create(name='Other')
+        self.create_product('Gizmo', company=other)
+        other_client = self.client_class()
+        other_client.force_authenticate(create_user(other))
+        self.list_cache()
+        self.list_cache(other_client)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/products/{self.product.id}/', {'name': 'Widget Pro'}, format='json')
+
+        self.assertEqual(self.list_cache(), ('MISS', ['Widget Pro']))
+        self.assertEqual(self.list_cache(other_client), ('HIT', ['Gizmo']))
+
+    def test_invalidation_waits_for_commit(self):
+        version = catalog_version(self.company.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    invalidate_catalog(self.company.id)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(catalog_version(self.company.id), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_catalog(self.company.id, self.company.id)
+        self.assertEqual(catalog_version(self.company.id), version + 1)
+
+
+class ProductConditionalGetTests(TenantTestMixin, APITestCase):
+
+    def test_list_sends_validators(self):
+        response = self.client.get('/api/products/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_list_not_modified_runs_only_the_validator_query(self):
+        etag = self.client.get('/api/products/')['ETag']
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_not_modified_from_cache_runs_no_query(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_when_stock_changes(self):
+        etag = self.client.get('/api/products/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/orders/', {'orders': [{'product_id': self.product.id, 'quantity': 1}]}, format='json'
+            )
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['results'][0]['stock'], 9)
+
+    def test_list_rows_render_like_the_serializer(self):
+        Product.objects.create(
+            company=self.company, name='Gadget', price=Decimal('120.50'), stock=0, is_active=False
+        )
+        set_stock_shards(self.product, 3)
+        products = with_available_stock(Product.objects.filter(company=self.company).order_by('id'))
+        expected = JSONRenderer().render(ProductListSerializer(products, many=True).data)
+
+        data = product_list_rows.serialize(product_list_rows.rows(products))
+
+        self.assertEqual(JSONRenderer().render(data), expected)
+        self.assertEqual(data[0]['stock'], 10)
+
+    def test_retrieve_not_modified_runs_single_query(self):
+        url = f'/api/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_retrieve_if_modified_since(self):
+        url = f'/api/products/{self.product.id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 304)
+
+
+class ProductSearchTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name in ['Blue Widget', 'Widgetron 3000', 'Gadget']:
+            self.create_product(name)
+        self.create_product('Widget Other', company=Company.objects.create(name='Other'))
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data['results']]
+
+    def test_ranks_whole_words_before_prefixes(self):
+        # equal scores: newest first
+        self.assertEqual(self.search('widget'), ['Blue Widget', 'Widget', 'Widgetron 3000'])
+
+    def test_prefix_and_multiple_terms(self):
+        self.assertEqual(self.search('wid'), ['Widgetron 3000', 'Blue Widget', 'Widget'])
+        self.assertEqual(self.search('blue wid'), ['Blue Widget'])
+        self.assertEqual(self.search('adge'), ['Gadget'])
+
+    def test_index_follows_product_changes(self):
+        self.search('widget')
+        product = Product.objects.get(company=self.company, name='Gadget')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/products/{product.id}/', {'name': 'Widget Pro'}, format='json')
+            self.client.delete(f'/api/products/{Product.objects.get(name="Blue Widget").id}/')
+
+        self.assertEqual(self.search('widget'), ['Widget Pro', 'Widget', 'Widgetron 3000'])
+        self.assertEqual(self.search('gadget'), [])
+
+    def test_hard_deleted_products_leave_the_index(self):
+        self.search('widget')
+        blue = Product.objects.get(name='Blue Widget')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            blue.delete()
+
+        self.assertEqual(search_product_ids(self.company.id, 'blue'), [])
+        self.assertEqual(self.search('widget'), ['Widget', 'Widgetron 3000'])
+
+    def test_rows_committed_late_are_not_missed(self):
+        self.search('widget')
+        watermark = Product.objects.order_by('-last_updated_at').values_list('last_updated_at', flat=True)[0]
+        # stamped before the newest row, committed after the index read it
+        late = self.create_product('Widget Late')
+        Product.objects.filter(pk=late.pk).update(last_updated_at=watermark - timedelta(seconds=5))
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_catalog(self.company.id)
+
+        self.assertEqual(self.search('late'), ['Widget Late'])
+
+    def test_index_is_rebuilt_when_the_cache_is_not_shared(self):
+        self.search('gadget')
+        # changed by another process: its version bump is not seen here
+        Product.objects.filter(name='Gadget').update(name='Gizmo')
+        self.assertEqual(self.search('gizmo'), [])
+
+        later = time.monotonic() + settings.SEARCH_INDEX_MAX_AGE
+        with mock.patch('products.search.time.monotonic', return_value=later):
+            self.assertEqual(self.search('gizmo'), ['Gizmo'])
+        self.assertEqual(self.search('gadget'), [])
+
+    def test_rejects_short_query(self):
+        response = self.client.get('/api/products/search/', {'q': 'w'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductImportTests(TenantTestMixin, APITestCase):
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            '/api/products/import/', {'file': SimpleUploadedFile(name, content), **data}, format='multipart'
+        )
+
+    def test_csv_upserts_and_reports_rejected_rows(self):
+        content = (
+            b'name,price,stock,is_active\n'
+            b'Widget,12.50,5,\n'
+            b'Gadget,3.00,7,true\n'
+            b',1.00,1,\n'
+            b'Gizmo,-1,abc,\n'
+            b'Gadget,4.00,8,no\n'
+        )
+        response = self.upload('catalog.csv', content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['rejected']), (1, 1, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [4, 5])
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'price', 'stock'})
+        widget = Product.objects.get(company=self.company, name='Widget')
+        self.assertEqual((widget.price, widget.stock), (Decimal('12.50'), 5))
+        gadget = Product.objects.get(company=self.company, name='Gadget')
+        self.assertEqual((gadget.price, gadget.stock, gadget.is_active), (Decimal('4.00'), 8, False))
+
+    def test_jsonl_in_small_chunks(self):
+        lines = b''.join(
+            b'{"name": "Item %d", "price": "1.%02d", "stock": %d}\n' % (i, i, i) for i in range(25)
+        ) + b'not json\n'
+
+        report = import_products(self.company, self.user, lines.splitlines(keepends=True), 'jsonl', chunk_size=10)
+
+        self.assertEqual((report.created, report.updated, report.rejected), (25, 0, 1))
+        self.assertEqual(report.errors[0]['line'], 26)
+        self.assertEqual(Product.objects.get(name='Item 7').price, Decimal('1.07'))
+
+    def test_rejects_unknown_format_and_viewers(self):
+        self.assertEqual(self.upload('catalog.xlsx', b'').status_code, 400)
+
+        self.client.force_authenticate(create_user(self.company, 'VIEWER'))
+        self.assertEqual(self.upload('catalog.csv', b'name,price,stock\n').status_code, 403)
+
+
+class ProductBulkUpdateTests(TenantTestMixin, APITestCase):
+    product_price = Decimal('5.00')
+
+    def setUp(self):
+        super().setUp()
+        self.products = [self.product] + [self.create_product(f'Item {i}') for i in range(1, 4)]
+        self.foreign = self.create_product(
+            'Foreign', company=Company.objects.create(name='Other'), price=Decimal('1.00'), stock=1
+        )
+
+    def bulk_update(self, entries):
+        return self.client.patch('/api/products/bulk_update/', {'products': entries}, format='json')
+
+    def test_applies_price_stock_and_delta(self):
+        first, second, third, fourth = self.products
+        response = self.bulk_update([
+            {'id': first.id, 'price': '7.25'},
+            {'id': second.id, 'stock': 3},
+            {'id': third.id, 'stock_delta': -4, 'price': '6.00'},
+            {'id': fourth.id, 'price': '5.00'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 3, 'unchanged': 1, 'rejected': []})
+        self.assertEqual(
+            list(Product.objects.filter(company=self.company).order_by('id').values_list('price', 'stock')),
+            [(Decimal('7.25'), 10), (Decimal('5.00'), 3), (Decimal('6.00'), 6), (Decimal('5.00'), 10)]
+        )
+
+    def test_rejects_per_entry(self):
+        first, second, third, _ = self.products
+        response = self.bulk_update([
+            {'id': first.id, 'stock_delta': -11},
+            {'id': second.id, 'price': '-1'},
+            {'id': third.id, 'stock': 1, 'stock_delta': 1},
+            {'id': self.foreign.id, 'price': '2.00'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rejected'], [
+            {'id': first.id, 'reason': 'insufficient_stock'},
+            {'id': second.id, 'reason': 'invalid'},
+            {'id': third.id, 'reason': 'invalid'},
+            {'id': self.foreign.id, 'reason': 'not_found'},
+        ])
+        self.assertEqual(Product.objects.get(pk=first.id).stock, 10)
+        self.assertEqual(Product.objects.get(pk=self.foreign.id).price, Decimal('1.00'))
+
+    def test_rejects_boolean_ids_and_fractional_deltas(self):
+        for product_id in (True, 1.0):
+            with self.subTest(id=product_id):
+                self.assertEqual(self.bulk_update([{'id': product_id, 'stock_delta': 1}]).status_code, 400)
+
+        first, second, *_ = self.products
+        response = self.bulk_update([
+            {'id': first.id, 'stock_delta': 1.9},
+            {'id': second.id, 'stock_delta': True},
+        ])
+
+        self.assertEqual(response.data['rejected'], [
+            {'id': first.id, 'reason': 'invalid'},
+            {'id': second.id, 'reason': 'invalid'},
+        ])
+        self.assertEqual(list(Product.objects.filter(pk__in=[first.id, second.id]).values_list('stock', flat=True)), [10, 10])
+
+    def test_query_count_does_not_grow_with_entries(self):
+        entries = [{'id': product.id, 'price': f'{i + 6}.00'} for i, product in enumerate(self.products)]
+
+        # savepoint, locking select, update, release
+        with self.assertNumQueries(4):
+            self.bulk_update(entries)
+
+
+class ProductListRenderingTests(TenantTestMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create([
+            Product(company=self.company, name=f'Widget {i}', price=Decimal('9.99'), stock=i, created_by=self.user)
+            for i in range(99)
+        ])
+
+    def test_fast_renderer_matches_json_renderer(self):
+        products = with_available_stock(Product.objects.filter(company=self.company))
+        data = {
+            'results': ProductSerializer(products, many=True).data,
+            'total': Decimal('12.50'),
+            'at': timezone.now(),
+            'note': 'line\u2028separator',
+            1: None,
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_large_responses_are_compressed_when_accepted(self):
+        plain = self.client.get('/api/products/', {'page_size': 100})
+        compressed = self.client.get('/api/products/', {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertTrue(compressed['ETag'].startswith('W/'))
+
+        not_modified = self.client.get(
+            '/api/products/', {'page_size': 100}, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compressed['ETag']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(f'/api/products/{Product.objects.first().id}/', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertNotIn('Content-Encoding', response)
+
+
+class ProductFieldSelectionTests(TenantTestMixin, APITestCase):
+
+    def test_retrieve_fields_drop_joins_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/products/{self.product.id}/', {'fields': 'id,name,stock'})
+
+        self.assertEqual(response.data, {'id': self.product.id, 'name': 'Widget', 'stock': 10})
+        sql = queries[-1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"price"', sql)
+
+    def test_list_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'fields': 'id,stock'})
+
+        self.assertEqual(response.data['results'], [{'id': self.product.id, 'stock': 10}])
+        self.assertNotIn('"name"', queries[-1]['sql'])
@@ -1,37 +1,225 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
 from .models import Product
-from .serializers import ProductSerializer, ProductListSerializer
-from ecommerce.permissions import ViewerPermission
+from .imports import IMPORT_FORMATS, ImportFormatError, clean_prices, clean_stocks, import_products
+from .search import MIN_QUERY_LENGTH, search_product_ids
+from .services import apply_product_updates
+from .stock import with_available_stock
+from .serializers import ProductSerializer, ProductListSerializer, product_list_rows
+from .cache import (
+    acatalog_cache_key, aget_catalog_entry, aset_catalog_entry, catalog_cache_key, catalog_cache_stats,
+    get_catalog_entry, invalidate_catalog, set_catalog_entry
+)
+from ecommerce.async_views import AsyncReadMixin
+from ecommerce.conditional import make_etag, not_modified, set_validators
+from ecommerce.field_selection import FieldSelectionMixin
+from ecommerce.permissions import AdminPermission, ViewerPermission
 from ecommerce.pagination import ProductPagination
+from ecommerce.validation import strict_int
 from django.db import transaction
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(AsyncReadMixin, FieldSelectionMixin, viewsets.ModelViewSet):
     permission_classes = [ViewerPermission]
     pagination_class = ProductPagination
+    max_search_results = 50
+    max_bulk_update = 10000
     
     def get_queryset(self):
         user = self.request.user
         
         queryset = Product.objects.filter(
-            company=user.company,
+            company_id=user.company_id,
             is_active=True
         ).select_related(
             'company',
             'created_by'
         ).only(
-            'id', 'name', 'price', 'stock', 'is_active',
+            'id', 'name', 'price', 'stock', 'stock_shards', 'is_active',
             'created_at', 'last_updated_at',
             'company__name', 'created_by__email'
         )
         
-        return queryset
+        return with_available_stock(self.select_fields(queryset))
     
+    def catalog_aggregates(self):
+        # MAX(last_updated_at) over all of the company's products (inactive
+        # ones too, so a deactivation moves it) plus the active count change
+        # whenever the list does, without serializing anything. Sharded
+        # stock is decremented without touching the product row, so its
+        # total is part of the ETag too.
+        return {
+            'last_modified': Max('last_updated_at'),
+            'active': Count('id', filter=Q(is_active=True), distinct=True),
+            'sharded': Sum('stock_shard_rows__stock'),
+        }
+
+    def catalog_validators(self, stats):
+        etag = make_etag(self.request.user.company_id, stats['active'], stats['last_modified'], stats['sharded'])
+        return etag, stats['last_modified']
+
+    def get_catalog_validators(self):
+        stats = Product.objects.filter(company_id=self.request.user.company_id).aggregate(**self.catalog_aggregates())
+        return self.catalog_validators(stats)
+
+    async def aget_catalog_validators(self):
+        stats = await Product.objects.filter(
+            company_id=self.request.user.company_id
+        ).aaggregate(**self.catalog_aggregates())
+        return self.catalog_validators(stats)
+
+    def list(self, request, *args, **kwargs):
+        # The catalog is read far more often than it changes: serve the
+        # serialized page and its validators from the per-company cache (see
+        # products/cache.py), or a 304 when the client's copy is current.
+        cache_key = catalog_cache_key(request.user.company_id, request.build_absolute_uri())
+        entry = get_catalog_entry(cache_key)
+        hit = entry is not None
+        if hit:
+            etag, last_modified = entry['etag'], entry['last_modified']
+        else:
+            etag, last_modified = self.get_catalog_validators()
+
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if not hit:
+            entry = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'data': self.list_data(request),
+            }
+            set_catalog_entry(cache_key, entry)
+        return self.catalog_response(entry, hit)
+
+    async def alist(self, request, *args, **kwargs):
+        """list() for async views (ecommerce/async_views.py)."""
+        cache_key = await acatalog_cache_key(request.user.company_id, request.build_absolute_uri())
+        entry = await aget_catalog_entry(cache_key)
+        hit = entry is not None
+        if hit:
+            etag, last_modified = entry['etag'], entry['last_modified']
+        else:
+            etag, last_modified = await self.aget_catalog_validators()
+
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        if not hit:
+            entry = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'data': await self.alist_data(request),
+            }
+            await aset_catalog_entry(cache_key, entry)
+        return self.catalog_response(entry, hit)
+
+    def catalog_response(self, entry, hit):
+        response = Response(entry['data'])
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return set_validators(response, entry['etag'], entry['last_modified'])
+
+    def list_rows(self):
+        # Same JSON as ProductListSerializer, from values() rows (id and
+        # created_at are read for the keyset cursor).
+        rows = product_list_rows
+        selected = self.get_selected_fields()
+        if selected is not None:
+            rows = rows.select(selected)
+        return rows, rows.rows(self.filter_queryset(self.get_queryset()), 'id', 'created_at')
+
+    def list_data(self, request):
+        rows, queryset = self.list_rows()
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return rows.serialize(queryset)
+        return self.get_paginated_response(rows.serialize(page)).data
+
+    async def alist_data(self, request):
+        rows, queryset = self.list_rows()
+        page = await self.apaginate_queryset(queryset)
+        if page is None:
+            return rows.serialize([row async for row in queryset])
+        return self.get_paginated_response(rows.serialize(page)).data
+
+    def retrieve_state(self, pk):
+        # the company name and creator email are part of the response too
+        return self.get_queryset().filter(pk=pk).values_list(
+            'last_updated_at', 'available_stock', 'company__name', 'created_by__email'
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            state = self.retrieve_state(kwargs['pk']).first()
+        except (TypeError, ValueError):
+            state = None
+
+        if state is None:
+            # unknown product: let the regular path produce the 404
+            return super().retrieve(request, *args, **kwargs)
+
+        last_modified = state[0]
+        etag = make_etag(kwargs['pk'], *state)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        """retrieve() for async views."""
+        try:
+            state = await self.retrieve_state(kwargs['pk']).afirst()
+        except (TypeError, ValueError):
+            state = None
+
+        if state is None:
+            return await super().aretrieve(request, *args, **kwargs)
+
+        last_modified = state[0]
+        etag = make_etag(kwargs['pk'], *state)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        response = await super().aretrieve(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked name search with prefix matching, for typeahead (GET).
+
+        Query: ?q=<text>&limit=<n> (default 20, max 50)
+
+        Returns: {"results": [...]} best match first.
+        """
+        query = request.query_params.get('q', '').strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return Response(
+                {'detail': f'`q` must be at least {MIN_QUERY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.max_search_results)
+        except ValueError:
+            return Response({'detail': '`limit` must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit <= 0:
+            return Response({'detail': '`limit` must be positive.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = search_product_ids(request.user.company_id, query, limit)
+        products = self.get_queryset().in_bulk(ids)
+        # keep the ranking; ids of rows changed since indexing are skipped
+        ranked = [products[pk] for pk in ids if pk in products]
+        return Response({'results': ProductListSerializer(ranked, many=True).data})
+
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return ProductListSerializer
         return ProductSerializer
     
@@ -41,12 +229,18 @@ class ProductViewSet(viewsets.ModelViewSet):
             company=self.request.user.company,
             created_by=self.request.user
         )
+        invalidate_catalog(self.request.user.company_id)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        invalidate_catalog(self.request.user.company_id)
     
     def destroy(self, request, *args, **kwargs):
         # soft delete
         product = self.get_object()
         product.is_active = False
-        product.save(update_fields=['is_active'])
+        product.save(update_fields=['is_active', 'last_updated_at'])
+        invalidate_catalog(product.company_id)
         
         return Response({'detail': 'Product deactivated successfully'}, status=status.HTTP_200_OK)
 
@@ -69,6 +263,96 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         qs = self.get_queryset().filter(id__in=ids)
         with transaction.atomic():
-            updated = qs.update(is_active=False)
+            updated = qs.update(is_active=False, last_updated_at=timezone.now())
+            if updated:
+                invalidate_catalog(request.user.company_id)
+
+        return Response({'deactivated': updated}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['patch'])
+    def bulk_update(self, request):
+        """Change the price and/or stock of many products at once (PATCH).
+
+        Body: {"products": [{"id": 1, "price": "9.99"}, {"id": 2, "stock": 40}, {"id": 3, "stock_delta": -5}]}
+
+        Returns: {"updated": N, "unchanged": N, "rejected": [{"id": 3, "reason": "insufficient_stock"}, ...]}
+        where reason is one of invalid, not_found, sharded or insufficient_stock.
+        A repeated id takes its last entry.
+        """
+        entries = request.data.get('products')
+        if not isinstance(entries, list) or not entries:
+            return Response({'detail': '`products` (non-empty list) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.max_bulk_update:
+            return Response({'detail': f'At most {self.max_bulk_update} products per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        updates = {}
+        results = {}
+        for entry in entries:
+            try:
+                product_id = strict_int(entry['id'])
+            except (KeyError, TypeError, ValueError):
+                return Response({'detail': 'Each entry needs an integer `id`.'}, status=status.HTTP_400_BAD_REQUEST)
+            results[product_id] = None
+            update = {}
+            valid = not ('stock' in entry and 'stock_delta' in entry)
+            if 'price' in entry:
+                update['price'], error = next(clean_prices([entry['price']]))
+                valid = valid and not error
+            if 'stock' in entry:
+                update['stock'], error = next(clean_stocks([entry['stock']]))
+                valid = valid and not error
+            if 'stock_delta' in entry:
+                try:
+                    update['stock_delta'] = strict_int(entry['stock_delta'])
+                except (TypeError, ValueError):
+                    valid = False
+            if valid and update:
+                updates[product_id] = update
+            else:
+                updates.pop(product_id, None)
+                results[product_id] = 'invalid'
+
+        if updates:
+            queryset = Product.objects.filter(company_id=request.user.company_id, is_active=True)
+            results.update(apply_product_updates(queryset, updates))
+
+        return Response({
+            'updated': sum(1 for result in results.values() if result == 'updated'),
+            'unchanged': sum(1 for result in results.values() if result == 'unchanged'),
+            'rejected': [
+                {'id': product_id, 'reason': result}
+                for product_id, result in results.items() if result not in ('updated', 'unchanged')
+            ],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """Create or update products in bulk from a CSV or JSONL upload (POST, multipart).
+
+        Form: file=<upload>, format=csv|jsonl (default: from the file extension)
+
+        Rows are upserted on name; see products/imports.py for the columns.
+
+        Returns: {"created": N, "updated": N, "rejected": N, "errors": [...], "errors_truncated": bool}
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': '`file` (multipart upload) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            return Response(
+                {'detail': f'Unknown format. Valid choices: {list(IMPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = import_products(request.user.company, request.user, upload, fmt)
+        except ImportFormatError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
 
-        return Response({'deactivated': updated}, status=status.HTTP_200_OK)
\ No newline at end of file
+    @action(detail=False, methods=['get'], permission_classes=[AdminPermission])
+    def cache_stats(self, request):
+        """Catalog cache hit/miss counters of the serving process (admins only)."""
+        return Response(catalog_cache_stats())
\ No newline at end of file